@@ -0,0 +1,74 @@
+import os
+import pandas as pd
+
+# extensions of the Arrow IPC (Feather v2) files
+IPC_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+
+
+def ipc_files(path):
+    """
+    Return the Arrow IPC files of a dataset: the file itself or the part files of a directory, in order
+    """
+    if os.path.isfile(path):
+        return [path]
+    names = [n for n in os.listdir(path) if n.endswith(IPC_EXTENSIONS) and not n.startswith(('_', '.'))]
+    # part.10 after part.9
+    names.sort(key=lambda n: (len(n), n))
+    return [os.path.join(path, n) for n in names]
+
+
+def to_table(df):
+    """
+    Return the arrow table of a pandas or cudf dataframe
+    """
+    import pyarrow as pa
+
+    if hasattr(df, 'to_arrow'):
+        return df.to_arrow()
+    return pa.Table.from_pandas(df)
+
+
+def write_ipc(df, path, compression=None):
+    """
+    Write a pandas or cudf dataframe as an Arrow IPC file.
+    Without compression the file has the same layout as the columns in memory,
+    so it can be mapped by read_ipc without decoding.
+    :param df pandas or cudf dataframe
+    :param path path of the file
+    :param compression None, lz4 or zstd (compressed files must be decoded when read)
+    """
+    import pyarrow as pa
+
+    table = to_table(df)
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+    return path
+
+
+def read_ipc(path, columns=None, library='pandas', arrow_dtypes=True):
+    """
+    Read an Arrow IPC file mapping it in memory: the columns are not copied and the pages
+    of a column are read from disk only when it is accessed.
+    With arrow_dtypes the pandas columns use the arrow buffers (pandas.ArrowDtype) and the
+    whole read is zero copy, otherwise the columns are converted to numpy dtypes.
+    cudf dataframes are copied to the device.
+    :param path path of the file
+    :param columns columns to read (default all)
+    :param library pandas or cudf
+    :param arrow_dtypes if True the pandas columns are backed by the mapped arrow buffers
+    """
+    import pyarrow as pa
+
+    source = pa.memory_map(path, 'r')
+    table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        index = [c for c in (table.schema.pandas_metadata or {}).get('index_columns', []) if isinstance(c, str)]
+        table = table.select(list(columns) + [c for c in index if c not in columns])
+    if library == 'cudf':
+        import cudf
+        return cudf.DataFrame.from_arrow(table)
+    if arrow_dtypes:
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return table.to_pandas()
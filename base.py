@@ -1,5 +1,10 @@
 import psutil
 import cudf
+from df_benchmark.algorithms.dtype_inference import infer_column, check_partition, resolve, string_columns
+from df_benchmark.algorithms.kernels import MONTHS, clean_strings_frame, parse_localized_dates_partition, parse_numeric_strings_partition, map_names, name_lookup
+from df_benchmark.algorithms.xml_reader import iter_xml_batches
+from df_benchmark.algorithms.sql_reader import read_sql_parallel
+from df_benchmark.algorithms.arrow_ipc import ipc_files, read_ipc, write_ipc
 
 
 class BaseDfBench(object):
@@ -30,7 +35,7 @@ class BaseDfBench(object):
         """
         Load the provided dataframe
         :param path: path of the file to load
-        :param format: format (json, csv, xml, excel, parquet, sql)
+        :param format: format (json, csv, xml, excel, parquet, arrow, sql)
         :param kwargs: extra arguments
         :return:
         """
@@ -45,6 +50,8 @@ class BaseDfBench(object):
             self.df = self.read_excel(path, **kwargs)
         elif format == "parquet":
             self.df = self.read_parquet(path, **kwargs)
+        elif format in ("arrow", "feather"):
+            self.df = self.read_arrow(path, **kwargs)
         elif format == "sql":
             self.df = self.read_sql(path, conn, **kwargs)
 
@@ -69,24 +76,21 @@ class BaseDfBench(object):
         """
 
         self.df = cudf.read_json(path, **kwargs)
-        pass
 
-    def read_xml(self, path, **kwargs):
+        return self.df
+
+    def read_xml(self, path, record_tag=None, columns=None, dtypes=None, batch_rows=100000):
         """
-        Read a xml file
+        Read a xml file, one record at a time: only a batch of batch_rows records
+        is in host memory (see xml_reader.py)
         :param path: path of the file to load
-        :param kwargs: extra arguments
+        :param record_tag: tag of the records (default the tag of the first child of the root)
+        :param columns: columns to read (default the fields of the first records)
+        :param dtypes: dictionary column -> dtype (default strings)
+        :param batch_rows: records converted at a time
         """
-        import xmltodict, json
-
-        with open(path) as xml_file:
-            data_dict = xmltodict.parse(xml_file.read())
-        
-        xml_file.close()
-
-        json_data = json.dumps(data_dict)
-
-        self.df = self.read_json(json_data)
+        batches = [cudf.from_pandas(batch) for batch in iter_xml_batches(path, record_tag, columns, dtypes, batch_rows)]
+        self.df = cudf.concat(batches, ignore_index=True)
 
         return self.df
 
@@ -106,15 +110,38 @@ class BaseDfBench(object):
         """
         pass
 
-    def read_sql(self, query, conn, **kwargs):
+    def read_arrow(self, path, columns=None):
+        """
+        Read an Arrow IPC/Feather file (or a directory of part files) mapping it in memory:
+        only the selected columns are read from disk and copied to the device
+        :param path: path of the file to load
+        :param columns: columns to read (default all)
+        """
+        frames = [read_ipc(f, columns, library='cudf') for f in ipc_files(path)]
+        self.df = frames[0] if len(frames) == 1 else cudf.concat(frames)
+
+        return self.df
+
+    def read_sql(self, query, conn, column=None, npartitions=8, bounds=None, pool_size=4, chunk_rows=50000, **kwargs):
         """
         Given a connection and a query
-        creates a dataframe from the query output
+        creates a dataframe from the query output.
+        With a key column the query is read in npartitions ranges of the key by pool_size
+        threads, each with its own connection, fetching chunk_rows rows at a time (see sql_reader.py)
         :param query query to run to get the data
-        :param conn connection to a database
-        :param kwargs: extra arguments
+        :param conn connection to a database: a SQLAlchemy URL, the path of a SQLite database,
+               a function that returns a new connection or an open connection (read by a single thread)
+        :param column numeric or date key column used to split the query (default no split)
+        :param npartitions number of ranges
+        :param bounds (min, max) of the key (default computed with a query)
+        :param pool_size maximum number of connections
+        :param chunk_rows rows fetched at a time
+        :param kwargs: extra arguments of pandas.read_sql
         """
-        pass
+        frames = read_sql_parallel(query, conn, column, npartitions, bounds, pool_size, chunk_rows, **kwargs)
+        self.df = cudf.concat([cudf.from_pandas(frame) for frame in frames], ignore_index=True)
+
+        return self.df
 
     def sort(self, columns, ascending=True):
         """
@@ -266,7 +293,28 @@ class BaseDfBench(object):
         
         return self.df.describe()
 
-    def find_mismatched_dtypes(self):
+    def infer_dtypes(self, sample_rows=1000, min_ratio=0.9):
+        """
+        Suggest a dtype for the string columns looking at a sample of the rows.
+        Boolean, numeric, datetime and categorical parses are tried on the sample;
+        only the columns where the sample is ambiguous are checked on the whole dataframe.
+        Returns a dictionary {'col_name': 'suggested_dtype'}
+        :param sample_rows number of rows of the sample (default 1000)
+        :param min_ratio minimum fraction of parsed values in the sample to consider a dtype (default 0.9)
+        """
+        
+        columns = string_columns(self.get_columns_types())
+        sample = self.df[columns].sample(n=min(sample_rows, len(self.df)), random_state=0)
+        sample = sample.to_pandas() if hasattr(sample, 'to_pandas') else sample
+
+        candidates = {c: infer_column(sample[c], min_ratio) for c in columns}
+        candidates = {c: k for c, k in candidates.items() if k is not None}
+        ambiguous = {c: k for c, k in candidates.items() if k.ambiguous}
+        checks = check_partition(self.df, ambiguous)
+        
+        return resolve(candidates, checks)
+
+    def find_mismatched_dtypes(self, sample_rows=1000):
         """
         Returns, if exists, a list of columns with mismatched data types.
         For example, a column with string dtypes that contains only integer values.
@@ -274,13 +322,14 @@ class BaseDfBench(object):
          - Col: name of the column
          - current_dtype: current data type
          - suggested_dtype: suggested data type
+        :param sample_rows number of rows used to infer the dtypes (see infer_dtypes)
         """
         
         current_dtypes = self.get_columns_types()
-        new_dtypes = self.df.apply(cudf.to_numeric, errors='ignore').dtypes.apply(lambda x: x.name).to_dict()
+        new_dtypes = self.infer_dtypes(sample_rows)
 
         out = []
-        for k in current_dtypes.keys():
+        for k in new_dtypes.keys():
             if new_dtypes[k] != current_dtypes[k]:
                 out.append({'col': k, 'current_dtype': current_dtypes[k], 'suggested_dtype': new_dtypes[k]})
         
@@ -333,6 +382,62 @@ class BaseDfBench(object):
         
         return self.df
 
+    def parse_localized_dates(self, columns, locale='it'):
+        """
+        Convert the provided columns from textual dates (e.g. "12 gennaio 2020") to datetime.
+        Values that can't be parsed become NaT.
+        Returns a dictionary with the number of values that failed the parsing for every column.
+        :param columns columns to convert
+        :param locale language of the month names (it, en) (default 'it')
+        """
+        
+        self.df, failures = parse_localized_dates_partition(self.df, columns, MONTHS[locale])
+        
+        return failures
+
+    def parse_numeric_strings(self, columns, decimal=',', strip_units=True):
+        """
+        Convert the provided columns from strings like "0,85 €/smc" to float.
+        Returns a dictionary with, for every column, the most frequent unit found
+        after the numbers and the number of values coerced to NaN:
+        {'col_name': {'unit': '€/smc', 'coerced': 0}}
+        :param columns columns to convert
+        :param decimal decimal separator (default ',')
+        :param strip_units if True the unit after the number is removed,
+               otherwise values with a unit become NaN (default True)
+        """
+        # numeric columns are already converted
+        columns = [c for c in columns if self.df[c].dtype.kind not in 'biuf']
+        
+        self.df, report = parse_numeric_strings_partition(self.df, columns, decimal, strip_units)
+        
+        return {c: {'unit': r['units'].idxmax() if len(r['units']) > 0 else None, 'coerced': r['coerced']} for c, r in report.items()}
+
+    def enrich_region(self, city_column, reference, region_column='Region', city_field='Comune', region_field='Regione'):
+        """
+        Add a column with the region of the city of every row, looked up in a reference table
+        (comune -> regione). The city names of both sides are normalized in the same way
+        (diacritics, apostrophes, whitespace and case) and joined with a vectorized map.
+        Returns a dictionary with the number of rows of every unmatched city name
+        and the names that appear in more than one region of the reference:
+        {'unmatched': pandas series, 'ambiguous': [...]}
+        :param city_column column with the city names
+        :param reference path of a csv/parquet file or pandas dataframe with the reference table
+        :param region_column name of the new column (default Region)
+        :param city_field column of the reference with the city names (default Comune)
+        :param region_field column of the reference with the regions (default Regione)
+        """
+        lookup, ambiguous = name_lookup(reference, city_field, region_field)
+        if type(self.df).__module__.startswith('cudf'):
+            lookup = cudf.from_pandas(lookup)
+
+        self.df[region_column] = map_names(self.df[city_column], lookup)
+
+        unmatched = self.df[city_column][self.df[region_column].isna() & ~self.df[city_column].isna()].value_counts()
+        unmatched = unmatched.to_pandas() if hasattr(unmatched, 'to_pandas') else unmatched
+
+        return {'unmatched': unmatched, 'ambiguous': ambiguous}
+
     def set_header_case(self, case):
         """
         Put dataframe headers in the provided case
@@ -469,6 +574,27 @@ class BaseDfBench(object):
         
         return self.df
 
+    def clean_strings(self, columns=[], strip=True, case=None, fold_diacritics=False, collapse_whitespace=False):
+        """
+        Clean the strings of the provided columns in a single pass, applying all the transforms
+        to every column at once (see strip, set_content_case and remove_diacritics).
+        The columns that don't contain strings are skipped.
+        :param columns columns to clean (default all the string columns)
+        :param strip True to remove leading/trailing whitespaces, the characters to remove or False
+        :param case lower, upper, title, capitalize, swapcase or None to keep it
+        :param fold_diacritics if True accented letters become plain letters
+        :param collapse_whitespace if True every sequence of whitespaces becomes a single space
+        """
+        strings = string_columns({k: str(v) for k, v in dict(self.df.dtypes).items()})
+        columns = [c for c in columns if c in strings] if len(columns) > 0 else strings
+        if len(columns) == 0:
+            return self.df
+
+        cleaned = clean_strings_frame(self.df, columns, strip, case, fold_diacritics, collapse_whitespace)
+        self.df[columns] = cleaned
+
+        return self.df
+
     def set_index(self, column):
         """
         Set the provided column as index
@@ -661,6 +787,15 @@ class BaseDfBench(object):
 
         pass
 
+    def to_arrow(self, path, compression=None):
+        """
+        Export the dataframe in an Arrow IPC/Feather file, reloaded by load_dataset(format="arrow")
+        without decoding
+        :param path path of the file
+        :param compression None, lz4 or zstd (a compressed file must be decoded when it is read)
+        """
+        write_ipc(self.df, path, compression)
+
     def query(self, query):
         """
         Queries the dataframe and returns the corresponding
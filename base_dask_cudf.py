@@ -1,17 +1,49 @@
-import psutil
+import inspect
+import os
 import dask_cudf as dc
+import dask
 import dask.dataframe as dd
-import dask.array as da
 from dask_cuda import LocalCUDACluster
 from dask.distributed import Client, LocalCluster
 import numpy as np
 import cudf
+from dask import delayed
+from df_benchmark.algorithms.planner import LogicalPlan, PlanNode, query_columns, query_to_filters, coerce_filters, and_filters, prune_pieces
+from df_benchmark.algorithms.profiling import profile_partition, merge_profiles, finalize_profile, tree_reduce
+from df_benchmark.algorithms.sketches import build_quantile_sketches, merge_quantile_sketches
+from df_benchmark.algorithms.kernels import MONTHS, clean_strings_frame, parse_localized_dates_partition, parse_numeric_strings_partition, merge_numeric_strings_reports, map_names, name_lookup
+from df_benchmark.algorithms.dtype_inference import infer_column, check_partition, merge_checks, resolve, string_columns
+from df_benchmark.algorithms.compaction import compaction_partition, merge_compaction
+from df_benchmark.algorithms.monitoring import cluster_memory, memory_tracker, wrap_methods, method_tracer, write_chrome_trace
+from df_benchmark.algorithms.checkpoint import CHECKPOINT_METHODS, CheckpointCache, call_key, dataset_fingerprint
+from df_benchmark.algorithms.star_schema import UTILITY_COLUMNS, CUSTOMER_COLUMNS, UTILITY_KEY, INVOICE_KEY, split_partition, merge_split_stats
+from df_benchmark.algorithms.divisions import write_divisions, remove_divisions, read_divisions, read_part, empty_part
+from df_benchmark.algorithms.lookup_index import LookupIndex
+from df_benchmark.algorithms.ingest import DEFAULT_STEPS, ingest_csv
+from df_benchmark.algorithms.jsonl_reader import infer_schema, jsonl_blocks, read_jsonl_block, merge_jsonl_stats, to_frame
+from df_benchmark.algorithms.arrow_ipc import ipc_files, read_ipc, write_ipc
+from df_benchmark.algorithms.sql_reader import is_connection_spec, plan_sql, read_sql_range, read_sql_parallel, empty_frame
+from df_benchmark.algorithms.xml_reader import detect_record_tag, sample_records, record_columns, splittable, xml_ranges, read_xml_range, cudf_or_pandas, ColumnBuffers
+from df_benchmark.algorithms.fingerprint import signature_partition, merge_signatures, equal_rows_partition, sum_counts
 #import graphviz
 
 
 class BaseDfBench(object):
-    def __init__(self, type_of_istance="DASK_CUDF"):
+    def __init__(self, type_of_istance="DASK_CUDF", lazy=False, sketch_error=0.01):
+        """
+        :param type_of_istance DASK_CUDF or DASK
+        :param lazy if set to True the supported methods are recorded into a logical plan
+               that is optimized and executed only when the dataframe is needed (default False)
+        :param sketch_error rank error of the quantile sketches used by
+               locate_outliers, get_stats and get_quantile_bins (default 0.01)
+        """
         self.type_of_istance = type_of_istance
+        self.lazy = lazy
+        self.sketch_error = sketch_error
+        self._sketches = {}
+        self._df = None
+        self._plan = None
+        self._replaying = False
         if type_of_istance == "DASK_CUDF":
             cluster = LocalCUDACluster()
         elif type_of_istance == "DASK":
@@ -19,8 +51,30 @@ class BaseDfBench(object):
         else:
             print("Wrong Type of istance, i'm loading DASK...")
             cluster = LocalClient()    
-        client = Client(cluster)
-        client.run(cudf.set_allocator, "managed")
+        self.client = Client(cluster)
+        self.client.run(cudf.set_allocator, "managed")
+        self.memory_records = []
+        self.trace_events = []
+        self._checkpoints = None
+        self._prefix = None
+        self._references = {}
+        self._source = None
+        self._pruning = None
+        self._parquet_path = None
+        self._lookup_indexes = {}
+        self._json_stats = None
+
+    @property
+    def df(self):
+        if self._plan is not None and not self._replaying:
+            self.collect()
+        return self._df
+
+    @df.setter
+    def df(self, value):
+        if not self._replaying:
+            self._plan = None
+        self._df = value
         
     def __getitem__(self, key):
         return self.df[key]
@@ -46,16 +100,167 @@ class BaseDfBench(object):
         """
         Return the current memory usage of this algorithm instance
         (in kilobytes), or None if this information is not available.
+        The memory of the driver and of all the workers of the cluster is included.
         """
         # return in kB for backwards compatibility
-        return psutil.Process().memory_info().rss / 1024
+        return cluster_memory(self.client)['rss'] / 1024
+
+    def get_cluster_memory(self):
+        """
+        Return a dictionary with the memory used by the driver and by all the workers (in bytes):
+        rss, managed, spilled (to disk), device (GPU) and the number of workers
+        """
+        return cluster_memory(self.client)
+
+    def track_memory(self, interval=0.1):
+        """
+        Start recording the peak cluster memory of every call of the public methods of this instance.
+        Nested calls are accounted to the outermost one.
+        Keep in mind that most of the methods are lazy: memory is used when the results are computed.
+        The measures are returned by get_memory_records.
+        :param interval seconds between two memory samples (default 0.1)
+        """
+        exclude = ('track_memory', 'get_memory_records', 'get_memory_usage', 'get_cluster_memory', 'trace', 'get_trace', 'export_trace')
+        wrap_methods(self, memory_tracker(self.memory_records, self.client, interval), exclude=exclude)
+
+    def get_memory_records(self):
+        """
+        Return a dataframe with the peak memory (in bytes) recorded for every method call
+        (see track_memory)
+        """
+        import pandas as pd
+
+        return pd.DataFrame(self.memory_records)
+
+    def trace(self, count_rows=False):
+        """
+        Start recording every call of the public methods of this instance: wall time, rows, partitions
+        and graph tasks of the dataframe before and after the call and, for the outermost calls,
+        the tasks run on the cluster with the bytes read and shuffled.
+        Keep in mind that most of the methods are lazy: the work is recorded by the call that computes the results.
+        The events are returned by get_trace and can be saved as a Chrome trace with export_trace.
+        :param count_rows if True the rows of the dataframe are counted before and after every call;
+               it needs a pass on the data, so the timings are no longer meaningful (default False)
+        """
+        exclude = ('track_memory', 'get_memory_records', 'get_memory_usage', 'get_cluster_memory', 'trace', 'get_trace', 'export_trace')
+        wrap_methods(self, method_tracer(self.trace_events, self.client, lambda: self._df, count_rows), exclude=exclude)
+
+    def get_trace(self):
+        """
+        Return a dataframe with an event for every method call (see trace)
+        """
+        import pandas as pd
+
+        return pd.DataFrame([{k: v for k, v in e.items() if k != 'task_stream'} for e in self.trace_events])
+
+    def export_trace(self, path):
+        """
+        Write the recorded method calls and their tasks as a Chrome trace / JSON timeline,
+        to be opened with chrome://tracing or https://ui.perfetto.dev
+        :param path output json file
+        """
+        write_chrome_trace(self.trace_events, path)
+
+    def enable_checkpoints(self, path='checkpoints', max_bytes=10 * 2 ** 30, methods=CHECKPOINT_METHODS):
+        """
+        Start caching the intermediate results on disk.
+        Every call that modifies the dataframe extends a key computed from the fingerprint of the
+        loaded dataset (name, size and modification time of its files), the previous calls with
+        their arguments and the dask name of the current dataframe, so changes made outside of the
+        methods (bench.df[...] = ... or a new bench.df) change the key too. After the provided methods (and after checkpoint) the dataframe is written
+        to a parquet cache under that key and read back from there; when the same sequence of calls
+        is repeated, e.g. after a restart, the cached result is loaded and the calls are skipped
+        (a skipped call returns the value returned the first time, e.g. its report).
+        Datasets that can't be fingerprinted (sql queries, missing paths) are not cached.
+        The least recently used entries are removed when the cache is larger than max_bytes.
+        :param path directory of the cache (default checkpoints)
+        :param max_bytes maximum size of the cache in bytes (default 10 GB)
+        :param methods methods whose results are materialized (default the string conversions)
+        """
+        self._checkpoints = CheckpointCache(path, max_bytes)
+        self._checkpoint_methods = set(methods)
+        self._checkpoint_depth = [0]
+        exclude = ('enable_checkpoints', 'checkpoint', 'track_memory', 'get_memory_records', 'get_memory_usage',
+                   'get_cluster_memory', 'trace', 'get_trace', 'export_trace', 'explain', 'get_df', 'done')
+        wrap_methods(self, self._checkpointed, exclude=exclude)
+
+    def checkpoint(self):
+        """
+        Materialize the current dataframe in the checkpoint cache (see enable_checkpoints)
+        and continue from the cached copy
+        """
+        if self._checkpoints is None or self._prefix is None:
+            return self.df
+        path = self._checkpoints.get(self._prefix) or self._checkpoints.put(self._prefix, self.df, 'checkpoint')
+        self.df = self._read_checkpoint(path)
+        return self.df
+
+    def _read_checkpoint(self, path):
+        return self._read_parquet(path, calculate_divisions=True)
+
+    def _state(self):
+        """
+        Return a value that changes when the dataframe or the logical plan are modified
+        (the dask name changes also when a column is assigned in place)
+        """
+        return id(self._df), getattr(self._df, '_name', None), len(self._plan) if self._plan is not None else 0
+
+    def _checkpointed(self, name, method):
+        """
+        Wrapper (for wrap_methods) that serves the calls from the checkpoint cache
+        """
+        depth = self._checkpoint_depth
+
+        def checkpointed(*args, **kwargs):
+            if depth[0] > 0:
+                return method(*args, **kwargs)
+            if name == 'load_dataset':
+                result = method(*args, **kwargs)
+                # the path with its default value; datasets that can't be fingerprinted are not cached
+                call = inspect.signature(method).bind(*args, **kwargs)
+                call.apply_defaults()
+                path = call.arguments.get('path')
+                if call.arguments.get('format') == 'sql' or not isinstance(path, str) or not os.path.exists(path):
+                    self._prefix = None
+                else:
+                    self._prefix = call_key(name, call.arguments, dataset_fingerprint(path))
+                return result
+
+            # the graph name changes when the dataframe is modified outside of the wrapped methods
+            key = call_key(self._prefix, getattr(self._df, '_name', None), name, args, kwargs) if self._prefix is not None else None
+            path = self._checkpoints.get(key) if key is not None else None
+            if path is not None:
+                self.df = self._read_checkpoint(path)
+                self._prefix = key
+                result = self._checkpoints.result(key)
+                return self.df if result is None else result
+
+            before = self._state()
+            depth[0] += 1
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                depth[0] -= 1
+            if self._state() == before:
+                # the dataframe has not been modified
+                return result
+
+            self._prefix = key
+            if key is not None and name in self._checkpoint_methods:
+                returned_df = result is self._df
+                stored = None if returned_df else result
+                self.df = self._read_checkpoint(self._checkpoints.put(key, self.df, name, stored))
+                if returned_df:
+                    result = self.df
+            return result
+        return checkpointed
 
     
     def load_dataset(self, format, path='/data/parquet', conn=None, **kwargs):
         """
         Load the provided dataframe
         :param path: path of the file to load
-        :param format: format (json, csv, xml, excel, parquet, sql)
+        :param format: format (json, csv, xml, excel, parquet, arrow, sql)
         :param kwargs: extra arguments
         :return:
         """
@@ -69,15 +274,278 @@ class BaseDfBench(object):
         elif format == "excel":
             self.df = self.read_excel(path, **kwargs)
         elif format == "parquet":
-            if self.type_of_istance == "DASK_CUDF":
-                self.df = dc.read_parquet(path, blocksize="256MB")
-            elif self.type_of_istance == "DASK":
-                self.df = dd.read_parquet(path, blocksize="256MB")
+            if self.lazy:
+                # the arguments of the caller (columns, filters, storage_options, ...) are kept for the read
+                self._plan = LogicalPlan(PlanNode('scan', path=path, format=format, read_kwargs=kwargs))
+                return self._plan
+            self.df = self.read_parquet(path, **kwargs)
+        elif format in ("arrow", "feather"):
+            self.df = self.read_arrow(path, **kwargs)
         elif format == "sql":
             self.df = self.read_sql(path, conn, **kwargs)
 
         return self.df
 
+    def read_arrow(self, path, columns=None, arrow_dtypes=True):
+        """
+        Read an Arrow IPC/Feather file or a directory of part files (see to_arrow), a partition for
+        every file. The files are mapped in memory by the workers: nothing is decoded and only the
+        selected columns are read from disk (DASK_CUDF copies them to the device).
+        The divisions saved by to_arrow are restored.
+        With arrow_dtypes the columns keep the arrow types (e.g. int64[pyarrow], double[pyarrow]),
+        so the dtypes differ from the numpy ones returned by read_parquet; without it the columns
+        are converted to numpy dtypes, copying them.
+        :param path path of the file or of the directory
+        :param columns columns to read (default all)
+        :param arrow_dtypes if True the columns are backed by the mapped arrow buffers (default True)
+        """
+        library = 'cudf' if self.type_of_istance == "DASK_CUDF" else 'pandas'
+        files = ipc_files(path)
+        meta = read_ipc(files[0], columns, library, arrow_dtypes).iloc[:0]
+        info = read_divisions(path)
+        divisions = info['divisions'] if info is not None and info['files'] == [os.path.basename(f) for f in files] else None
+
+        self.df = dd.from_map(read_ipc, files, columns=columns, library=library, arrow_dtypes=arrow_dtypes, meta=meta,
+                              divisions=divisions, enforce_metadata=False)
+        return self.df
+
+    def read_parquet(self, path, **kwargs):
+        """
+        Read a parquet file
+        A dataset saved with its divisions (see set_index) is read with them, also with columns
+        and filters (a filtered file is a subset of its rows, within the same division);
+        with other arguments the divisions are not used.
+        :param path: path of the file to load
+        :param kwargs: extra arguments (e.g. columns, filters)
+        """
+        self._parquet_path = path
+        info = read_divisions(path)
+        if info is not None and set(kwargs) <= {'columns', 'filters'}:
+            self.df = self._read_sorted(path, info, **kwargs)
+            return self.df
+
+        self.df = self._read_parquet(path, **kwargs)
+        # remember where the data comes from, query can read it again with filters
+        self._source = (path, kwargs, self._df, self._df._name)
+
+        return self.df
+
+    def read_sql(self, query, conn, column=None, npartitions=8, bounds=None, pool_size=4, chunk_rows=50000, **kwargs):
+        """
+        Read the result of a query as npartitions partitions, one for every range of a numeric
+        or date key column (e.g. bill_id or emission_date). The ranges are read by the workers
+        in parallel, with at most pool_size connections open on the whole cluster, fetching
+        chunk_rows rows at a time. All the partitions have the dtypes of the first rows of the query.
+        To be opened by the workers the connection must be a SQLAlchemy URL, the path of a
+        SQLite database or a function that returns a new connection; an open connection is
+        read by the client.
+        :param query SQL query
+        :param conn connection (see above)
+        :param column key column (default a single partition)
+        :param npartitions number of ranges
+        :param bounds (min, max) of the key (default computed with a query)
+        :param pool_size maximum number of connections
+        :param chunk_rows rows fetched at a time
+        :param kwargs extra arguments of pandas.read_sql (e.g. parse_dates)
+        """
+        from distributed import Semaphore
+
+        library = 'cudf' if self.type_of_istance == "DASK_CUDF" else 'pandas'
+        if not is_connection_spec(conn):
+            import pandas as pd
+            frames = read_sql_parallel(query, conn, column, npartitions, bounds, pool_size, chunk_rows, **kwargs)
+            df = pd.concat(frames, ignore_index=True)
+            df = cudf.from_pandas(df) if library == 'cudf' else df
+            self.df = dd.from_pandas(df, npartitions=len(frames))
+            return self.df
+
+        ranges, dtypes = plan_sql(query, conn, column, npartitions, bounds, pool_size, **kwargs)
+        semaphore = Semaphore(max_leases=pool_size)
+        last = len(ranges) - 1
+        parts = [delayed(read_sql_range)(r, query, conn, column, i == 0, i == last, dtypes, chunk_rows, pool_size,
+                                         semaphore, library, **kwargs) for i, r in enumerate(ranges)]
+        meta = empty_frame(dtypes, library)
+        self.df = dd.from_delayed(parts, meta=meta, verify_meta=False)
+
+        return self.df
+
+    def read_json(self, path, dtypes=None, blocksize="256MB", sample_bytes="1MB", persist=False):
+        """
+        Read a json lines file as a partition for every block of about blocksize bytes,
+        parsed in parallel by the workers. All the blocks are parsed with the same schema:
+        the provided dtypes and the types inferred from the first sample_bytes bytes, so the
+        partitions have the same dtypes and no object columns.
+        Malformed lines are skipped and counted, see get_json_report.
+        :param path path of the file to load
+        :param dtypes dictionary column -> dtype that overrides the inferred types (e.g. {'bill_id': 'int64'})
+        :param blocksize size of the partitions in bytes
+        :param sample_bytes size of the sample used to infer the schema
+        :param persist if True the partitions and the report are computed now
+        """
+        from dask.utils import parse_bytes
+
+        schema = infer_schema(path, dtypes, parse_bytes(sample_bytes))
+        library = 'cudf' if self.type_of_istance == "DASK_CUDF" else 'pandas'
+        meta = to_frame(schema.empty_table(), library)
+
+        parts = [delayed(read_jsonl_block, nout=2)(r, path, schema, library) for r in jsonl_blocks(path, parse_bytes(blocksize))]
+        frames, stats = [p[0] for p in parts], [p[1] for p in parts]
+        if persist:
+            frames, stats = dask.persist(frames, stats)
+        self.df = dd.from_delayed(frames, meta=meta, verify_meta=False)
+        self._json_stats = stats
+
+        return self.df
+
+    def get_json_report(self):
+        """
+        Return the number of lines, of malformed lines and of values that didn't match
+        the schema (for every column) of the last json file read.
+        Without persist the blocks are parsed again to count them.
+        """
+        if self._json_stats is None:
+            return None
+        return tree_reduce(self._json_stats, delayed(merge_jsonl_stats)).compute()
+
+    def read_xml(self, path, record_tag=None, columns=None, dtypes=None, blocksize="256MB"):
+        """
+        Read a xml file as a partition for every byte range of about blocksize bytes: the ranges
+        start at the opening tag of a record and are parsed in parallel by the workers, one record
+        at a time (see xml_reader.py). If the tag of the records is used also inside them the
+        file is read as a single partition.
+        :param path path of the file to load
+        :param record_tag tag of the records (default the tag of the first child of the root)
+        :param columns columns to read (default the fields of the first records)
+        :param dtypes dictionary column -> dtype (default strings)
+        :param blocksize size of the partitions in bytes
+        """
+        from dask.utils import parse_bytes
+
+        record_tag = record_tag or detect_record_tag(path)
+        if columns is None:
+            columns = record_columns(sample_records(path, record_tag)[0])
+        ranges = xml_ranges(path, record_tag, parse_bytes(blocksize)) if splittable(path, record_tag) else [None]
+        library = 'cudf' if self.type_of_istance == "DASK_CUDF" else 'pandas'
+        meta = cudf_or_pandas(ColumnBuffers(columns, dtypes, 0).flush(), library)
+
+        self.df = dd.from_map(read_xml_range, ranges or [None], path=path, record_tag=record_tag, columns=columns,
+                              dtypes=dtypes, library=library, meta=meta, enforce_metadata=False)
+        return self.df
+
+    def ingest_csv(self, path, out, steps=DEFAULT_STEPS, chunk_rows=100000, max_memory=None, **kwargs):
+        """
+        Convert a csv file that doesn't fit in memory to parquet, cleaning it while it is read
+        (see ingest.py), and load the parquet dataset.
+        Returns the report of the ingestion (rows, rows/sec, peak memory, steps).
+        :param path path of the csv file
+        :param out output directory
+        :param steps cleaning chain (default strip, dates, numeric, compact)
+        :param chunk_rows number of rows of every chunk (default 100000)
+        :param max_memory maximum memory of the process in bytes (default no limit)
+        :param kwargs extra arguments of pandas.read_csv
+        """
+        report = ingest_csv(path, out, steps, chunk_rows, max_memory, **kwargs)
+        self.read_parquet(out)
+        return report
+
+    def _read_sorted(self, path, info, columns=None, filters=None):
+        """
+        Read a dataset saved with its divisions (see set_index and to_parquet):
+        a partition for every file, with the saved divisions, without computing anything
+        """
+        library = 'cudf' if self.type_of_istance == "DASK_CUDF" else 'pandas'
+        files = [os.path.join(path, f) for f in info['files']]
+        meta = empty_part(files[0], info, columns, library)
+        kwargs = {'filters': filters} if filters else {}
+
+        return dd.from_map(read_part, files, columns=columns, library=library, meta=meta,
+                           divisions=info['divisions'], enforce_metadata=False, **kwargs)
+
+    def _read_parquet(self, path, **kwargs):
+        if self.type_of_istance == "DASK_CUDF":
+            return dc.read_parquet(path, blocksize="256MB", **kwargs)
+        return dd.read_parquet(path, blocksize="256MB", **kwargs)
+
+    def _record(self, op, **kwargs):
+        """
+        In lazy mode adds the operation to the logical plan instead of executing it.
+        Returns True if the operation has been recorded.
+        """
+        if not self.lazy or self._replaying:
+            return False
+        if self._plan is None:
+            self._plan = LogicalPlan(PlanNode('frame'))
+        self._plan.add(op, **kwargs)
+        return True
+
+    def _source_dtypes(self):
+        """
+        Return the dtypes of the plan source, reading only the parquet metadata
+        """
+        source = self._plan.nodes[0]
+        if source.op != 'scan':
+            return None
+        meta = self._read_parquet(source.kwargs['path'], **source.kwargs.get('read_kwargs', {}))
+
+        return {k: v.name for k, v in dict(meta.dtypes).items()}
+
+    def explain(self):
+        """
+        Return the optimized logical plan of the recorded (not yet executed) operations
+        """
+        if self._plan is None:
+            return 'No pending operations'
+
+        return self._plan.explain(dtypes=self._source_dtypes())
+
+    def collect(self):
+        """
+        Optimize and execute the recorded logical plan.
+        The columns that are not needed are never read. As in eager mode a query does not modify
+        the dataframe: if the plan ends with a query its result is returned, computed from a read
+        that uses the query predicates as parquet row-group filters, while the dataframe is
+        built from the unfiltered data.
+        """
+        if self._plan is None:
+            return self._df
+
+        self._replaying = True
+        try:
+            plan = self._plan.optimize(self._source_dtypes())
+            source, nodes = plan.nodes[0], plan.nodes[1:]
+            final = nodes.pop() if len(nodes) > 0 and nodes[-1].op == 'query' else None
+            self._replay(source, nodes, filters=False)
+            if final is None:
+                return self._df
+            if source.op != 'scan' or not source.kwargs.get('filters'):
+                return self._df.query(final.kwargs['query'])
+
+            state = (self._df, self._source)
+            self._replay(source, nodes, filters=True)
+            result = self._df.query(final.kwargs['query'])
+            self._df, self._source = state
+            return result
+        finally:
+            self._replaying = False
+            self._plan = None
+
+    def _replay(self, source, nodes, filters):
+        """
+        Read the source of an optimized plan (with or without its pushed filters) and apply the nodes.
+        The arguments passed to load_dataset are always used; the pushed filters are AND-ed with
+        the ones of the caller.
+        """
+        if source.op == 'scan':
+            kwargs = dict(source.kwargs.get('read_kwargs', {}))
+            if source.kwargs.get('columns') is not None:
+                kwargs['columns'] = source.kwargs['columns']
+            if filters:
+                kwargs['filters'] = and_filters(kwargs.get('filters'), source.kwargs['filters'])
+                self._pruning = prune_pieces(source.kwargs['path'], kwargs['filters'])
+            self.read_parquet(source.kwargs['path'], **kwargs)
+        for node in nodes:
+            getattr(self, node.op)(**node.kwargs)
+
     def sort(self, column, ascending=True):
         """
         Sort the dataframe by the provided column
@@ -110,6 +578,8 @@ class BaseDfBench(object):
         Columns is a list of column names
         :param columns columns to delete
         """
+        if self._record('delete_columns', columns=columns):
+            return self._plan
         
         self.df = self.df.drop(columns=columns)
 
@@ -121,6 +591,8 @@ class BaseDfBench(object):
         Columns is a dictionary: {"column_name": "new_name"}
         :param columns a dictionary that contains for each column to rename the new name
         """
+        if self._record('rename_columns', columns=columns):
+            return self._plan
         
         self.df = self.df.rename(columns=columns)
 
@@ -167,7 +639,7 @@ class BaseDfBench(object):
 
         dummies = dd.get_dummies(self.df.categorize(columns)[columns]).repartition(npartitions=self.df.npartitions)
         self.df = self.df.repartition(npartitions=self.df.npartitions)
-        self.df = dd.multi.concat([self.df.drop(columns=columns), dummies], axis=1)
+        self.df = dd.concat([self.df.drop(columns=columns), dummies], axis=1)
         return self.df
 
     def locate_null_values(self, column):
@@ -212,11 +684,39 @@ class BaseDfBench(object):
         :param lower_quantile lower quantile (default 0.1)
         :param upper_quantile upper quantile (default 0.99)
         """
-        q_low = self.df[column].quantile(lower_quantile)
-        q_hi  = self.df[column].quantile(upper_quantile)
-        # print(q_low, q_hi)
+        q_low, q_hi = self.get_quantile_sketches([column])[column].quantile([lower_quantile, upper_quantile])
 
         return self.df[column][self.df[column].lt(q_low) | self.df[column].gt(q_hi)]
+
+    def _sketch_token(self, column):
+        return (self.df[column]._name, self.sketch_error)
+
+    def get_quantile_sketches(self, columns):
+        """
+        Returns a dictionary with a quantile sketch for every provided numeric column.
+        The sketches are cached on the instance: the ones that are missing (or built
+        on a previous version of the column) are computed together in a single pass,
+        building a sketch per partition and merging them with a tree reduction.
+        :param columns numeric columns
+        """
+        missing = [c for c in columns if c not in self._sketches or self._sketches[c][0] != self._sketch_token(c)]
+        if len(missing) > 0:
+            parts = [delayed(build_quantile_sketches)(part, missing, self.sketch_error, i)
+                     for i, part in enumerate(self.df[missing].to_delayed())]
+            sketches = tree_reduce(parts, delayed(merge_quantile_sketches)).compute()
+            for column, sketch in sketches.items():
+                self._sketches[column] = (self._sketch_token(column), sketch)
+
+        return {c: self._sketches[c][1] for c in columns}
+
+    def get_quantile_bins(self, column, bins):
+        """
+        Returns the edges of bins equal-frequency bins of the provided column,
+        computed on the cached quantile sketch
+        :param column numeric column
+        :param bins number of bins
+        """
+        return self.get_quantile_sketches([column])[column].quantile(np.linspace(0, 1, bins + 1))
     
     def get_columns_types(self):
         """
@@ -234,23 +734,81 @@ class BaseDfBench(object):
         :param dtypes a dictionary that provides for ech column to cast the new datatype
                For example  {'col_name': 'int8'}
         """
+        if self._record('cast_columns_types', dtypes=dtypes):
+            return self._plan
         
         self.df = self.df.astype(dtypes)
 
         return self.df
 
-    def get_stats(self):
+    def get_stats(self, percentiles=(0.25, 0.5, 0.75)):
         """
         Returns dataframe statistics.
         Only for numeric columns.
         Min value, max value, average value, standard deviation, and standard quantiles.
+        The statistics are computed on the cached quantile sketches (see get_quantile_sketches).
+        :param percentiles percentiles to include in the output (default (0.25, 0.5, 0.75))
         """
-        
-        return self.df.describe()
+        import pandas as pd
+
+        numeric = self.col_type(['numeric'])
+        sketches = self.get_quantile_sketches([c for c in self.get_columns() if c in numeric])
+        stats = {}
+        for column, sketch in sketches.items():
+            stats[column] = [sketch.count(), sketch.mean if sketch.count() > 0 else np.nan, sketch.std(), sketch.min]
+            stats[column] += list(sketch.quantile(list(percentiles))) + [sketch.max]
+        index = ['count', 'mean', 'std', 'min'] + ['{:g}%'.format(p * 100) for p in percentiles] + ['max']
+
+        return pd.DataFrame(stats, index=index)
 
-    #TODO
-    #ma mi sa da cambiare proprio, purtroppo cudf non ha Dataframe.to_numeric() ma ha solo cudf.to_numeric, il ché rende impossibile la conversione per questioni di file meta
-    def find_mismatched_dtypes(self):
+    def profile(self, columns=None, quantiles=(0.25, 0.5, 0.75), top_k=5):
+        """
+        Returns, in a single pass over the data, a dataframe with a row for every column and:
+        null count, min/max, mean/std, approximate distinct count, top-k values and quantiles.
+        Every partition is summarized independently and the summaries are merged with a tree reduction,
+        so the dataset is read exactly once.
+        :param columns columns to profile, all the columns if None (default None)
+        :param quantiles quantiles to compute on numeric columns (default (0.25, 0.5, 0.75))
+        :param top_k number of most frequent values to return for every column (default 5)
+        """
+        df = self.df if columns is None else self.df[columns]
+
+        parts = [delayed(profile_partition)(part, top_capacity=max(100, 10 * top_k), epsilon=self.sketch_error, seed=i)
+                 for i, part in enumerate(df.to_delayed())]
+        profile = tree_reduce(parts, delayed(merge_profiles)).compute()
+        for column, column_profile in profile.items():
+            if column_profile.kind == 'numeric':
+                self._sketches[column] = (self._sketch_token(column), column_profile.sketch)
+
+        return finalize_profile(profile, quantiles, top_k)
+
+    def infer_dtypes(self, sample_rows=1000, min_ratio=0.9):
+        """
+        Suggest a dtype for the string columns looking at the first sample_rows rows of every partition.
+        Boolean, numeric, datetime and categorical parses are tried on the sample;
+        only the columns where the sample is ambiguous (some values don't parse,
+        or integers, whose width needs the range of the whole column) are checked with a single
+        scan of those columns.
+        Returns a dictionary {'col_name': 'suggested_dtype'}
+        :param sample_rows number of rows sampled from every partition (default 1000)
+        :param min_ratio minimum fraction of parsed values in the sample to consider a dtype (default 0.9)
+        """
+        columns = string_columns(self.get_columns_types())
+        sample = self.df[columns].map_partitions(lambda part: part.head(sample_rows)).compute()
+        sample = sample.to_pandas() if hasattr(sample, 'to_pandas') else sample
+
+        candidates = {c: infer_column(sample[c], min_ratio) for c in columns}
+        candidates = {c: k for c, k in candidates.items() if k is not None}
+        ambiguous = {c: k for c, k in candidates.items() if k.ambiguous}
+
+        checks = {}
+        if len(ambiguous) > 0:
+            parts = [delayed(check_partition)(part, ambiguous) for part in self.df[list(ambiguous)].to_delayed()]
+            checks = tree_reduce(parts, delayed(merge_checks)).compute()
+
+        return resolve(candidates, checks)
+
+    def find_mismatched_dtypes(self, sample_rows=1000):
         """
         Returns, if exists, a list of columns with mismatched data types.
         For example, a column with string dtypes that contains only integer values.
@@ -258,18 +816,51 @@ class BaseDfBench(object):
          - Col: name of the column
          - current_dtype: current data type
          - suggested_dtype: suggested data type
+        :param sample_rows number of rows sampled from every partition (see infer_dtypes)
         """
         
         current_dtypes = self.get_columns_types()
-        #new_dtypes = self.df.(cudf.to_numeric, errors='ignore', axis=1, meta=self.df).dtypes.apply(lambda x: x.name).to_dict()
+        new_dtypes = self.infer_dtypes(sample_rows)
 
         out = []
-        for k in current_dtypes.keys():
+        for k in new_dtypes.keys():
             if new_dtypes[k] != current_dtypes[k]:
                 out.append({'col': k, 'current_dtype': current_dtypes[k], 'suggested_dtype': new_dtypes[k]})
         
         return out
 
+    def compact(self, tolerance=1e-6, max_categories=10000, category_ratio=0.5, persist=False):
+        """
+        Reduce the memory footprint of the dataframe:
+         - string columns with few distinct values (estimated with a sketch) become categorical
+         - integers are downcast to the narrowest type that holds their range
+         - float64 become float32 if the relative error is within the provided tolerance
+        The statistics of all the columns are computed in a single pass.
+        Returns a dictionary with, for every column, the old and the new dtype and the bytes before and after:
+        {'col_name': {'dtype': 'int64', 'new_dtype': 'int8', 'bytes_before': 80, 'bytes_after': 10}}
+        :param tolerance maximum relative error accepted when a float is downcast (default 1e-6)
+        :param max_categories maximum number of distinct values of a categorical column (default 10000)
+        :param category_ratio maximum distinct/rows ratio of a categorical column (default 0.5)
+        :param persist if True the compacted dataframe is persisted in the cluster memory (default False)
+        """
+        dtypes = self.get_columns_types()
+        parts = [delayed(compaction_partition)(part, dtypes) for part in self.df.to_delayed()]
+        stats = tree_reduce(parts, delayed(merge_compaction)).compute()
+
+        new_dtypes = {c: s.suggest(tolerance, max_categories, category_ratio) for c, s in stats.items()}
+        new_dtypes = {c: t for c, t in new_dtypes.items() if t is not None}
+        if len(new_dtypes) > 0:
+            self.df = self.df.astype(new_dtypes)
+        if persist:
+            self.df = self.df.persist()
+
+        bytes_after = self.df.memory_usage(index=False, deep=True).compute()
+
+        return {
+            c: {'dtype': dtypes[c], 'new_dtype': new_dtypes.get(c, dtypes[c]), 'bytes_before': s.bytes, 'bytes_after': int(bytes_after[c])}
+            for c, s in stats.items()
+        }
+
     def check_allowed_char(self, column, pattern):
         """
         Return true if all the values of the provided column
@@ -304,8 +895,103 @@ class BaseDfBench(object):
 
         return self.df
 
-    #TODO
-    #PRIMA DI FARE QUESTO SERVE IL CONVERTER DELLA STRNGA SCRITTA IN ITA IN DATA
+    def parse_localized_dates(self, columns, locale='it', persist=False):
+        """
+        Convert the provided columns from textual dates (e.g. "12 gennaio 2020") to datetime.
+        All the columns are parsed and their failures counted by the same task of every partition;
+        only the counts are computed: the dataframe stays lazy, unless persist is True.
+        Values that can't be parsed become NaT.
+        Returns a dictionary with the number of values that failed the parsing for every column.
+        :param columns columns to convert
+        :param locale language of the month names (it, en) (default 'it')
+        :param persist if True the converted dataframe is persisted in the cluster memory together
+               with the counts, so the dates are parsed only once (default False)
+        """
+        months = MONTHS[locale]
+        parts = [delayed(parse_localized_dates_partition, nout=2)(part, columns, months) for part in self.df.to_delayed()]
+        frames, failures = [p[0] for p in parts], [p[1] for p in parts]
+        if persist:
+            frames, failures = dask.persist(frames, failures)
+        failures = tree_reduce(failures, delayed(sum_counts)).compute()
+
+        meta = self.df._meta.astype({c: 'datetime64[ns]' for c in columns})
+        self.df = dd.from_delayed(frames, meta=meta, divisions=self.df.divisions, verify_meta=False)
+
+        return failures
+
+    def parse_numeric_strings(self, columns, decimal=',', strip_units=True, persist=False):
+        """
+        Convert the provided columns from strings like "0,85 €/smc" to float.
+        All the columns are converted and reported together by the same task of every partition
+        (number extraction, decimal separator replacement and conversion). Only the small reports
+        are computed: the dataframe stays lazy, unless persist is True.
+        Returns a dictionary with, for every column, the most frequent unit found
+        after the numbers and the number of values coerced to NaN:
+        {'col_name': {'unit': '€/smc', 'coerced': 0}}
+        :param columns columns to convert
+        :param decimal decimal separator (default ',')
+        :param strip_units if True the unit after the number is removed,
+               otherwise values with a unit become NaN (default True)
+        :param persist if True the converted dataframe is persisted in the cluster memory together
+               with the reports, so the strings are parsed only once (default False)
+        """
+        # numeric columns are already converted
+        columns = [c for c in columns if self.df[c].dtype.kind not in 'biuf']
+        if len(columns) == 0:
+            return {}
+
+        # every partition is converted and reported by the same task
+        parts = [delayed(parse_numeric_strings_partition, nout=2)(part, columns, decimal, strip_units)
+                 for part in self.df.to_delayed()]
+        frames, reports = [p[0] for p in parts], [p[1] for p in parts]
+        if persist:
+            frames, reports = dask.persist(frames, reports)
+        report = tree_reduce(reports, delayed(merge_numeric_strings_reports)).compute()
+
+        meta = self.df._meta.astype({c: 'float64' for c in columns})
+        divisions = self.df.divisions if len(frames) == self.df.npartitions else None
+        self.df = dd.from_delayed(frames, meta=meta, divisions=divisions, verify_meta=False)
+
+        return {c: {'unit': r['units'].idxmax() if len(r['units']) > 0 else None, 'coerced': r['coerced']} for c, r in report.items()}
+
+    def enrich_region(self, city_column, reference, region_column='Region', city_field='Comune', region_field='Regione'):
+        """
+        Add a column with the region of the city of every row, looked up in a reference table
+        (comune -> regione). The reference file is read only once per instance; the city names
+        of both sides are normalized in the same way (diacritics, apostrophes, whitespace and case)
+        and the small lookup table is broadcast to every worker, so every partition is joined
+        locally without shuffling the invoices.
+        Returns a dictionary with the number of rows of every unmatched city name
+        and the names that appear in more than one region of the reference:
+        {'unmatched': pandas series, 'ambiguous': [...]}
+        :param city_column column with the city names
+        :param reference path of a csv/parquet file or pandas dataframe with the reference table
+        :param region_column name of the new column (default Region)
+        :param city_field column of the reference with the city names (default Comune)
+        :param region_field column of the reference with the regions (default Regione)
+        """
+        key = (reference, city_field, region_field) if isinstance(reference, str) else None
+        if key not in self._references:
+            lookup, ambiguous = name_lookup(reference, city_field, region_field)
+            if self.type_of_istance == "DASK_CUDF":
+                lookup = cudf.from_pandas(lookup)
+            lookup = self.client.scatter(lookup, broadcast=True)
+            if key is None:
+                return self._enrich_region(city_column, region_column, lookup, ambiguous)
+            self._references[key] = (lookup, ambiguous)
+
+        return self._enrich_region(city_column, region_column, *self._references[key])
+
+    def _enrich_region(self, city_column, region_column, lookup, ambiguous):
+        self.df[region_column] = self.df[city_column].map_partitions(map_names, lookup, meta=(region_column, 'object'))
+
+        unmatched = self.df[city_column][self.df[region_column].isna() & ~self.df[city_column].isna()]
+        unmatched = unmatched.value_counts().compute()
+        unmatched = unmatched.to_pandas() if hasattr(unmatched, 'to_pandas') else unmatched
+
+        return {'unmatched': unmatched, 'ambiguous': ambiguous}
+
+    # the textual dates must be converted first (see parse_localized_dates)
     def change_date_time_format(self, column, str_date_time_format):
         """
         Change the date/time format of the provided column
@@ -349,6 +1035,8 @@ class BaseDfBench(object):
         :param columns columns to modify
         :param case case format (lower, upper, title, capitalize, swapcase)
         """
+        if self._record('set_content_case', columns=columns, case=case):
+            return self._plan
         
         if len(columns) == 0:
             columns = list(self.df.columns.values)
@@ -432,6 +1120,8 @@ class BaseDfBench(object):
         :param columns columns to edit
         :param chars characters to remove
         """
+        if self._record('strip', columns=columns, chars=chars):
+            return self._plan
         
         for column in columns:
             self.df[column] = self.df[column].str.strip(chars)
@@ -444,19 +1134,59 @@ class BaseDfBench(object):
         Columns is a list of column names
         :param columns columns to edit
         """
+        if self._record('remove_diacritics', columns=columns):
+            return self._plan
         
         for column in columns:
             self.df[column] = self.df[column].str.normalize_characters('NFKD')
         
         return self.df
 
-    def set_index(self, column):
+    def clean_strings(self, columns=[], strip=True, case=None, fold_diacritics=False, collapse_whitespace=False):
         """
-        Set the provided column as index
+        Clean the strings of the provided columns in a single pass: all the transforms of all
+        the columns are applied by one kernel on every partition, instead of a layer of the graph
+        for every column and transform (see strip, set_content_case and remove_diacritics).
+        The columns that don't contain strings are skipped.
+        :param columns columns to clean (default all the string columns)
+        :param strip True to remove leading/trailing whitespaces, the characters to remove or False
+        :param case lower, upper, title, capitalize, swapcase or None to keep it
+        :param fold_diacritics if True accented letters become plain letters
+        :param collapse_whitespace if True every sequence of whitespaces becomes a single space
+        """
+        if self._record('clean_strings', columns=columns, strip=strip, case=case,
+                        fold_diacritics=fold_diacritics, collapse_whitespace=collapse_whitespace):
+            return self._plan
+
+        strings = string_columns({k: str(v) for k, v in dict(self.df.dtypes).items()})
+        columns = [c for c in columns if c in strings] if len(columns) > 0 else strings
+        if len(columns) == 0:
+            return self.df
+
+        cleaned = self.df[columns].map_partitions(clean_strings_frame, columns, strip, case, fold_diacritics,
+                                                  collapse_whitespace, meta=self.df[columns]._meta)
+        self.df[columns] = cleaned
+
+        return self.df
+
+    def set_index(self, column, path=None):
+        """
+        Set the provided column as index.
+        The sort is needed only once: if path is provided the sorted dataframe is saved there
+        with its divisions, and load_dataset (or read_parquet) on that path restores the index
+        with known divisions without computing anything, so loc lookups and range selections
+        on the index read only the partitions that contain the keys.
         :param column to use as index
+        :param path where to save the sorted dataframe (default None, not saved)
         """
-        
+        if self.df.index.name == column and self.df.known_divisions:
+            # already sorted
+            return self.df
+
         self.df = self.df.set_index(column)
+        if path is not None:
+            self.to_parquet(path)
+            self.read_parquet(path)
         
         return self.df
 
@@ -566,6 +1296,9 @@ class BaseDfBench(object):
         :param value value to replace with
         :param regex if True means that to_replace is a regex
         """
+        if self._record('replace', columns=columns, to_replace=to_replace, value=value, regex=regex):
+            return self._plan
+
         if regex == False:
             self.df[columns] = self.df[columns].replace(to_replace=to_replace, value=value, regex=regex)
         else:
@@ -627,15 +1360,71 @@ class BaseDfBench(object):
         
         return self.df
     '''
+    def _column_signatures(self, k=256):
+        """
+        Compute in a single pass the fingerprints and the MinHash signatures of every column
+        :param k size of the MinHash signatures
+        """
+        parts = [delayed(signature_partition)(part, i, k) for i, part in enumerate(self.df.to_delayed())]
+
+        return tree_reduce(parts, delayed(merge_signatures)).compute()
+
     def get_duplicate_columns(self):
         """
         Return a list of duplicate columns, if exists.
         Duplicate columns are those which have same values for each row.
+        The columns are compared through the fingerprints of their partitions,
+        computed with a single scan of the dataframe.
         """
         
         cols = self.df.columns.values
+        signatures = self._column_signatures(k=1)
+        fingerprints = {c: signatures[c].fingerprint() for c in cols}
         
-        return [(cols[i], cols[j]) for i in range(0, len(cols)) for j in range(i+1, len(cols)) if (self.df[cols[i]].dtype == self.df[cols[j]].dtype and da.equal(self.df[cols[i]], self.df[cols[j]]).all().compute())]
+        return [(cols[i], cols[j]) for i in range(0, len(cols)) for j in range(i+1, len(cols)) if (self.df[cols[i]].dtype == self.df[cols[j]].dtype and fingerprints[cols[i]] == fingerprints[cols[j]])]
+
+    def get_similar_columns(self, threshold=0.9, k=256, verify=True):
+        """
+        Return a list of (column, column, similarity) for the pairs of columns
+        that have the same value in at least threshold of the rows.
+        Duplicate columns have similarity 1.
+        Fingerprints and MinHash signatures of all the columns are computed in a single scan;
+        if verify is True the pairs whose estimated similarity is close to the threshold
+        are checked exactly with one more scan of the candidate columns only.
+        :param threshold minimum fraction of equal rows (default 0.9)
+        :param k size of the MinHash signatures, the error of the estimate is about 1/sqrt(k) (default 256)
+        :param verify if True compute the exact similarity of the candidate pairs (default True)
+        """
+        
+        cols = self.df.columns.values
+        signatures = self._column_signatures(k)
+        margin = 3 / np.sqrt(k) if verify else 0
+
+        out = []
+        candidates = {}
+        for i in range(0, len(cols)):
+            for j in range(i+1, len(cols)):
+                a, b = signatures[cols[i]], signatures[cols[j]]
+                if a.dtype != b.dtype:
+                    continue
+                if a.fingerprint() == b.fingerprint():
+                    out.append((cols[i], cols[j], 1.0))
+                    continue
+                similarity = a.similarity(b)
+                if similarity >= threshold - margin:
+                    candidates[(cols[i], cols[j])] = similarity
+
+        if verify and len(candidates) > 0:
+            pairs = list(candidates)
+            columns = sorted({c for pair in pairs for c in pair})
+            parts = [delayed(equal_rows_partition)(part, pairs) for part in self.df[columns].to_delayed()]
+            equal = tree_reduce(parts, delayed(sum_counts)).compute()
+            rows = signatures[cols[0]].rows
+            candidates = {pair: equal[pair] / float(rows) for pair in pairs}
+
+        out += [(a, b, s) for (a, b), s in candidates.items() if s >= threshold]
+
+        return out
 
     def to_csv(self, path, **kwargs):
         """
@@ -648,16 +1437,152 @@ class BaseDfBench(object):
 
         pass
     
-    def to_parquet(self, path, **kwargs):
+    def to_arrow(self, path, compression=None):
+        """
+        Export the dataframe as a directory of Arrow IPC files, one part.N.arrow for every
+        partition, written in parallel. Without compression the files are reloaded by
+        load_dataset(format="arrow") mapping them in memory, without decoding.
+        Known divisions are saved next to the files. The part files and the divisions of a previous
+        export in the same directory are removed first.
+        :param path output directory
+        :param compression None, lz4 or zstd (a compressed file must be decoded when it is read)
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in ipc_files(path):
+            os.remove(name)
+        remove_divisions(path)
+        parts = self.df.to_delayed()
+        dask.compute(*[delayed(write_ipc)(part, os.path.join(path, 'part.{}.arrow'.format(i)), compression)
+                       for i, part in enumerate(parts)])
+        if self.df.known_divisions:
+            write_divisions(path, self.df, extension='arrow')
+
+    def normalize_star_schema(self, path, key='user_code', utility_columns=UTILITY_COLUMNS, customer_columns=CUSTOMER_COLUMNS,
+                              utility_key=UTILITY_KEY, invoice_key=INVOICE_KEY):
+        """
+        Split the invoices into the utility, customer and invoice tables of a star schema
+        and write them as parquet datasets in path/utility, path/customer and path/invoice.
+        The data is shuffled only once, ordering the rows by the customer key: all the rows of
+        a customer end up in the same partition, so the duplicated rows of the three tables are
+        removed partition by partition and the tables share the same known divisions.
+        The shuffle is the sort of set_index rather than a hash partitioning: only a range
+        partitioning gives known divisions, which are saved next to every table, so load_dataset
+        (or read_parquet) restores them without computing anything.
+        The primary keys are checked while the tables are written.
+        Returns the paths of the tables, their rows and the number of duplicated primary keys:
+        {'paths': {...}, 'rows': {...}, 'duplicated_keys': {'utility': 0, 'customer': 0, 'invoice': 0}}
+        :param path output directory
+        :param key primary key of the customers (default user_code)
+        :param utility_columns columns of the utility table
+        :param customer_columns columns of the customer table
+        :param utility_key columns that, with the customer key, identify a utility (default customer_code)
+        :param invoice_key columns that identify an invoice (default bill_id, emission_date)
+        """
+        import dask
+
+        # the invoices keep the foreign key of the utility
+        invoice_columns = [c for c in self.df.columns if c != key and (c not in utility_columns + customer_columns or c in utility_key)]
+
+        base = self.df.set_index(key)
+        args = (utility_columns, customer_columns, invoice_columns, utility_key, invoice_key)
+        meta = split_partition(base._meta, *args)
+        parts = [delayed(split_partition, nout=4)(part, *args) for part in base.to_delayed()]
+
+        names = ('utility', 'customer', 'invoice')
+        paths = {name: os.path.join(path, name) for name in names}
+        tables, writes = [], []
+        for i, name in enumerate(names):
+            table = dd.from_delayed([part[i] for part in parts], meta=meta[i], divisions=base.divisions)
+            remove_divisions(paths[name])
+            tables.append(table)
+            writes.append(table.to_parquet(paths[name], compute=False))
+        stats = tree_reduce([part[3] for part in parts], delayed(merge_split_stats))
+
+        # a single computation: the shuffled partitions are shared by the three tables
+        stats = dask.compute(stats, *writes)[0]
+        for name, table in zip(names, tables):
+            write_divisions(paths[name], table)
+
+        return {'paths': paths, 'rows': stats['rows'], 'duplicated_keys': stats['duplicated_keys']}
+
+    def to_parquet(self, path, partition_on=None, row_group_size=None, sort_by=None, statistics=True,
+                   dictionary='auto', compression='snappy', **kwargs):
         """
         Export the dataframe in a parquet file.
+        The layout can be tuned so that the later reads (with filters, see query) skip most of the data:
+        hive partitioning on some columns, rows sorted inside every file and min/max statistics
+        for every row group.
         :param path path on which store the parquet
-        :param kwargs extra parameters
-        """
-        
-        self.df.to_parquet(path, **kwargs)
-
-        pass
+        :param partition_on columns used to split the data in directories (e.g. ['Region', 'supply_type'])
+        :param row_group_size maximum number of rows of every row group (default the writer default)
+        :param sort_by columns used to sort the rows inside every file, without shuffling the data
+        :param statistics if True the min/max statistics of every row group are written (default True)
+        :param dictionary columns to dictionary-encode, True/False for all/none of the columns, or 'auto':
+               the string columns with few distinct values (estimated on a sample of rows spread over the
+               partitions) are dictionary-encoded, the other string columns are not and the remaining
+               columns keep the writer default (default 'auto')
+        :param compression compression codec: snappy, gzip, zstd, lz4, brotli or None (default snappy)
+        :param kwargs extra parameters of the dask writer (e.g. write_metadata_file, default True)
+        """
+        df = self.df
+        if sort_by is not None:
+            df = df.map_partitions(lambda part: part.sort_values(sort_by))
+        # string column -> True if it has few distinct values
+        auto = self._dictionary_columns() if isinstance(dictionary, str) and dictionary == 'auto' else None
+
+        if self.type_of_istance == "DASK_CUDF":
+            # cudf writer: the columns missing from column_encoding keep the default encoding
+            if row_group_size is not None:
+                kwargs['row_group_size_rows'] = row_group_size
+            kwargs['statistics'] = 'ROWGROUP' if statistics else 'NONE'
+            if auto is not None:
+                kwargs['column_encoding'] = {c: 'DICTIONARY' if few else 'PLAIN' for c, few in auto.items()}
+            else:
+                if not isinstance(dictionary, list):
+                    dictionary = list(df.columns) if dictionary else []
+                kwargs['column_encoding'] = {c: 'DICTIONARY' if c in dictionary else 'PLAIN' for c in df.columns}
+        else:
+            # pyarrow writer: with a list only the listed columns are dictionary-encoded,
+            # so the columns that are not strings are listed too, as with the default (all)
+            if row_group_size is not None:
+                kwargs['row_group_size'] = row_group_size
+            kwargs['write_statistics'] = statistics
+            if auto is not None:
+                dictionary = [c for c in list(df.columns) + [df.index.name] if c is not None and auto.get(c, True)]
+            kwargs['use_dictionary'] = dictionary
+
+        # the divisions of the previous data must not be applied to the new files
+        remove_divisions(path)
+        kwargs.setdefault('write_metadata_file', True)
+        df.to_parquet(path, partition_on=partition_on, compression=compression, **kwargs)
+
+        # a sorted index is saved with its divisions, so it is restored by read_parquet
+        if df.known_divisions and partition_on is None and sort_by is None:
+            write_divisions(path, df)
+        # the lookup indexes of the dataset follow the new files
+        for (indexed, column), index in self._lookup_indexes.items():
+            if indexed == path:
+                index.update()
+
+    def _dictionary_columns(self, sample_rows=10000, ratio=0.1, sample_partitions=8):
+        """
+        Return a dictionary string/categorical column -> True if it has few distinct values
+        in random rows of up to sample_partitions partitions spread over the dataframe
+        (the first rows of sorted data have few distinct values even in a unique column)
+        :param sample_rows number of rows to check
+        :param ratio maximum distinct/rows ratio
+        :param sample_partitions number of partitions read
+        """
+        columns = string_columns({k: str(v) for k, v in dict(self.df.dtypes).items()})
+        columns += [c for c, t in dict(self.df.dtypes).items() if str(t) == 'category']
+        if len(columns) == 0:
+            return {}
+        npartitions = self.df.npartitions
+        picked = sorted(set(np.linspace(0, npartitions - 1, min(sample_partitions, npartitions)).astype(int).tolist()))
+        rows = max(sample_rows // len(picked), 1)
+        df = self.df[columns].partitions[picked]
+        sample = df.map_partitions(lambda part: part.sample(n=min(rows, len(part)), random_state=0), meta=df._meta).compute()
+        return {c: sample[c].nunique() <= ratio * max(len(sample), 1) for c in columns}
 
     def query(self, query):
         """
@@ -668,8 +1593,95 @@ class BaseDfBench(object):
         :param query: a string with the query conditions, e.g. "col1 > 1 and col2 < 10"
         :return: subset of the dataframe that correspond to the selection conditions
         """
-        
+        if self._record('query', query=query):
+            return self._plan
+
+        pruned = self._pruned_source(query)
+        if pruned is not None:
+            return pruned.query(query)
+
         return self.df.query(query)
+
+    def _pruned_source(self, query):
+        """
+        If the dataframe is still the parquet dataset as it was read, read it again with the
+        simple predicates of the query as filters: the files and row groups whose hive partition
+        values or min/max statistics don't match are skipped before any task is scheduled.
+        Returns None if the query can't be used to prune the dataset.
+        """
+        self._pruning = None
+        if self._source is None:
+            return None
+        path, kwargs, frame, name = self._source
+        if self._df is not frame or self._df._name != name or kwargs.get('filters'):
+            return None
+        referenced = query_columns(query)
+        filters = query_to_filters(query)
+        if filters is None or referenced is None or not referenced <= set(self._df.columns):
+            return None
+
+        filters = coerce_filters(filters, dict(self._df.dtypes))
+        pruned = self._read_parquet(path, filters=filters, **kwargs)
+        self._pruning = prune_pieces(path, filters)
+        self._pruning.update({'partitions': self._df.npartitions, 'pruned_partitions': self._df.npartitions - pruned.npartitions})
+
+        return pruned
+
+    def get_pruning(self):
+        """
+        Return how many files, row groups and partitions have been skipped by the last query
+        (or by the last collect in lazy mode), None if the dataset has not been pruned
+        """
+        return self._pruning
+
+    def _lookup_index(self, column, path=None):
+        path = path or self._parquet_path
+        if path is None:
+            raise ValueError('no parquet dataset: pass the path of the dataset')
+        if (path, column) not in self._lookup_indexes:
+            self._lookup_indexes[(path, column)] = LookupIndex(path, column)
+        return self._lookup_indexes[(path, column)]
+
+    def build_lookup_index(self, columns, path=None):
+        """
+        Build (or bring up to date) a secondary index of the provided columns of a parquet dataset,
+        saved in its _index directory: every value is mapped to its file, row group and row offset.
+        Only the files added or modified since the last call are indexed.
+        Returns the number of files indexed for every column.
+        :param columns columns to index (e.g. ['bill_id', 'user_code'])
+        :param path path of the dataset (default the last dataset read)
+        """
+        return {column: self._lookup_index(column, path).update() for column in columns}
+
+    def lookup(self, column, keys, columns=None, path=None):
+        """
+        Return the rows whose column is one of the keys, reading only the row groups that contain them
+        instead of scanning the dataset (e.g. an invoice or the history of some customers).
+        The column must have been indexed with build_lookup_index.
+        :param column indexed column
+        :param keys value or list of values
+        :param columns columns to return (default all)
+        :param path path of the dataset (default the last dataset read)
+        """
+        keys = keys if isinstance(keys, (list, tuple, set, np.ndarray)) else [keys]
+        out = self._lookup_index(column, path).lookup(keys, columns)
+        if self.type_of_istance == "DASK_CUDF":
+            return cudf.from_pandas(out)
+        return out
+
+    def set_indexed_value(self, column, keys, target, value, path=None):
+        """
+        Set the target column to value in the rows whose column is one of the keys, rewriting
+        only the files that contain them; the dataframe reads the new values when it is computed.
+        Returns the number of rows modified.
+        :param column indexed column
+        :param keys value or list of values
+        :param target column to modify
+        :param value value to set
+        :param path path of the dataset (default the last dataset read)
+        """
+        keys = keys if isinstance(keys, (list, tuple, set, np.ndarray)) else [keys]
+        return self._lookup_index(column, path).set_value(keys, target, value)
     
     def col_type(self, find=['numeric']):
         """
@@ -0,0 +1,253 @@
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+
+if __name__ == '__main__' and not __package__:
+    # run as a script (python benchmark.py): the directory of this file would shadow pandas with
+    # pandas.py, so the modules are imported from the df_benchmark package that contains it
+    _here = os.path.dirname(os.path.abspath(__file__))
+    sys.path = [p for p in sys.path if os.path.abspath(p or os.curdir) != _here]
+    sys.path.insert(0, os.path.dirname(os.path.dirname(_here)))
+
+import pandas as pd
+from df_benchmark.algorithms.monitoring import MemorySampler
+
+# Parameters of the operations, chosen for the invoices schema (see README)
+DEFAULT_PARAMS = {
+    'sort': {'columns': ['bill_id']},
+    'query': {'query': 'age > 30'},
+    'groupby': {'columns': ['city'], 'f': {'total_amount': 'sum'}},
+    'join': {'on': 'user_code', 'columns': ['age']},
+    'drop_duplicates': {},
+    'one_hot_encoding': {'columns': ['sex']},
+    'pivot': {'index': 'city', 'columns': 'supply_type', 'values': 'total_amount', 'aggfunc': 'sum'},
+}
+
+
+def _join(bench, on, columns):
+    # self join with a dimension table built from the same data, so every backend joins the same rows
+    other = bench.get_df()[[on] + columns].drop_duplicates(subset=[on])
+    other = other.rename(columns={c: c + '_right' for c in columns})
+    return bench.join(other, left_on=on, right_on=on, how='inner')
+
+
+def _pivot(bench, index, columns, values, aggfunc):
+    if hasattr(bench.get_df(), 'categorize'):
+        # the Dask pivot table needs the categories of the columns to be known
+        bench.df = bench.get_df().categorize(columns=[columns])
+    return bench.pivot(index, columns, values, aggfunc)
+
+
+OPERATIONS = {
+    'sort': lambda bench, p: bench.sort(p['columns']),
+    'query': lambda bench, p: bench.query(p['query']),
+    'groupby': lambda bench, p: bench.groupby(p['columns'], p['f']),
+    'join': lambda bench, p: _join(bench, p['on'], p['columns']),
+    'drop_duplicates': lambda bench, p: bench.drop_duplicates(),
+    'one_hot_encoding': lambda bench, p: bench.one_hot_encoding(p['columns']),
+    'pivot': lambda bench, p: _pivot(bench, **p),
+}
+
+
+def _pandas():
+    from df_benchmark.algorithms.pandas import pandasBench
+    return pandasBench()
+
+
+def _dask(type_of_istance):
+    def factory():
+        from df_benchmark.algorithms.base_dask_cudf import BaseDfBench
+        return BaseDfBench(type_of_istance)
+    return factory
+
+
+BACKENDS = {
+    'pandas': _pandas,
+    'dask': _dask('DASK'),
+    'dask_cudf': _dask('DASK_CUDF'),
+}
+
+
+def available_backends():
+    """
+    Return the names of the backends that can be used in this environment
+    (the cudf ones need a GPU and the RAPIDS libraries)
+    """
+    names = ['pandas', 'dask']
+    if importlib.util.find_spec('dask_cudf') is None:
+        return names
+    try:
+        import cudf
+        if cudf.cuda.runtime.getDeviceCount() > 0:
+            names.append('dask_cudf')
+    except Exception:
+        pass
+    return names
+
+
+def prepare_scales(source, scales, workdir):
+    """
+    Write a parquet dataset with the provided number of rows for every scale;
+    the rows are taken from the beginning of the source dataset, repeated if the source is smaller.
+    Returns a dictionary rows -> path.
+    :param source path of the source parquet dataset
+    :param scales list of row counts
+    :param workdir directory where the datasets are written
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    dataset = ds.dataset(source, format='parquet')
+    out = {}
+    for rows in scales:
+        path = os.path.join(workdir, 'rows={}'.format(rows))
+        out[rows] = path
+        if os.path.exists(path):
+            continue
+        table = dataset.head(rows)
+        if table.num_rows == 0:
+            raise ValueError('empty source dataset: ' + source)
+        while table.num_rows < rows:
+            table = pa.concat_tables([table, table.slice(0, rows - table.num_rows)])
+        os.makedirs(path)
+        pq.write_table(table, os.path.join(path, 'part.0.parquet'))
+    return out
+
+
+def _materialize(result):
+    """
+    Force the computation of a (possibly lazy) result and return its number of rows
+    """
+    if result is None:
+        return None
+    if hasattr(result, 'dask'):
+        from dask.distributed import wait
+        result = result.persist()
+        wait(result)
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+def _load(bench, path):
+    bench.load_dataset(path=path, format='parquet')
+    if hasattr(bench.get_df(), 'dask'):
+        # keep the input in memory, so the timings don't include the read
+        bench.df = bench.get_df().persist()
+        _materialize(bench.get_df())
+
+
+def _measure(bench, operation, run):
+    client = getattr(bench, 'client', None)
+    record = {'operation': operation, 'seconds': None, 'peak_memory': None, 'rows_out': None, 'error': None}
+    start = time.perf_counter()
+    try:
+        with MemorySampler(client) as sampler:
+            record['rows_out'] = _materialize(run())
+        record['seconds'] = time.perf_counter() - start
+        record['peak_memory'] = sampler.peak.get('rss')
+    except Exception as e:
+        record['error'] = '{}: {}'.format(type(e).__name__, e)
+    return record
+
+
+def run_benchmark(datasets, backends=None, operations=None, params=None, warmup=1, repeat=3):
+    """
+    Run every operation on every backend and dataset.
+    Before every run the dataset is loaded again (outside of the measure), so the
+    operations that modify the internal dataframe start from the same input;
+    load_dataset is measured as an operation on its own.
+    Returns a list of records with backend, rows_in, operation, repeat, seconds,
+    peak_memory (bytes, driver + workers), rows_out and error.
+    :param datasets dictionary rows -> parquet path (see prepare_scales)
+    :param backends names of the backends (default all the available ones)
+    :param operations names of the operations (default load_dataset and all the OPERATIONS)
+    :param params dictionary operation -> parameters, merged with DEFAULT_PARAMS
+    :param warmup number of runs not recorded (default 1)
+    :param repeat number of recorded runs (default 3)
+    """
+    backends = backends or available_backends()
+    operations = operations or ['load_dataset'] + list(OPERATIONS)
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+
+    records = []
+    for name in backends:
+        bench = BACKENDS[name]()
+        try:
+            for rows, path in sorted(datasets.items()):
+                for operation in operations:
+                    for i in range(warmup + repeat):
+                        if operation == 'load_dataset':
+                            record = _measure(bench, operation, lambda: bench.load_dataset(path=path, format='parquet'))
+                        else:
+                            _load(bench, path)
+                            record = _measure(bench, operation, lambda: OPERATIONS[operation](bench, params[operation]))
+                        if i < warmup:
+                            continue
+                        record.update({'backend': name, 'rows_in': rows, 'repeat': i - warmup})
+                        records.append(record)
+        finally:
+            client = getattr(bench, 'client', None)
+            if client is not None:
+                client.close()
+    return records
+
+
+def comparison_table(records, measure='seconds'):
+    """
+    Return a dataframe with the median of a measure for every (rows_in, operation) and backend
+    :param records output of run_benchmark
+    :param measure seconds, peak_memory or rows_out (default seconds)
+    """
+    df = pd.DataFrame(records)
+    df = df[df['error'].isna()]
+    return df.pivot_table(index=['rows_in', 'operation'], columns='backend', values=measure, aggfunc='median')
+
+
+def write_results(records, output):
+    """
+    Write the raw records (results.json) and a comparison table for every measure (csv and txt)
+    :param records output of run_benchmark
+    :param output directory
+    """
+    os.makedirs(output, exist_ok=True)
+    with open(os.path.join(output, 'results.json'), 'w') as f:
+        json.dump(records, f, indent=2)
+    for measure in ('seconds', 'peak_memory', 'rows_out'):
+        table = comparison_table(records, measure)
+        table.to_csv(os.path.join(output, measure + '.csv'))
+        with open(os.path.join(output, measure + '.txt'), 'w') as f:
+            f.write(table.to_string() + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the dataframe backends on the same operations')
+    parser.add_argument('--source', default='/data/parquet', help='source parquet dataset')
+    parser.add_argument('--scales', type=int, nargs='+', default=[100000, 1000000], help='number of rows of the datasets')
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS), help='default: all the available ones')
+    parser.add_argument('--operations', nargs='+', choices=['load_dataset'] + list(OPERATIONS))
+    parser.add_argument('--params', help='json file with the parameters of the operations')
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workdir', default='benchmark_data', help='where the datasets of every scale are written')
+    parser.add_argument('--output', default='benchmark_results')
+    args = parser.parse_args()
+
+    params = None
+    if args.params:
+        with open(args.params) as f:
+            params = json.load(f)
+
+    datasets = prepare_scales(args.source, args.scales, args.workdir)
+    records = run_benchmark(datasets, args.backends, args.operations, params, args.warmup, args.repeat)
+    write_results(records, args.output)
+    print(comparison_table(records).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import base64
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+import uuid
+
+# methods whose result is materialized by default: the conversions that parse strings
+CHECKPOINT_METHODS = (
+    'cast_columns_types', 'change_date_time_format', 'parse_localized_dates',
+    'parse_numeric_strings', 'compact', 'remove_diacritics', 'clean_strings',
+)
+
+
+def dataset_fingerprint(path):
+    """
+    Return a digest of the files of a dataset (name, size and modification time of every file),
+    cheap to compute also for very large datasets
+    :param path file or directory
+    """
+    if os.path.isfile(path):
+        files = [path]
+    else:
+        files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+    digest = hashlib.blake2b(digest_size=16)
+    for name in files:
+        stat = os.stat(name)
+        digest.update('{}:{}:{};'.format(os.path.relpath(name, path), stat.st_size, stat.st_mtime_ns).encode())
+    return digest.hexdigest()
+
+
+def call_key(*parts):
+    """
+    Return a deterministic digest of the provided values (method names, arguments, previous keys);
+    the arguments are hashed with dask.base.tokenize
+    """
+    from dask.base import tokenize
+
+    return hashlib.blake2b(tokenize(*parts).encode(), digest_size=16).hexdigest()
+
+
+class CheckpointCache(object):
+    """
+    On-disk cache of dataframes stored as parquet datasets and addressed by a key
+    (the digest of the input dataset and of the calls that produced the dataframe).
+    An index file keeps size and last use of every entry; when the total size is over
+    max_bytes the least recently used entries are removed.
+    :param path directory of the cache
+    :param max_bytes maximum size of the cache (default 10 GB)
+    """
+
+    def __init__(self, path='checkpoints', max_bytes=10 * 2 ** 30):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+        self.index = self._load_index()
+
+    def _index_path(self):
+        return os.path.join(self.path, 'index.json')
+
+    def _load_index(self):
+        if not os.path.exists(self._index_path()):
+            return {}
+        with open(self._index_path()) as f:
+            index = json.load(f)
+        # drop the entries removed by hand
+        return {k: v for k, v in index.items() if os.path.isdir(os.path.join(self.path, k))}
+
+    def _save_index(self):
+        tmp = self._index_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp, self._index_path())
+
+    def _size(self, path):
+        return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+    def get(self, key):
+        """
+        Return the path of the parquet dataset stored with the provided key, None if missing
+        """
+        if key not in self.index:
+            return None
+        self.index[key]['last_used'] = time.time()
+        self._save_index()
+        return os.path.join(self.path, key)
+
+    def result(self, key):
+        """
+        Return the result of the call stored with the provided key (see put)
+        """
+        entry = self.index[key]
+        if entry.get('result') is None:
+            return None
+        return pickle.loads(base64.b64decode(entry['result']))
+
+    def put(self, key, df, description='', result=None):
+        """
+        Write a dask dataframe to the cache and return the path of the dataset
+        :param key key of the entry
+        :param df dask dataframe
+        :param description text saved in the index (e.g. the last method of the prefix)
+        :param result small value returned by the call (e.g. a report), saved in the index
+        """
+        path = os.path.join(self.path, key)
+        tmp = os.path.join(self.path, 'tmp-' + uuid.uuid4().hex)
+        df.to_parquet(tmp)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.replace(tmp, path)
+        self.index[key] = {'bytes': self._size(path), 'last_used': time.time(), 'description': description,
+                           'result': None if result is None else base64.b64encode(pickle.dumps(result)).decode()}
+        self.evict(keep=key)
+        return path
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used entries until the cache is smaller than max_bytes
+        :param keep key that must not be removed
+        """
+        total = sum(e['bytes'] for e in self.index.values())
+        for key in sorted(self.index, key=lambda k: self.index[k]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self.index[key]['bytes']
+            shutil.rmtree(os.path.join(self.path, key), ignore_errors=True)
+            del self.index[key]
+        self._save_index()
+
+    def clear(self):
+        """
+        Remove all the entries of the cache
+        """
+        for key in list(self.index):
+            shutil.rmtree(os.path.join(self.path, key), ignore_errors=True)
+        self.index = {}
+        self._save_index()
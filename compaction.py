@@ -0,0 +1,98 @@
+import numpy as np
+from df_benchmark.algorithms.sketches import to_host, DistinctSketch
+from df_benchmark.algorithms.dtype_inference import narrowest_int, string_columns
+
+
+def _kind(dtype):
+    """
+    Return the numpy kind of a dtype name ('O' for strings), None if unknown
+    """
+    if len(string_columns({'c': dtype})) > 0:
+        return 'O'
+    try:
+        return np.dtype(dtype).kind
+    except TypeError:
+        return None
+
+
+class CompactionStats(object):
+    """
+    Mergeable statistics used to choose the smallest dtype of a column
+    """
+
+    def __init__(self, dtype, distinct_k=1024):
+        self.dtype = dtype
+        self.rows = 0
+        self.nulls = 0
+        self.bytes = 0
+        self.min = None
+        self.max = None
+        # max relative error of the float32 round trip
+        self.float32_error = 0.0
+        self.distinct = DistinctSketch(distinct_k)
+
+    def update(self, series):
+        self.rows = len(series)
+        self.nulls = int(series.isna().sum())
+        self.bytes = int(series.memory_usage(index=False, deep=True))
+        kind = _kind(self.dtype)
+        if kind in ('i', 'u') and self.rows > self.nulls:
+            self.min, self.max = int(to_host(series.min())), int(to_host(series.max()))
+        elif kind == 'f' and self.rows > self.nulls:
+            values = to_host(series.dropna())
+            values = np.asarray(values, dtype='float64')
+            with np.errstate(over='ignore', invalid='ignore'):
+                error = np.abs(values.astype('float32').astype('float64') - values) / np.maximum(np.abs(values), np.finfo('float64').tiny)
+            self.float32_error = float(np.nan_to_num(error, nan=np.inf).max())
+        elif kind == 'O':
+            self.distinct = self.distinct.update(series)
+        return self
+
+    def merge(self, other):
+        out = CompactionStats(self.dtype, self.distinct.k)
+        out.rows = self.rows + other.rows
+        out.nulls = self.nulls + other.nulls
+        out.bytes = self.bytes + other.bytes
+        mins = [v for v in (self.min, other.min) if v is not None]
+        maxs = [v for v in (self.max, other.max) if v is not None]
+        out.min = min(mins) if mins else None
+        out.max = max(maxs) if maxs else None
+        out.float32_error = max(self.float32_error, other.float32_error)
+        out.distinct = self.distinct.merge(other.distinct)
+        return out
+
+    def suggest(self, tolerance, max_categories, category_ratio):
+        """
+        Return the smallest dtype that keeps the values of the column, or None to keep the current one
+        :param tolerance maximum relative error accepted when a float is downcast
+        :param max_categories maximum number of distinct values of a categorical column
+        :param category_ratio maximum distinct/rows ratio of a categorical column
+        """
+        kind = _kind(self.dtype)
+        if kind == 'O' and self.rows > 0:
+            distinct = self.distinct.estimate()
+            if distinct <= max_categories and distinct <= category_ratio * self.rows:
+                return 'category'
+            return None
+        if kind in ('i', 'u') and self.min is not None:
+            dtype = narrowest_int(self.min, self.max)
+            return dtype if dtype is not None and np.dtype(dtype).itemsize < np.dtype(self.dtype).itemsize else None
+        if kind == 'f' and np.dtype(self.dtype).itemsize > 4 and self.float32_error <= tolerance:
+            return 'float32'
+        return None
+
+
+def compaction_partition(df, dtypes):
+    """
+    Compute the compaction statistics of every column of a partition
+    :param df pandas or cudf dataframe
+    :param dtypes dictionary column -> dtype name
+    """
+    return {column: CompactionStats(dtypes[column]).update(df[column]) for column in df.columns}
+
+
+def merge_compaction(*stats):
+    out = stats[0]
+    for other in stats[1:]:
+        out = {column: out[column].merge(other[column]) for column in out}
+    return out
@@ -0,0 +1,90 @@
+import json
+import os
+
+# sidecar file with the index, the sort order and the divisions of a parquet dataset
+DIVISIONS_FILE = '_divisions.json'
+
+
+def _encode(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value.item() if hasattr(value, 'item') else value
+
+
+def _decode(value, dtype):
+    import pandas as pd
+
+    return pd.Timestamp(value) if dtype.startswith('datetime64') else value
+
+
+def write_divisions(path, df, extension='parquet'):
+    """
+    Save index, sort order and divisions of a dask dataframe written with to_parquet
+    (one file part.N.parquet for every partition) next to its files.
+    Nothing is saved for an unnamed index (e.g. the default index of from_pandas): it is not
+    stored in the files under a name that can be used to filter them.
+    :param path path of the parquet dataset
+    :param df dask dataframe with known divisions
+    :param extension extension of the part files (default parquet)
+    """
+    if df.index.name is None:
+        return False
+    files = ['part.{}.{}'.format(i, extension) for i in range(df.npartitions)]
+    if not all(os.path.exists(os.path.join(path, f)) for f in files):
+        return False
+    info = {
+        'index': df.index.name,
+        'dtype': str(df.index.dtype),
+        'sorted': 'ascending',
+        'files': files,
+        'divisions': [_encode(d) for d in df.divisions],
+    }
+    with open(os.path.join(path, DIVISIONS_FILE), 'w') as f:
+        json.dump(info, f, indent=1)
+    return True
+
+
+def remove_divisions(path):
+    """
+    Remove the sidecar file of a dataset, if any: it must be removed before the dataset is rewritten
+    """
+    name = os.path.join(path, DIVISIONS_FILE)
+    if os.path.exists(name):
+        os.remove(name)
+
+
+def read_divisions(path):
+    """
+    Return the information saved by write_divisions, None if the dataset has no sidecar file
+    :param path path of the parquet dataset
+    """
+    name = os.path.join(path, DIVISIONS_FILE) if os.path.isdir(path) else None
+    if name is None or not os.path.exists(name):
+        return None
+    with open(name) as f:
+        info = json.load(f)
+    if info['index'] is None:
+        return None
+    info['divisions'] = tuple(_decode(d, info['dtype']) for d in info['divisions'])
+    return info
+
+
+def read_part(path, columns=None, library='pandas', **kwargs):
+    """
+    Read a single file of a dataset as a pandas or cudf dataframe
+    :param path path of the file
+    :param columns columns to read (default all)
+    :param library pandas or cudf
+    :param kwargs extra arguments of read_parquet
+    """
+    if library == 'cudf':
+        import cudf
+        return cudf.read_parquet(path, columns=columns, **kwargs)
+    import pandas as pd
+    return pd.read_parquet(path, columns=columns, **kwargs)
+
+
+def empty_part(path, info, columns=None, library='pandas'):
+    """
+    Return an empty dataframe with the schema of a file of the dataset, reading only its footer:
+    no row group can match a filter below the first division
+    """
+    return read_part(path, columns, library, filters=[(info['index'], '<', info['divisions'][0])]).iloc[:0]
@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+
+BOOLEAN_VALUES = {'true', 'false', 't', 'f', 'yes', 'no', 'y', 'n', 'si', 'sì', 'vero', 'falso'}
+
+_INT_TYPES = ['int8', 'int16', 'int32', 'int64']
+
+
+class Candidate(object):
+    """
+    Dtype suggested for a column by the inference on a sample.
+    A candidate is ambiguous when the sample alone is not enough to decide:
+    some values of the sample failed the parsing or the column is an integer
+    (its width depends on the range of the whole column).
+    """
+
+    def __init__(self, kind, dtype, ambiguous=False):
+        self.kind = kind
+        self.dtype = dtype
+        self.ambiguous = ambiguous
+
+    def __repr__(self):
+        return 'Candidate({}, {}, ambiguous={})'.format(self.kind, self.dtype, self.ambiguous)
+
+
+def narrowest_int(min, max):
+    """
+    Return the narrowest signed integer type that can hold the provided range,
+    uint64 for a non negative range beyond int64, None if no integer type can hold it
+    """
+    for dtype in _INT_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= min and max <= info.max:
+            return dtype
+    if min >= 0 and max <= np.iinfo('uint64').max:
+        return 'uint64'
+    return None
+
+
+def _parse(series, kind):
+    """
+    Try to parse a string series as the provided kind;
+    returns the parsed series (NaN/NaT where the parsing failed)
+    """
+    if kind == 'boolean':
+        return series.str.strip().str.lower().isin(BOOLEAN_VALUES).where(lambda x: x)
+    if kind == 'numeric':
+        return pd.to_numeric(series.str.strip(), errors='coerce')
+    if kind == 'datetime':
+        return pd.to_datetime(series.str.strip(), errors='coerce', format='mixed', dayfirst=True)
+    raise ValueError(kind)
+
+
+def infer_column(sample, min_ratio=0.9, category_ratio=0.05):
+    """
+    Infer the dtype of a string column from a sample of its values.
+    The boolean, numeric and datetime parses are tried in this order and
+    the first one that parses the whole sample wins (early exit).
+    If a parse succeeds on at least min_ratio of the sample the candidate
+    is returned as ambiguous and must be checked on the whole column.
+    An integer candidate is always ambiguous: its type is the narrowest one that holds
+    the range of the whole column (or float64 if the column has nulls), decided by resolve.
+    Returns a Candidate or None if the column should stay a string.
+    :param sample pandas series of strings
+    :param min_ratio minimum fraction of parsed values to consider a candidate (default 0.9)
+    :param category_ratio maximum distinct/values ratio for a categorical column (default 0.05)
+    """
+    values = sample.dropna().astype('str')
+    if len(values) == 0:
+        return None
+
+    for kind in ('boolean', 'numeric', 'datetime'):
+        parsed = _parse(values, kind)
+        ratio = parsed.notna().mean()
+        if ratio < min_ratio:
+            continue
+        if kind == 'boolean':
+            dtype = 'bool'
+        elif kind == 'datetime':
+            dtype = 'datetime64[ns]'
+        elif (parsed.dropna() % 1 == 0).all():
+            # the range of the sample says nothing about the rest of the column
+            return Candidate('integer', narrowest_int(parsed.min(), parsed.max()) or 'float64', ambiguous=True)
+        else:
+            dtype = 'float64'
+        return Candidate(kind, dtype, ambiguous=ratio < 1)
+
+    if values.nunique() <= category_ratio * len(values):
+        return Candidate('category', 'category')
+
+    return None
+
+
+def check_partition(df, candidates):
+    """
+    Check the ambiguous candidates on a whole partition:
+    for every column returns the number of non null values that fail the parsing,
+    the number of nulls and, for integers, min and max.
+    :param df pandas or cudf dataframe
+    :param candidates dictionary column -> Candidate
+    """
+    out = {}
+    for column, candidate in candidates.items():
+        series = df[column]
+        series = series.to_pandas() if hasattr(series, 'to_pandas') else series
+        values = series.dropna().astype('str')
+        kind = 'numeric' if candidate.kind == 'integer' else candidate.kind
+        parsed = _parse(values, kind)
+        stats = {'failures': int(parsed.isna().sum()), 'nulls': int(series.isna().sum()), 'min': None, 'max': None}
+        if candidate.kind == 'integer':
+            parsed = parsed.dropna()
+            stats['failures'] += int((parsed % 1 != 0).sum())
+            if len(parsed) > 0:
+                stats['min'], stats['max'] = parsed.min(), parsed.max()
+        out[column] = stats
+    return out
+
+
+def merge_checks(*checks):
+    out = checks[0]
+    for other in checks[1:]:
+        merged = {}
+        for column, a in out.items():
+            b = other[column]
+            bounds = [x for x in (a['min'], b['min']) if x is not None]
+            merged[column] = {
+                'failures': a['failures'] + b['failures'],
+                'nulls': a['nulls'] + b['nulls'],
+                'min': min(bounds) if bounds else None,
+                'max': max(x for x in (a['max'], b['max']) if x is not None) if bounds else None,
+            }
+        out = merged
+    return out
+
+
+def resolve(candidates, checks):
+    """
+    Return the final dtype of every candidate column using the results of the full-scan checks
+    :param candidates dictionary column -> Candidate
+    :param checks dictionary column -> result of check_partition (merged), only for the ambiguous candidates
+    """
+    out = {}
+    for column, candidate in candidates.items():
+        if not candidate.ambiguous:
+            out[column] = candidate.dtype
+            continue
+        check = checks[column]
+        if check['failures'] > 0:
+            continue
+        if candidate.kind == 'integer':
+            if check['nulls'] > 0 or check['min'] is None:
+                # numpy integers can't hold nulls
+                out[column] = 'float64'
+            else:
+                # a range beyond uint64 is kept as float64
+                out[column] = narrowest_int(check['min'], check['max']) or 'float64'
+        else:
+            out[column] = candidate.dtype
+    return out
+
+
+def string_columns(dtypes):
+    """
+    Return the columns of a dtypes dictionary that contain strings
+    """
+    return [c for c, t in dtypes.items() if t in ('object', 'string', 'str') or t.startswith('string')]
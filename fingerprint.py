@@ -0,0 +1,112 @@
+import hashlib
+import numpy as np
+from df_benchmark.algorithms.sketches import hash_values, to_host
+
+_MASK = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _mix(x):
+    """
+    splitmix64 finalizer, vectorized on uint64 numpy arrays
+    """
+    with np.errstate(over='ignore'):
+        x = x ^ (x >> np.uint64(30))
+        x = x * np.uint64(0xBF58476D1CE4E5B9)
+        x = x ^ (x >> np.uint64(27))
+        x = x * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+    return x & _MASK
+
+
+class ColumnSignature(object):
+    """
+    Mergeable signature of a column, computed partition by partition:
+     - fingerprints: a digest of the value hashes of every partition;
+       two columns are identical iff all their partition fingerprints are equal
+     - minhash: the k smallest hashes of the (row, value) pairs of the column (bottom-k MinHash);
+       it estimates the fraction of rows where two columns have the same value
+    """
+
+    def __init__(self, dtype, k=256):
+        self.dtype = dtype
+        self.k = k
+        self.rows = 0
+        self.fingerprints = {}
+        self.minhash = np.empty(0, dtype=np.uint64)
+
+    def update(self, series, partition):
+        values = hash_values(series)
+        self.rows += len(values)
+        self.fingerprints[partition] = hashlib.blake2b(values.tobytes(), digest_size=16).digest()
+        with np.errstate(over='ignore'):
+            rows = _mix(np.arange(len(values), dtype=np.uint64) + (np.uint64(partition) << np.uint64(40)))
+        pairs = _mix(values ^ rows)
+        self.minhash = self._smallest(pairs)
+        return self
+
+    def _smallest(self, hashes):
+        if len(hashes) > self.k:
+            hashes = np.partition(hashes, self.k - 1)[:self.k]
+        return np.unique(hashes)
+
+    def merge(self, other):
+        out = ColumnSignature(self.dtype, self.k)
+        out.rows = self.rows + other.rows
+        out.fingerprints = dict(self.fingerprints)
+        out.fingerprints.update(other.fingerprints)
+        out.minhash = out._smallest(np.concatenate([self.minhash, other.minhash]))
+        return out
+
+    def fingerprint(self):
+        return tuple(self.fingerprints[p] for p in sorted(self.fingerprints))
+
+    def similarity(self, other):
+        """
+        Estimate the fraction of rows where the two columns have the same value
+        """
+        union = np.union1d(self.minhash, other.minhash)[:self.k]
+        if len(union) == 0:
+            return 1.0
+        both = np.intersect1d(np.intersect1d(self.minhash, other.minhash), union)
+        jaccard = len(both) / float(len(union))
+        # |A| = |B| = rows, |A & B| = equal rows  =>  J = s / (2 - s)
+        return 2 * jaccard / (1 + jaccard)
+
+
+def signature_partition(df, partition, k=256):
+    """
+    Compute the signature of every column of a partition
+    :param df pandas or cudf dataframe
+    :param partition number of the partition
+    :param k size of the MinHash signatures
+    """
+    return {column: ColumnSignature(str(df[column].dtype), k).update(df[column], partition) for column in df.columns}
+
+
+def merge_signatures(*signatures):
+    out = signatures[0]
+    for other in signatures[1:]:
+        out = {column: out[column].merge(other[column]) for column in out}
+    return out
+
+
+def equal_rows_partition(df, pairs):
+    """
+    Count, for every pair of columns, the rows of a partition with the same value
+    (two nulls are considered equal)
+    :param df pandas or cudf dataframe
+    :param pairs list of (column, column) tuples
+    """
+    out = {}
+    for a, b in pairs:
+        equal = (df[a] == df[b]).fillna(False) | (df[a].isna() & df[b].isna())
+        out[(a, b)] = int(to_host(equal.sum()))
+    return out
+
+
+def sum_counts(*counts):
+    out = dict(counts[0])
+    for other in counts[1:]:
+        for key, value in other.items():
+            out[key] += value
+    return out
@@ -0,0 +1,275 @@
+import argparse
+import os
+import sys
+
+if __name__ == '__main__' and not __package__:
+    # run as a script (python generator.py): the directory of this file would shadow pandas with
+    # pandas.py, so the modules are imported from the df_benchmark package that contains it
+    _here = os.path.dirname(os.path.abspath(__file__))
+    sys.path = [p for p in sys.path if os.path.abspath(p or os.curdir) != _here]
+    sys.path.insert(0, os.path.dirname(os.path.dirname(_here)))
+
+import numpy as np
+import pandas as pd
+from df_benchmark.algorithms.fingerprint import _mix
+from df_benchmark.algorithms.kernels import MONTHS
+
+# Columns of the raw invoices dump (see README), in the original order
+COLUMNS = [
+    'bill_id', 'F1_kWh', 'F2_kWh', 'F3_kWh', 'city', 'address', 'nominative', 'sex', 'age', 'user_code',
+    'date', 'light_start_date', 'light_end_date', 'tv', 'gas_amount', 'gas_average_cost', 'light_average_cost',
+    'emission_date', 'supply_type', 'gas_end_date', 'gas_start_date', 'extra_fees', 'gas_consumption',
+    'light_consumption', 'gas_offer', 'light_offer_type', 'light_offer', 'howmuch_pay', 'total_amount',
+    'light_amount', 'average_unit_light_cost', 'average_light_bill_cost', 'average_unit_gas_cost',
+    'average_gas_bill_cost', 'customer_code', 'billing_frequency', 'bill_type', 'gas_system_charges',
+    'light_system_charges', 'gas_material_cost', 'light_transport_cost', 'gas_transport_cost', 'light_material_cost',
+]
+
+# value -> probability, as observed in the original data
+SUPPLY_TYPES = {'gas': 0.54, 'luce': 0.35, 'gas e luce': 0.11}
+SEXES = {'M': 0.45, 'F': 0.43, 'P': 0.12}
+BILLING_FREQUENCIES = {'bimester': 0.725, 'quarterly': 0.132, 'monthly': 0.068, None: 0.075}
+BILL_TYPES = {'standard bill': 0.9952, 'variation note': 0.0029, 'change note correction': 0.0018, 'cancellation bill': 0.0001}
+LIGHT_OFFER_TYPES = {'light': 0.544, 'light single zone': 0.42, 'ligth bizone': 0.018, 'light multi zones': 0.018}
+
+# null rates of the columns with missing values
+NULL_RATES = {
+    'F1_kWh': 0.00002, 'F2_kWh': 0.00001, 'F3_kWh': 0.00007, 'city': 0.000002,
+    'address': 0.0003, 'nominative': 0.0003, 'gas_system_charges': 0.007, 'light_system_charges': 0.005,
+    'gas_material_cost': 0.007, 'light_transport_cost': 0.005, 'gas_transport_cost': 0.007, 'light_material_cost': 0.005,
+}
+
+_CITIES = [
+    'ROMA', 'MILANO', 'NAPOLI', 'TORINO', 'PALERMO', 'GENOVA', 'BOLOGNA', 'FIRENZE', 'BARI', 'CATANIA',
+    'VENEZIA', 'VERONA', 'MESSINA', 'PADOVA', 'TRIESTE', 'BRESCIA', 'PARMA', 'TARANTO', 'PRATO', 'MODENA',
+    'REGGIO CALABRIA', 'PERUGIA', 'RAVENNA', 'LIVORNO', 'CAGLIARI', 'FOGGIA', 'RIMINI', 'SALERNO', 'FERRARA', 'SASSARI',
+    'LATINA', 'MONZA', 'SIRACUSA', 'PESCARA', 'BERGAMO', 'FORLI', 'TRENTO', 'VICENZA', 'TERNI', 'BOLZANO',
+    'NOVARA', 'PIACENZA', 'ANCONA', 'ANDRIA', 'AREZZO', 'UDINE', 'CESENA', 'LECCE', 'PESARO', 'LA SPEZIA',
+    'CIPRESSA', 'ROCCAVIVARA', 'VIDRACCO', 'MEZZOLOMBARDO', 'PINETO', 'CASALZUIGNO', 'SAN LUPO', 'VERNATE',
+    'AVERSA', 'BURGIO', 'MARTINENGO', 'SALUGGIA', 'GRASSOBBIO', 'RIPACANDIDA', 'LUINO', 'SOLARUSSA',
+]
+# suffixes used to build a realistic number of distinct towns
+_QUALIFIERS = [
+    '', ' SUPERIORE', ' INFERIORE', ' MARITTIMA', ' DI SOTTO', ' DI SOPRA', ' SCALO', ' TERME',
+    ' SUL MARE', ' AL MONTE', ' VECCHIO', ' NUOVO', ' CREMONESE', ' VENETO', ' DEL COLLE', ' IN VAL',
+]
+CITIES = [city + qualifier for qualifier in _QUALIFIERS for city in _CITIES]
+
+_MONTH_NAMES = [name.capitalize() for name in list(MONTHS['it'])[:12]]
+_HEX = np.frombuffer(b'0123456789ABCDEF', dtype=np.uint8)
+_START = np.datetime64('2018-01-01')
+_PERIOD_DAYS = {'monthly': 30, 'bimester': 61, 'quarterly': 91, None: 61}
+
+
+def _uniform(keys, salt):
+    """
+    Deterministic uniform values in [0, 1) derived from the keys (e.g. the customer ids)
+    """
+    with np.errstate(over='ignore'):
+        return (_mix(keys * np.uint64(0x9E3779B97F4A7C15) + np.uint64(salt)) >> np.uint64(11)) / float(2 ** 53)
+
+
+def _hex(keys, salt):
+    """
+    Deterministic 40 characters hex codes (like the anonymized fields) derived from the keys
+    """
+    with np.errstate(over='ignore'):
+        words = np.stack([_mix(keys * np.uint64(0x9E3779B97F4A7C15) + np.uint64(salt * 3 + i)) for i in range(3)], axis=1)
+    raw = words.astype('>u8').view(np.uint8).reshape(len(keys), 24)[:, :20]
+    chars = _HEX[np.stack([raw >> 4, raw & 15], axis=2).reshape(len(keys), 40)]
+    return chars.view('S40').ravel().astype(str).astype(object)
+
+
+def _pick(uniform, choices):
+    """
+    Map uniform values to the keys of a dictionary value -> probability
+    """
+    values = np.array(list(choices), dtype=object)
+    bounds = np.cumsum(list(choices.values()))
+    return values[np.minimum(np.searchsorted(bounds / bounds[-1], uniform, side='right'), len(values) - 1)]
+
+
+def _italian_date(dates):
+    """
+    Format dates like "25 Novembre 2019"; NaT becomes None
+    """
+    dates = pd.Series(dates)
+    valid = dates.notna()
+    day = dates.dt.day.fillna(1).astype('int64').astype(str)
+    month = pd.Series(np.array(_MONTH_NAMES, dtype=object)[dates.dt.month.fillna(1).astype('int64') - 1])
+    year = dates.dt.year.fillna(1).astype('int64').astype(str)
+    return (day + ' ' + month + ' ' + year).where(valid, None).astype(object).values
+
+
+def _cost_per_smc(values):
+    """
+    Format gas costs like "0,85 €/smc"; NaN becomes None
+    """
+    text = pd.Series(values).map('{:.2f}'.format).str.replace('.', ',', regex=False) + ' €/smc'
+    return text.where(~np.isnan(values), None).astype(object).values
+
+
+def generate_chunk(chunk, chunk_rows, seed=0, customers=None, rows=None):
+    """
+    Generate a chunk of the synthetic invoices dataset as a pandas dataframe.
+    The chunk depends only on (seed, chunk), so the chunks can be generated in any
+    order and in parallel; the attributes of a customer (city, sex, age, codes, ...)
+    depend only on (seed, customer) and are the same in every chunk.
+    :param chunk number of the chunk
+    :param chunk_rows number of rows of every chunk
+    :param seed seed of the dataset (default 0)
+    :param customers number of distinct customers (default chunk_rows / 2)
+    :param rows number of rows of the whole dataset: the last chunk is shorter (default chunk_rows for every chunk)
+    """
+    customers = customers or max(chunk_rows // 2, 1)
+    rng = np.random.default_rng([seed, chunk])
+    n = chunk_rows if rows is None else min(chunk_rows, rows - chunk * chunk_rows)
+    df = {}
+
+    df['bill_id'] = np.arange(chunk * chunk_rows, chunk * chunk_rows + n, dtype='int64')
+
+    # the customer attributes depend on the seed too
+    customer = rng.integers(0, customers, n).astype(np.uint64) + np.uint64(seed) * np.uint64(1 << 40)
+    utility = (rng.random(n) < 0.15).astype(np.uint64)
+    df['city'] = np.array(CITIES, dtype=object)[np.minimum((len(CITIES) * _uniform(customer, 1) ** 2).astype(int), len(CITIES) - 1)]
+    df['address'] = _hex(customer * np.uint64(2) + utility, 2)
+    df['nominative'] = _hex(customer, 3)
+    df['sex'] = _pick(_uniform(customer, 4), SEXES)
+    df['age'] = np.where(df['sex'] == 'P', 0, 18 + (_uniform(customer, 5) * 75).astype('int64'))
+    df['user_code'] = _hex(customer, 6)
+    df['customer_code'] = _hex(customer * np.uint64(2) + utility, 7)
+
+    supply = _pick(_uniform(customer * np.uint64(2) + utility, 8), SUPPLY_TYPES)
+    light = supply != 'gas'
+    gas = supply != 'luce'
+    df['supply_type'] = supply
+    df['billing_frequency'] = _pick(rng.random(n), BILLING_FREQUENCIES)
+    df['bill_type'] = _pick(rng.random(n), BILL_TYPES)
+
+    # billing periods
+    days = pd.Series(df['billing_frequency']).map(_PERIOD_DAYS).fillna(_PERIOD_DAYS[None]).values
+    start = _START + rng.integers(0, 3 * 365, n).astype('timedelta64[D]')
+    end = start + days.astype('timedelta64[D]')
+    emission = end + rng.integers(1, 45, n).astype('timedelta64[D]')
+    undated = df['bill_type'] == 'change note correction'
+    start = np.where(undated, np.datetime64('NaT'), start)
+    end = np.where(undated, np.datetime64('NaT'), end)
+    df['date'] = df['light_start_date'] = df['gas_start_date'] = _italian_date(start)
+    df['light_end_date'] = df['gas_end_date'] = _italian_date(end)
+    df['emission_date'] = _italian_date(emission)
+
+    # electricity
+    scale = days / 30.0
+    for slot, mean in (('F1_kWh', 90), ('F2_kWh', 75), ('F3_kWh', 95)):
+        df[slot] = np.where(light, np.round(rng.gamma(2.0, mean / 2.0, n) * scale), 0.0)
+    df['light_consumption'] = np.where(light, df['F1_kWh'] + df['F2_kWh'] + df['F3_kWh'], 0.0)
+    unit_light = np.round(rng.normal(0.11, 0.03, n).clip(0.03), 2)
+    df['light_material_cost'] = np.where(light, np.round(df['light_consumption'] * unit_light, 2), np.nan)
+    df['light_transport_cost'] = np.where(light, np.round(rng.gamma(2.0, 8.0, n), 2), np.nan)
+    df['light_system_charges'] = np.where(light, np.round(rng.gamma(2.0, 5.0, n), 2), np.nan)
+    df['light_amount'] = np.where(light, np.round(df['light_material_cost'] + df['light_transport_cost'] + df['light_system_charges'], 2), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['average_unit_light_cost'] = np.round(np.where(df['light_consumption'] > 0, df['light_amount'] / df['light_consumption'], np.nan), 2)
+    df['average_light_bill_cost'] = np.round(df['average_unit_light_cost'] * 2, 2)
+    df['light_average_cost'] = np.where(light & (rng.random(n) < 0.5), np.round(rng.gamma(2.0, 25.0, n)), np.nan)
+    df['light_offer_type'] = _pick(_uniform(customer * np.uint64(2) + utility, 9), LIGHT_OFFER_TYPES)
+    df['light_offer'] = (_mix(customer % np.uint64(97) + np.uint64(10))).astype(str).astype(object)
+
+    # gas
+    df['gas_consumption'] = np.where(gas, np.round(rng.gamma(1.5, 60.0, n) * scale), np.nan)
+    unit_gas = np.round(rng.normal(0.85, 0.15, n).clip(0.3), 2)
+    df['gas_material_cost'] = np.where(gas, np.round(df['gas_consumption'] * unit_gas, 2), np.nan)
+    df['gas_transport_cost'] = np.where(gas, np.round(rng.gamma(2.0, 10.0, n), 2), np.nan)
+    df['gas_system_charges'] = np.where(gas, np.round(rng.gamma(2.0, 4.0, n), 2), np.nan)
+    df['gas_amount'] = np.where(gas, np.round(df['gas_material_cost'] + df['gas_transport_cost'] + df['gas_system_charges'], 2), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        unit = np.round(np.where(df['gas_consumption'] > 0, df['gas_amount'] / df['gas_consumption'], np.nan), 2)
+    df['average_unit_gas_cost'] = unit
+    df['average_gas_bill_cost'] = _cost_per_smc(unit)
+    df['gas_average_cost'] = np.where(gas & (rng.random(n) < 0.5), np.round(rng.gamma(2.0, 30.0, n)), np.nan)
+    df['gas_offer'] = _mix(customer % np.uint64(61) + np.uint64(20))
+
+    # totals
+    df['extra_fees'] = np.round(np.where(rng.random(n) < 0.2, rng.gamma(1.0, 5.0, n), 0.0), 2)
+    df['tv'] = np.where(light & (rng.random(n) < 0.6), 18.0, 0.0)
+    df['total_amount'] = np.round(np.nan_to_num(df['light_amount']) + np.nan_to_num(df['gas_amount']) + df['extra_fees'], 2)
+    df['howmuch_pay'] = np.round(df['total_amount'] + df['tv'], 2)
+
+    df = pd.DataFrame(df, columns=COLUMNS)
+    for column, rate in NULL_RATES.items():
+        df.loc[rng.random(n) < rate, column] = None
+
+    return df
+
+
+def generate(path, rows, chunk_rows=1000000, seed=0, format='parquet', customers=None, scheduler='processes', num_workers=None):
+    """
+    Write the synthetic invoices dataset as a directory of parquet or csv files (part.N.parquet/csv).
+    The chunks are generated and written in parallel with dask, every worker keeps in memory
+    only the chunk it is writing, so the peak memory is about num_workers * chunk_rows rows.
+    The same (rows, chunk_rows, seed) always produce the same files.
+    Returns the list of the written files.
+    :param path output directory
+    :param rows number of rows
+    :param chunk_rows number of rows of every file, the last one can be shorter (default 1M)
+    :param seed seed of the dataset (default 0)
+    :param format parquet or csv (default parquet)
+    :param customers number of distinct customers (default rows / 2)
+    :param scheduler dask scheduler used to write the chunks (default processes)
+    :param num_workers number of parallel workers (default number of cores)
+    """
+    import dask
+    from dask import delayed
+
+    if format not in ('parquet', 'csv'):
+        raise ValueError('format must be parquet or csv')
+    chunks = -(-rows // chunk_rows)
+    customers = customers or max(rows // 2, 1)
+    os.makedirs(path, exist_ok=True)
+
+    tasks = [delayed(_write_chunk)(path, chunk, chunk_rows, seed, customers, format, rows) for chunk in range(chunks)]
+    return list(dask.compute(*tasks, scheduler=scheduler, num_workers=num_workers))
+
+
+def _write_chunk(path, chunk, chunk_rows, seed, customers, format, rows):
+    df = generate_chunk(chunk, chunk_rows, seed, customers, rows)
+    name = os.path.join(path, 'part.{}.{}'.format(chunk, format))
+    if format == 'parquet':
+        df.to_parquet(name, index=False)
+    else:
+        df.to_csv(name, index=False)
+    return name
+
+
+def to_dask(rows, chunk_rows=1000000, seed=0, customers=None):
+    """
+    Return the synthetic invoices dataset as a dask dataframe with a partition
+    for every chunk, generated on the workers without writing it to disk
+    :param rows number of rows
+    :param chunk_rows number of rows of every partition, the last one can be shorter (default 1M)
+    :param seed seed of the dataset (default 0)
+    :param customers number of distinct customers (default rows / 2)
+    """
+    import dask.dataframe as dd
+
+    chunks = -(-rows // chunk_rows)
+    customers = customers or max(rows // 2, 1)
+    meta = generate_chunk(0, 10, seed, customers).iloc[:0]
+    return dd.from_map(generate_chunk, range(chunks), chunk_rows=chunk_rows, seed=seed, customers=customers, rows=rows, meta=meta)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic invoices dataset')
+    parser.add_argument('path', help='output directory')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--chunk-rows', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', choices=['parquet', 'csv'], default='parquet')
+    parser.add_argument('--customers', type=int)
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+    generate(args.path, args.rows, args.chunk_rows, args.seed, args.format, args.customers, num_workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,462 @@
+import os
+import queue
+import threading
+import time
+import pandas as pd
+import psutil
+from df_benchmark.algorithms.kernels import MONTHS, parse_localized_dates_frame, parse_numeric_strings_frame, numeric_strings_report
+from df_benchmark.algorithms.compaction import CompactionStats
+from df_benchmark.algorithms.dtype_inference import string_columns
+
+# numbers larger than this are identifiers (e.g. gas_offer), they stay strings
+_MAX_EXACT = 2 ** 53
+
+
+class Step(object):
+    """
+    Cleaning step of the streaming ingestion. The columns and the dtypes are decided on the
+    first chunk (setup) and then applied unchanged to every chunk, so all the row groups
+    have the same schema.
+    """
+
+    name = 'step'
+
+    def __init__(self, columns=None):
+        self.columns = columns
+        self.stats = {}
+
+    def setup(self, df):
+        pass
+
+    def apply(self, df):
+        return df
+
+    def final_dtypes(self):
+        """
+        Return the dtypes that can be decided only after all the chunks have been cleaned:
+        the output is rewritten with these columns cast
+        """
+        return {}
+
+    def report(self):
+        return dict(self.stats, columns=self.columns)
+
+
+def _by_value(series, parse):
+    """
+    Apply a parser of a single column dataframe to the distinct values of the series only
+    (dates and amounts repeat a lot) and map the results back to the rows
+    """
+    codes, uniques = pd.factorize(series)
+    parsed = parse(pd.DataFrame({series.name: uniques}))[series.name]
+    # code -1 (null) is missing from the index of parsed: reindex makes it null
+    out = parsed.reset_index(drop=True).reindex(codes)
+    out.index = series.index
+    return out
+
+
+def _string_columns(df):
+    return string_columns({c: str(t) for c, t in dict(df.dtypes).items()})
+
+
+class StripStep(Step):
+    """
+    Remove leading and trailing whitespaces from the strings; empty strings become null
+    """
+
+    name = 'strip'
+
+    def setup(self, df):
+        if self.columns is None:
+            self.columns = _string_columns(df)
+
+    def apply(self, df):
+        for column in self.columns:
+            values = df[column].str.strip()
+            df[column] = values.where(values.str.len() > 0)
+        return df
+
+
+class NumericStep(Step):
+    """
+    Convert numeric strings ("12", "0,85 €/smc") to Int64 or float64.
+    Without columns the string columns of the first chunk whose values are all numbers with
+    the same unit are converted; without decimal the separator is detected for every column.
+    Values of the next chunks that can't be converted become null and are counted.
+    :param columns columns to convert (default detected)
+    :param decimal decimal separator (default detected)
+    :param strip_units if True the unit after the number is removed
+    """
+
+    name = 'numeric'
+
+    def __init__(self, columns=None, decimal=None, strip_units=True):
+        super().__init__(columns)
+        self.decimal = decimal
+        self.strip_units = strip_units
+        self.decimals = {}
+        self.integers = []
+        self.stats = {'coerced': {}}
+
+    def _decimal(self, series):
+        if self.decimal is not None:
+            return self.decimal
+        return ',' if series.str.contains(',', regex=False).any() else '.'
+
+    def setup(self, df):
+        candidates = self.columns if self.columns is not None else _string_columns(df)
+        self.columns = []
+        for column in candidates:
+            values = pd.Series(df[column].dropna().unique(), name=column)
+            decimal = self._decimal(values)
+            report = numeric_strings_report(values.to_frame(), [column], decimal, self.strip_units)[column]
+            if len(values) > 0 and report['coerced'] == 0 and len(report['units']) <= 1:
+                parsed = parse_numeric_strings_frame(values.to_frame(), [column], decimal, self.strip_units)[column]
+                if parsed.abs().max() < _MAX_EXACT:
+                    self.columns.append(column)
+                    self.decimals[column] = decimal
+                    if not values.str.contains(decimal, regex=False).any():
+                        self.integers.append(column)
+        self.stats['coerced'] = {column: 0 for column in self.columns}
+
+    def apply(self, df):
+        for column in self.columns:
+            parsed = _by_value(df[column], lambda d: parse_numeric_strings_frame(d, [column], self.decimals[column], self.strip_units))
+            if column in self.integers:
+                parsed = parsed.where(parsed == parsed.round())
+                parsed = parsed.astype('Int64')
+            self.stats['coerced'][column] += int((parsed.isna() & df[column].notna()).sum())
+            df[column] = parsed
+        return df
+
+
+_ISO_DATE = r'^\d{4}-\d{2}-\d{2}'
+
+
+class DateStep(Step):
+    """
+    Convert textual dates ("12 gennaio 2020") and ISO dates to datetime64[ns].
+    Without columns the string columns of the first chunk whose values are all dates are converted.
+    :param columns columns to convert (default detected)
+    :param locale language of the month names (default it)
+    """
+
+    name = 'dates'
+
+    def __init__(self, columns=None, locale='it'):
+        super().__init__(columns)
+        self.months = MONTHS[locale]
+        self.stats = {'coerced': {}}
+
+    def _parse(self, df):
+        column = df.columns[0]
+        out = parse_localized_dates_frame(df, [column], self.months)
+        values = df[column].where(df[column].str.match(_ISO_DATE))
+        iso = pd.to_datetime(values, format='ISO8601', errors='coerce')
+        out[column] = out[column].fillna(iso).astype('datetime64[ns]')
+        return out
+
+    def setup(self, df):
+        if self.columns is None:
+            self.columns = []
+            for column in _string_columns(df):
+                values = pd.Series(df[column].dropna().unique(), name=column)
+                if len(values) > 0 and self._parse(values.to_frame())[column].notna().all():
+                    self.columns.append(column)
+        self.stats['coerced'] = {column: 0 for column in self.columns}
+
+    def apply(self, df):
+        for column in self.columns:
+            parsed = _by_value(df[column], self._parse)
+            self.stats['coerced'][column] += int((parsed.isna() & df[column].notna()).sum())
+            df[column] = parsed
+        return df
+
+
+class CompactStep(Step):
+    """
+    Store the columns with the smallest dtype (see compaction.py): strings with few distinct
+    values in the first chunk become categories (dictionary encoded in parquet).
+    Floats become float32 when the round trip error is under tolerance in every chunk: they are
+    checked on every chunk while they are written as float64 and cast when the whole file has
+    been cleaned (see final_dtypes).
+    Integers are not narrowed, a value of a next chunk could overflow the pinned type.
+    :param tolerance maximum relative error accepted when a float is downcast
+    :param max_categories maximum number of distinct values of a categorical column
+    :param category_ratio maximum distinct/rows ratio of a categorical column
+    """
+
+    name = 'compact'
+
+    def __init__(self, columns=None, tolerance=1e-6, max_categories=10000, category_ratio=0.5):
+        super().__init__(columns)
+        self.tolerance = tolerance
+        self.max_categories = max_categories
+        self.category_ratio = category_ratio
+        self.dtypes = {}
+        self.float32 = []
+
+    def _float32_error(self, series):
+        return CompactionStats(str(series.dtype)).update(series).float32_error
+
+    def setup(self, df):
+        columns = self.columns if self.columns is not None else list(df.columns)
+        strings = _string_columns(df)
+        for column in columns:
+            dtype = str(df[column].dtype)
+            if column not in strings and not dtype.startswith('float'):
+                continue
+            stats = CompactionStats(dtype).update(df[column])
+            suggested = stats.suggest(self.tolerance, self.max_categories, self.category_ratio)
+            if suggested == 'float32':
+                self.float32.append(column)
+            elif suggested is not None:
+                self.dtypes[column] = suggested
+        self.columns = list(self.dtypes) + self.float32
+        self.stats['dtypes'] = dict(self.dtypes)
+        self.stats['float64_kept'] = []
+
+    def apply(self, df):
+        for column in list(self.float32):
+            if self._float32_error(df[column]) > self.tolerance:
+                self.float32.remove(column)
+                self.stats['float64_kept'].append(column)
+        return df.astype(self.dtypes)
+
+    def final_dtypes(self):
+        dtypes = {column: 'float32' for column in self.float32}
+        self.stats['dtypes'].update(dtypes)
+        return dtypes
+
+
+STEPS = {step.name: step for step in (StripStep, NumericStep, DateStep, CompactStep)}
+
+# the dates are parsed before the numbers: "12 gennaio 2020" starts with a number
+DEFAULT_STEPS = ('strip', 'dates', 'numeric', 'compact')
+
+
+def make_steps(steps):
+    """
+    Return the Step objects of a chain
+    :param steps list of Step objects, step names or (name, kwargs) pairs
+    """
+    out = []
+    for step in steps:
+        if isinstance(step, Step):
+            out.append(step)
+        elif isinstance(step, str):
+            out.append(STEPS[step]())
+        else:
+            name, kwargs = step
+            out.append(STEPS[name](**kwargs))
+    return out
+
+
+def pin_schema(df):
+    """
+    Return the arrow schema of the first cleaned chunk, used for all the row groups:
+    columns with only nulls are strings, categories are dictionaries of strings
+    """
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    fields = []
+    for field in schema:
+        if pa.types.is_null(field.type):
+            field = field.with_type(pa.string())
+        elif pa.types.is_dictionary(field.type):
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+        fields.append(field)
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def cast_file(path, dtypes, compression='snappy'):
+    """
+    Rewrite a parquet file with some columns cast, one row group at a time
+    :param path path of the file
+    :param dtypes dictionary column -> arrow type alias (e.g. float32)
+    :param compression parquet compression
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path)
+    schema = parquet.schema_arrow
+    for column, dtype in dtypes.items():
+        i = schema.get_field_index(column)
+        schema = schema.set(i, schema.field(i).with_type(pa.type_for_alias(dtype)))
+    tmp = path + '.tmp'
+    with pq.ParquetWriter(tmp, schema, compression=compression) as writer:
+        for row_group in range(parquet.metadata.num_row_groups):
+            table = parquet.read_row_group(row_group).cast(schema)
+            writer.write_table(table, row_group_size=max(table.num_rows, 1))
+    os.replace(tmp, path)
+    return schema
+
+
+# chunks held at the same time besides the queued ones: one in the reader, two in the cleaner
+# (input and output), two in the writer (dataframe and arrow table)
+_WORKING_CHUNKS = 5
+
+
+def _peak(state):
+    state['peak_rss'] = max(state['peak_rss'], psutil.Process().memory_info().rss)
+
+
+def _put(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return None
+
+
+def ingest_csv(path, out, steps=DEFAULT_STEPS, chunk_rows=100000, max_memory=None, depth=2,
+               compression='snappy', **kwargs):
+    """
+    Convert a csv file to parquet without loading it: the file is read in chunks of chunk_rows
+    rows, every chunk goes through the cleaning steps and is written as a row group of
+    out/part.0.parquet. Reading, cleaning and writing run in three threads connected by
+    queues of depth chunks, so at most 2 * depth + 5 chunks are in memory.
+    With max_memory chunk_rows is reduced to keep the memory of the process under the limit
+    (estimated from the size of the first rows), and the reader waits while the process is
+    over the limit and chunks are still queued.
+    The columns whose dtype is decided only at the end (float32, see CompactStep) are cast
+    rewriting the output one row group at a time.
+    Returns a report with rows, rows/sec, peak memory and what every step has done.
+    :param path path of the csv file
+    :param out output directory
+    :param steps cleaning chain: Step objects, step names or (name, kwargs) pairs
+           (default strip, dates, numeric, compact)
+    :param chunk_rows number of rows of every chunk (default 100000)
+    :param max_memory maximum memory of the process in bytes (default no limit)
+    :param depth number of chunks queued between two stages (default 2)
+    :param compression parquet compression (default snappy)
+    :param kwargs extra arguments of pandas.read_csv (e.g. sep)
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    steps = make_steps(steps)
+    slots = 2 * depth + _WORKING_CHUNKS
+    if max_memory is not None:
+        probe = pd.read_csv(path, dtype=str, nrows=1000, **kwargs)
+        row_bytes = probe.memory_usage(index=False, deep=True).sum() / max(len(probe), 1)
+        available = max_memory - psutil.Process().memory_info().rss
+        if available <= 0:
+            raise ValueError('max_memory is lower than the memory already used by the process')
+        chunk_rows = max(1, min(chunk_rows, int(available / (row_bytes * slots))))
+
+    os.makedirs(out, exist_ok=True)
+    target = os.path.join(out, 'part.0.parquet')
+    parsed, cleaned = queue.Queue(depth), queue.Queue(depth)
+    stop = threading.Event()
+    state = {'peak_rss': 0, 'read': 0.0, 'clean': 0.0, 'write': 0.0, 'error': None, 'schema': None}
+
+    def read():
+        try:
+            chunks = pd.read_csv(path, dtype=str, chunksize=chunk_rows, **kwargs)
+            while True:
+                # the queued chunks can be larger than estimated: wait until they are written
+                while max_memory is not None and not stop.is_set() and (parsed.qsize() > 0 or cleaned.qsize() > 0) \
+                        and psutil.Process().memory_info().rss > max_memory:
+                    time.sleep(0.01)
+                start = time.perf_counter()
+                chunk = next(chunks, None)
+                state['read'] += time.perf_counter() - start
+                _peak(state)
+                if chunk is None or not _put(parsed, chunk, stop):
+                    break
+        except Exception as e:
+            state['error'] = e
+            stop.set()
+        _put(parsed, None, stop)
+
+    def clean():
+        try:
+            while True:
+                chunk = _get(parsed, stop)
+                if chunk is None:
+                    break
+                start = time.perf_counter()
+                for step in steps:
+                    if state['schema'] is None:
+                        step.setup(chunk)
+                    chunk = step.apply(chunk)
+                if state['schema'] is None:
+                    state['schema'] = pin_schema(chunk)
+                table = pa.Table.from_pandas(chunk, schema=state['schema'], preserve_index=False)
+                del chunk
+                state['clean'] += time.perf_counter() - start
+                _peak(state)
+                if not _put(cleaned, table, stop):
+                    break
+        except Exception as e:
+            state['error'] = e
+            stop.set()
+        _put(cleaned, None, stop)
+
+    threads = [threading.Thread(target=read, daemon=True), threading.Thread(target=clean, daemon=True)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+
+    rows, row_groups, writer = 0, 0, None
+    try:
+        while True:
+            table = _get(cleaned, stop)
+            if table is None:
+                break
+            begin = time.perf_counter()
+            if writer is None:
+                writer = pq.ParquetWriter(target, table.schema, compression=compression)
+            writer.write_table(table, row_group_size=max(table.num_rows, 1))
+            rows += table.num_rows
+            row_groups += 1
+            del table
+            state['write'] += time.perf_counter() - begin
+            _peak(state)
+    except Exception as e:
+        state['error'] = e
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        if writer is not None:
+            writer.close()
+    if state['error'] is not None:
+        raise state['error']
+
+    dtypes = {}
+    for step in steps:
+        dtypes.update(step.final_dtypes())
+    if len(dtypes) > 0 and writer is not None:
+        begin = time.perf_counter()
+        state['schema'] = cast_file(target, dtypes, compression)
+        state['write'] += time.perf_counter() - begin
+
+    seconds = time.perf_counter() - start
+    return {
+        'path': target,
+        'rows': rows,
+        'row_groups': row_groups,
+        'chunk_rows': chunk_rows,
+        'seconds': seconds,
+        'rows_per_sec': rows / seconds if seconds > 0 else float('nan'),
+        'peak_rss': state['peak_rss'],
+        'max_memory': max_memory,
+        'stage_seconds': {stage: state[stage] for stage in ('read', 'clean', 'write')},
+        'steps': {step.name: step.report() for step in steps},
+        'dtypes': {field.name: str(field.type) for field in state['schema']} if state['schema'] is not None else {},
+    }
@@ -0,0 +1,212 @@
+import io
+import json
+import os
+import pandas as pd
+
+# bytes read at a time when looking for the end of a line
+_READ_BYTES = 1 << 20
+
+
+def is_json_lines(path):
+    """
+    Return True if the first line of the file is a whole json object (a json lines file)
+    """
+    with open(path, 'rb') as f:
+        line = f.readline(_READ_BYTES).strip()
+    try:
+        return isinstance(json.loads(line), dict)
+    except ValueError:
+        return False
+
+
+def _next_line(f, position):
+    """
+    Return the position of the first line that starts after position
+    """
+    f.seek(position)
+    while True:
+        chunk = f.read(_READ_BYTES)
+        if not chunk:
+            return f.tell()
+        found = chunk.find(b'\n')
+        if found >= 0:
+            return position + found + 1
+        position += len(chunk)
+
+
+def jsonl_blocks(path, blocksize=256 * 2 ** 20):
+    """
+    Split a json lines file in byte ranges of about blocksize bytes made of whole lines
+    :param path path of the file
+    :param blocksize size of the ranges in bytes (default 256MB)
+    """
+    size = os.path.getsize(path)
+    starts = [0]
+    with open(path, 'rb') as f:
+        while starts[-1] + blocksize < size:
+            start = _next_line(f, starts[-1] + blocksize)
+            if start >= size:
+                break
+            starts.append(start)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def _read_range(path, byte_range):
+    start, end = byte_range
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+def arrow_schema(dtypes):
+    """
+    Return the arrow schema of a dictionary column -> dtype name (e.g. int64, float64, bool, str, datetime64[ns])
+    """
+    import numpy as np
+    import pyarrow as pa
+
+    fields = []
+    for column, dtype in dtypes.items():
+        dtype = str(dtype)
+        if dtype in ('str', 'string', 'object'):
+            fields.append(pa.field(column, pa.string()))
+        elif dtype in ('bool', 'boolean'):
+            fields.append(pa.field(column, pa.bool_()))
+        else:
+            fields.append(pa.field(column, pa.from_numpy_dtype(np.dtype(dtype.lower()))))
+    return pa.schema(fields)
+
+
+def infer_schema(path, dtypes=None, sample_bytes=2 ** 20):
+    """
+    Infer the schema of a json lines file from its first sample_bytes bytes; the provided
+    dtypes override the inferred ones and columns with only nulls in the sample are strings.
+    :param path path of the file
+    :param dtypes dictionary column -> dtype name (default all inferred)
+    :param sample_bytes size of the sample
+    """
+    import pyarrow as pa
+
+    block = _read_range(path, jsonl_blocks(path, sample_bytes)[0])
+    table, _ = _parse_lines(block, None)
+    fields = []
+    for field in table.schema:
+        if pa.types.is_null(field.type) or pa.types.is_large_string(field.type):
+            field = field.with_type(pa.string())
+        fields.append(field)
+    schema = pa.schema(fields)
+    if dtypes:
+        pinned = arrow_schema(dtypes)
+        schema = pa.schema([pinned.field(f.name) if f.name in dtypes else f for f in schema] +
+                           [f for f in pinned if f.name not in schema.names])
+    return schema
+
+
+def _parse_lines(block, schema):
+    """
+    Parse a block line by line: the lines that are not json objects are skipped, the values
+    that don't match the schema become null.
+    Returns (arrow table, stats).
+    """
+    import pyarrow as pa
+
+    records, lines, malformed = [], 0, 0
+    for line in block.splitlines():
+        if not line.strip():
+            continue
+        lines += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict):
+            malformed += 1
+            continue
+        records.append(record)
+    stats = {'lines': lines, 'malformed': malformed, 'coerced': {}}
+    if schema is None:
+        # inference: a column with values of different types is a string
+        df = pd.DataFrame.from_records(records)
+        columns = {}
+        for column in df.columns:
+            try:
+                columns[column] = pa.array(df[column], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                columns[column] = pa.array(df[column].where(df[column].isna(), df[column].astype(str)), type=pa.string(), from_pandas=True)
+        return pa.table(columns), stats
+
+    df = pd.DataFrame.from_records(records, columns=schema.names)
+    columns = {}
+    for field in schema:
+        values = df[field.name]
+        try:
+            columns[field.name] = pa.array(values, type=field.type, from_pandas=True)
+            continue
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+            pass
+        if pa.types.is_string(field.type):
+            converted = values.where(values.isna(), values.astype(str))
+        elif pa.types.is_timestamp(field.type):
+            converted = pd.to_datetime(values, errors='coerce')
+        elif pa.types.is_boolean(field.type):
+            converted = values.where(values.map(lambda v: isinstance(v, bool)))
+        else:
+            converted = pd.to_numeric(values, errors='coerce')
+            if pa.types.is_integer(field.type):
+                converted = converted.where(converted == converted.round())
+        stats['coerced'][field.name] = int((converted.isna() & values.notna()).sum())
+        columns[field.name] = pa.array(converted, type=field.type, from_pandas=True)
+    return pa.table(columns, schema=schema), stats
+
+
+def parse_block(block, schema):
+    """
+    Parse a block of json lines with the provided schema (extra fields are ignored).
+    The whole block is parsed by arrow; if it contains malformed lines or values of other
+    types it is parsed again line by line, to skip and count them.
+    Returns (arrow table, stats).
+    """
+    import pyarrow.json as pj
+
+    try:
+        table = pj.read_json(io.BytesIO(block),
+                             read_options=pj.ReadOptions(use_threads=False, block_size=max(len(block), 1)),
+                             parse_options=pj.ParseOptions(explicit_schema=schema, unexpected_field_behavior='ignore'))
+        return table, {'lines': table.num_rows, 'malformed': 0, 'coerced': {}}
+    except Exception:
+        return _parse_lines(block, schema)
+
+
+def to_frame(table, library='pandas'):
+    """
+    Convert an arrow table to a pandas (nullable dtypes, so every block has the same dtypes
+    whatever its nulls) or cudf dataframe
+    """
+    import pyarrow as pa
+
+    if library == 'cudf':
+        import cudf
+        return cudf.DataFrame.from_arrow(table)
+    mapping = {pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(), pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype(),
+               pa.uint8(): pd.UInt8Dtype(), pa.uint16(): pd.UInt16Dtype(), pa.uint32(): pd.UInt32Dtype(), pa.uint64(): pd.UInt64Dtype(),
+               pa.bool_(): pd.BooleanDtype(), pa.string(): pd.StringDtype()}
+    return table.to_pandas(types_mapper=mapping.get)
+
+
+def read_jsonl_block(byte_range, path, schema, library='pandas'):
+    """
+    Read a byte range of a json lines file (see jsonl_blocks) as a pandas or cudf dataframe.
+    Returns (dataframe, stats).
+    """
+    table, stats = parse_block(_read_range(path, byte_range), schema)
+    return to_frame(table, library), stats
+
+
+def merge_jsonl_stats(*stats):
+    out = {'lines': 0, 'malformed': 0, 'coerced': {}}
+    for s in stats:
+        out['lines'] += s['lines']
+        out['malformed'] += s['malformed']
+        for column, count in s['coerced'].items():
+            out['coerced'][column] = out['coerced'].get(column, 0) + count
+    return out
@@ -0,0 +1,284 @@
+# Partition-level kernels shared by the pandas, cudf and Dask implementations.
+# Every kernel takes a pandas or cudf dataframe and uses only operations
+# available on both libraries, so on Dask it can be applied with map_partitions.
+
+
+MONTHS = {
+    'it': {
+        'gennaio': '01', 'febbraio': '02', 'marzo': '03', 'aprile': '04',
+        'maggio': '05', 'giugno': '06', 'luglio': '07', 'agosto': '08',
+        'settembre': '09', 'ottobre': '10', 'novembre': '11', 'dicembre': '12',
+        'gen': '01', 'feb': '02', 'mar': '03', 'apr': '04', 'mag': '05', 'giu': '06',
+        'lug': '07', 'ago': '08', 'set': '09', 'ott': '10', 'nov': '11', 'dic': '12',
+    },
+    'en': {
+        'january': '01', 'february': '02', 'march': '03', 'april': '04',
+        'may': '05', 'june': '06', 'july': '07', 'august': '08',
+        'september': '09', 'october': '10', 'november': '11', 'december': '12',
+        'jan': '01', 'feb': '02', 'mar': '03', 'apr': '04', 'jun': '06', 'jul': '07',
+        'aug': '08', 'sep': '09', 'oct': '10', 'nov': '11', 'dec': '12',
+    },
+}
+
+# "12 gennaio 2020" -> day, month name, year
+_TEXTUAL_DATE = r'^(\d{1,2})\s+([^\s\d]+)\s+(\d{4})$'
+
+
+def backend(df):
+    """
+    Return the library (pandas or cudf) of the provided dataframe/series
+    """
+    if type(df).__module__.startswith('cudf'):
+        import cudf
+        return cudf
+    import pandas
+    return pandas
+
+
+def parse_localized_dates_frame(df, columns, months):
+    """
+    Parse textual dates like "12 gennaio 2020" in the provided columns.
+    Values that can't be parsed become NaT.
+    Returns a dataframe with a datetime64[ns] column for every provided column.
+    :param df pandas or cudf dataframe
+    :param columns columns to parse
+    :param months dictionary month name (lower case) -> month number as two digits string
+    """
+    lib = backend(df)
+
+    out = lib.DataFrame(index=df.index)
+    for column in columns:
+        parts = df[column].astype('str').str.strip().str.lower().str.extract(_TEXTUAL_DATE)
+        text = parts[2] + '-' + parts[1].map(months) + '-' + parts[0].str.zfill(2)
+        out[column] = lib.to_datetime(text, format='%Y-%m-%d', errors='coerce').astype('datetime64[ns]')
+
+    return out
+
+
+def parse_localized_dates_partition(df, columns, months):
+    """
+    Parse textual dates (see parse_localized_dates_frame) and count the values that failed
+    the parsing in the same pass.
+    Returns (dataframe, failures): the dataframe is df with the converted columns,
+    failures a dictionary column -> number of non null values that became NaT.
+    :param df pandas or cudf dataframe
+    :param columns columns to parse
+    :param months dictionary month name (lower case) -> month number as two digits string
+    """
+    parsed = parse_localized_dates_frame(df, columns, months)
+    failures = {c: int((parsed[c].isna() & ~df[c].isna()).sum()) for c in columns}
+    return df.assign(**{c: parsed[c] for c in columns}), failures
+
+
+# "0,85 €/smc" -> number, unit
+_NUMBER_WITH_UNIT = r'^\s*([-+]?\d[\d.,]*)\s*(.*?)\s*$'
+
+
+def _numeric_text(series, decimal, strip_units):
+    """
+    Return the numeric part of the strings (with '.' as decimal separator) and their unit
+    """
+    parts = series.astype('str').str.extract(_NUMBER_WITH_UNIT)
+    number, unit = parts[0], parts[1]
+    thousands = '.' if decimal == ',' else ','
+    # the thousands separator is removed only from numbers grouped by three digits ("1.500,5"),
+    # with decimal ',' the value "1.5" is not 15
+    grouped = r'^[-+]?\d{1,3}([' + thousands + r']\d{3})+([' + decimal + r']\d*)?$'
+    number = number.where(~number.str.match(grouped).fillna(False).astype('bool'), number.str.replace(thousands, '', regex=False))
+    if decimal != '.':
+        number = number.str.replace(decimal, '.', regex=False)
+    if not strip_units:
+        # values with a unit are not numbers
+        number = number.where(unit.str.len() == 0)
+    return number, unit
+
+
+def _is_numeric(series):
+    return series.dtype.kind in 'biuf'
+
+
+def parse_numeric_strings_frame(df, columns, decimal=',', strip_units=True):
+    """
+    Convert strings like "0,85 €/smc" to float in the provided columns.
+    Values that can't be converted become NaN.
+    Returns a dataframe with a float64 column for every provided column.
+    :param df pandas or cudf dataframe
+    :param columns columns to convert
+    :param decimal decimal separator (default ',')
+    :param strip_units if True the unit after the number is removed, otherwise values with a unit become NaN
+    """
+    lib = backend(df)
+
+    out = lib.DataFrame(index=df.index)
+    for column in columns:
+        if _is_numeric(df[column]):
+            out[column] = df[column].astype('float64')
+            continue
+        number, _ = _numeric_text(df[column], decimal, strip_units)
+        out[column] = lib.to_numeric(number, errors='coerce').astype('float64')
+
+    return out
+
+
+def parse_numeric_strings_partition(df, columns, decimal=',', strip_units=True):
+    """
+    Convert strings like "0,85 €/smc" to float and report their units in the same pass
+    over the strings (see parse_numeric_strings_frame and numeric_strings_report).
+    Returns (dataframe, report): the dataframe is df with the converted columns.
+    :param df pandas or cudf dataframe
+    :param columns columns to convert
+    :param decimal decimal separator (default ',')
+    :param strip_units see parse_numeric_strings_frame
+    """
+    import pandas as pd
+
+    lib = backend(df)
+
+    out = {}
+    report = {}
+    for column in columns:
+        if _is_numeric(df[column]):
+            out[column] = df[column].astype('float64')
+            report[column] = {'units': pd.Series(dtype='int64'), 'coerced': 0}
+            continue
+        number, unit = _numeric_text(df[column], decimal, strip_units)
+        out[column] = lib.to_numeric(number, errors='coerce').astype('float64')
+        units = unit[unit.str.len() > 0].value_counts()
+        units = units.to_pandas() if hasattr(units, 'to_pandas') else units
+        report[column] = {'units': units, 'coerced': int((out[column].isna() & ~df[column].isna()).sum())}
+
+    return df.assign(**out), report
+
+
+def numeric_strings_report(df, columns, decimal=',', strip_units=True):
+    """
+    For every provided column returns the counts of the units found after the numbers
+    and the number of non null values that can't be converted to float
+    :param df pandas or cudf dataframe
+    :param columns columns to check
+    :param decimal decimal separator (default ',')
+    :param strip_units see parse_numeric_strings_frame
+    """
+    import pandas as pd
+
+    lib = backend(df)
+
+    out = {}
+    for column in columns:
+        if _is_numeric(df[column]):
+            out[column] = {'units': pd.Series(dtype='int64'), 'coerced': 0}
+            continue
+        number, unit = _numeric_text(df[column], decimal, strip_units)
+        coerced = lib.to_numeric(number, errors='coerce').isna() & ~df[column].isna()
+        units = unit[unit.str.len() > 0].value_counts()
+        units = units.to_pandas() if hasattr(units, 'to_pandas') else units
+        out[column] = {'units': units, 'coerced': int(coerced.sum())}
+
+    return out
+
+
+def merge_numeric_strings_reports(*reports):
+    out = reports[0]
+    for other in reports[1:]:
+        out = {
+            c: {
+                'units': out[c]['units'].add(other[c]['units'], fill_value=0),
+                'coerced': out[c]['coerced'] + other[c]['coerced'],
+            } for c in out
+        }
+    return out
+
+
+# the folding table used in the notebook to normalize the names of the comuni
+_DIACRITICS = str.maketrans(
+    'ŠŽšžŸÀÁÂÃÄÅÇÈÉÊËÌÍÎÏÐÑÒÓÔÕÖÙÚÛÜÝàáâãäåçèéêëìíîïðñòóôõöùúûüýÿ',
+    'SZszYAAAAAACEEEEIIIIDNOOOOOUUUUYaaaaaaceeeeiiiidnooooouuuuyy',
+)
+_FOLD = dict(_DIACRITICS)
+_FOLD.update({ord("'"): '', ord('’'): '', ord('`'): ''})
+
+_CASES = ('lower', 'upper', 'title', 'capitalize', 'swapcase')
+
+
+def _is_string(series):
+    dtype = str(series.dtype)
+    return dtype in ('object', 'str') or dtype.startswith('string')
+
+
+def clean_strings_frame(df, columns, strip=True, case=None, fold_diacritics=False, collapse_whitespace=False):
+    """
+    Apply all the string cleaning transforms to the provided columns in a single pass
+    (on Dask a single map_partitions instead of a layer for every column and transform).
+    The columns that don't contain strings are skipped.
+    Returns a dataframe with the cleaned columns.
+    :param df pandas or cudf dataframe
+    :param columns columns to clean
+    :param strip True to remove leading/trailing whitespaces, or the characters to remove
+    :param case lower, upper, title, capitalize, swapcase or None to keep it
+    :param fold_diacritics if True accented letters become plain letters ("è" -> "e")
+    :param collapse_whitespace if True every sequence of whitespaces becomes a single space
+    """
+    if case is not None and case not in _CASES:
+        raise ValueError('case must be one of {}'.format(', '.join(_CASES)))
+    lib = backend(df)
+
+    out = lib.DataFrame(index=df.index)
+    for column in columns:
+        values = df[column]
+        if not _is_string(values):
+            continue
+        if fold_diacritics:
+            values = values.str.translate(_DIACRITICS)
+        if collapse_whitespace:
+            values = values.str.replace(r'\s+', ' ', regex=True)
+        if strip:
+            values = values.str.strip(None if strip is True else strip)
+        if case is not None:
+            values = getattr(values.str, case)()
+        out[column] = values
+
+    return out
+
+
+def normalize_names(series):
+    """
+    Normalize names (e.g. cities) to compare them: diacritics folded, apostrophes removed,
+    whitespace collapsed, upper case ("Quarto d'Altino " -> "QUARTO DALTINO")
+    :param series pandas or cudf series of strings
+    """
+    return series.str.translate(_FOLD).str.replace(r'\s+', ' ', regex=True).str.strip().str.upper()
+
+
+def map_names(series, lookup):
+    """
+    Map the normalized names of a series with a lookup table (hash join on the names);
+    names not found become null
+    :param series pandas or cudf series of strings
+    :param lookup pandas or cudf series: normalized name -> value
+    """
+    return normalize_names(series).map(lookup)
+
+
+def name_lookup(reference, key_field, value_field):
+    """
+    Build a lookup table from a reference table with names and values (e.g. comune -> regione).
+    Returns the lookup as a pandas series indexed by the normalized names and the list of the
+    names that appear with different values (only the first value is kept).
+    :param reference pandas dataframe or path of a csv/parquet file
+    :param key_field column with the names
+    :param value_field column with the values
+    """
+    import pandas as pd
+
+    if isinstance(reference, str):
+        if reference.endswith('.parquet'):
+            reference = pd.read_parquet(reference, columns=[key_field, value_field])
+        else:
+            reference = pd.read_csv(reference, usecols=[key_field, value_field])
+
+    names = normalize_names(reference[key_field].astype('str'))
+    lookup = pd.Series(reference[value_field].values, index=names.values).dropna()
+    pairs = lookup.reset_index().drop_duplicates()
+    ambiguous = sorted(pairs['index'][pairs['index'].duplicated()].unique())
+
+    return lookup[~lookup.index.duplicated()], ambiguous
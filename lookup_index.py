@@ -0,0 +1,280 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from df_benchmark.algorithms.sketches import hash_values
+
+# directory of the indexes, inside the dataset: the entries are parquet files saved with the
+# ENTRIES_EXTENSION extension, so the readers of the dataset (read_parquet without _metadata) do not load them
+INDEX_DIR = '_index'
+ENTRIES_EXTENSION = 'idx'
+
+
+def dataset_files(path):
+    """
+    Return the parquet files of a dataset, relative to its directory, in a stable order
+    """
+    out = []
+    for root, dirs, names in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(('_', '.')))
+        out += [os.path.relpath(os.path.join(root, n), path) for n in sorted(names) if n.endswith('.parquet') and not n.startswith(('_', '.'))]
+    return out
+
+
+def _file_version(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def writer_options(parquet):
+    """
+    Return the ParquetWriter arguments that keep the layout of a file (e.g. written by to_parquet):
+    compression, dictionary encoding and statistics of every column, read from its first row group
+    :param parquet pyarrow ParquetFile
+    """
+    metadata = parquet.metadata
+    if metadata.num_row_groups == 0:
+        return {}
+    row_group = metadata.row_group(0)
+    columns = {row_group.column(i).path_in_schema: row_group.column(i) for i in range(row_group.num_columns)}
+    codecs = {'UNCOMPRESSED': 'NONE', 'LZ4_RAW': 'LZ4'}
+    return {
+        'compression': {name: codecs.get(c.compression, c.compression) for name, c in columns.items()},
+        'use_dictionary': [name for name, c in columns.items() if c.has_dictionary_page],
+        'write_statistics': [name for name, c in columns.items() if c.is_stats_set],
+        'version': metadata.format_version,
+    }
+
+
+def arrow_hashes(values):
+    """
+    Return the hashes of an arrow array: integers and booleans are converted to nullable
+    pandas dtypes, so a value has the same hash whether its row group has nulls or not
+    """
+    import pyarrow as pa
+
+    nullable = {pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(), pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype(),
+                pa.uint8(): pd.UInt8Dtype(), pa.uint16(): pd.UInt16Dtype(), pa.uint32(): pd.UInt32Dtype(), pa.uint64(): pd.UInt64Dtype(),
+                pa.bool_(): pd.BooleanDtype()}
+    return hash_values(pd.Series(values.to_pandas(types_mapper=nullable.get)))
+
+
+def index_file(path, column):
+    """
+    Index a column of a parquet file: returns a dataframe with the hash of every value
+    and its position (row group, row offset inside the row group)
+    :param path path of the file
+    :param column column to index
+    """
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path)
+    parts = []
+    for row_group in range(parquet.metadata.num_row_groups):
+        values = parquet.read_row_group(row_group, columns=[column]).column(0)
+        parts.append(pd.DataFrame({
+            'hash': arrow_hashes(values),
+            'row_group': np.int32(row_group),
+            'row': np.arange(len(values), dtype='int64'),
+        }))
+    if len(parts) == 0:
+        return pd.DataFrame({'hash': np.empty(0, 'uint64'), 'row_group': np.empty(0, 'int32'), 'row': np.empty(0, 'int64')})
+    return pd.concat(parts, ignore_index=True)
+
+
+class LookupIndex(object):
+    """
+    Secondary index of a column of a parquet dataset, saved in the _index directory of the dataset.
+    It maps the hash of every value to its position: (file, row group, row offset), so a lookup
+    reads only the row groups that contain the keys.
+    The files that are added or modified after the index has been built are indexed by update,
+    without indexing again the rest of the dataset; locate and lookup call it when the size or
+    the modification time of a file has changed since the index was built.
+    :param path path of the parquet dataset
+    :param column indexed column
+    """
+
+    def __init__(self, path, column):
+        self.path = path
+        self.column = column
+        self.files = {}
+        self.entries = None
+
+    def _index_path(self, extension):
+        return os.path.join(self.path, INDEX_DIR, '{}.{}'.format(self.column, extension))
+
+    def load(self):
+        """
+        Load the index from disk, returns False if it has not been built
+        """
+        if not os.path.exists(self._index_path('json')):
+            return False
+        with open(self._index_path('json')) as f:
+            self.files = json.load(f)
+        self.entries = pd.read_parquet(self._index_path(ENTRIES_EXTENSION))
+        return True
+
+    def save(self):
+        os.makedirs(os.path.join(self.path, INDEX_DIR), exist_ok=True)
+        self.entries.to_parquet(self._index_path(ENTRIES_EXTENSION), index=False)
+        with open(self._index_path('json'), 'w') as f:
+            json.dump(self.files, f, indent=1)
+
+    def is_stale(self):
+        """
+        Return True if files of the dataset have been added, removed or rewritten since the last update
+        """
+        current = {name: _file_version(os.path.join(self.path, name)) for name in dataset_files(self.path)}
+        return current != {name: info['version'] for name, info in self.files.items()}
+
+    def update(self, workers=8):
+        """
+        Index the files that are new or changed since the last update (all of them the first time),
+        drop the entries of the removed files and save the index.
+        Returns the number of files indexed.
+        :param workers number of files indexed in parallel
+        """
+        if self.entries is None:
+            self.load()
+        current = {name: _file_version(os.path.join(self.path, name)) for name in dataset_files(self.path)}
+        changed = [name for name, version in current.items() if self.files.get(name, {}).get('version') != version]
+        kept = {name: info for name, info in self.files.items() if name in current and name not in changed}
+
+        ids = {info['id'] for info in kept.values()}
+        next_id = max(ids) + 1 if ids else 0
+        for name in changed:
+            kept[name] = {'id': next_id, 'version': current[name]}
+            next_id += 1
+
+        with ThreadPoolExecutor(workers) as pool:
+            parts = list(pool.map(lambda name: index_file(os.path.join(self.path, name), self.column).assign(file=np.int32(kept[name]['id'])), changed))
+
+        entries = self.entries[self.entries['file'].isin(list(ids))] if self.entries is not None else None
+        entries = pd.concat(([entries] if entries is not None else []) + parts, ignore_index=True)
+        self.entries = entries.sort_values('hash', kind='stable').reset_index(drop=True)
+        self.files = kept
+        self.save()
+
+        return len(changed)
+
+    def _schema(self):
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(os.path.join(self.path, next(iter(self.files))))
+
+    def _keys(self, keys):
+        """
+        Return the keys as an arrow array with the type of the indexed column,
+        so they are hashed like the values of the files
+        """
+        import pyarrow as pa
+
+        return pa.array(list(keys), type=self._schema().field(self.column).type)
+
+    def locate(self, keys):
+        """
+        Return the positions (file, row group, row) of the rows that may contain the keys
+        (hash matches: the values must be checked)
+        :param keys list of values
+        """
+        if self.entries is None and not self.load():
+            raise ValueError('the index on {} has not been built'.format(self.column))
+        if self.is_stale():
+            # the dataset has been rewritten: the positions of the changed files are not valid
+            self.update()
+        if len(self.files) == 0:
+            return self.entries
+        hashes = np.unique(arrow_hashes(self._keys(keys)))
+        sorted_hashes = self.entries['hash'].to_numpy()
+        start = np.searchsorted(sorted_hashes, hashes, side='left')
+        stop = np.searchsorted(sorted_hashes, hashes, side='right')
+        rows = np.concatenate([np.arange(a, b) for a, b in zip(start, stop)]) if len(hashes) > 0 else np.empty(0, 'int64')
+        return self.entries.iloc[rows]
+
+    def _names(self):
+        return {info['id']: name for name, info in self.files.items()}
+
+    def _read_rows(self, name, row_group, rows, columns, keys):
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        table = pq.ParquetFile(os.path.join(self.path, name)).read_row_group(row_group, columns=columns)
+        table = table.take(np.sort(rows))
+        # drop the hash collisions
+        return table.filter(pc.is_in(table[self.column], value_set=keys))
+
+    def lookup(self, keys, columns=None, workers=8):
+        """
+        Return the rows whose indexed column is one of the keys, reading only the row groups that contain them
+        :param keys list of values (a batch of keys is served with a single read of every row group)
+        :param columns columns to return (default all)
+        :param workers number of row groups read in parallel
+        """
+        import pyarrow as pa
+
+        positions = self.locate(keys)
+        if columns is not None and self.column not in columns:
+            columns = list(columns) + [self.column]
+        names = self._names()
+        groups = list(positions.groupby(['file', 'row_group'])['row'])
+        if len(groups) == 0:
+            table = self._schema().empty_table()
+            return table.select(columns).to_pandas() if columns is not None else table.to_pandas()
+
+        keys = self._keys(keys)
+        with ThreadPoolExecutor(workers) as pool:
+            parts = list(pool.map(lambda g: self._read_rows(names[g[0][0]], g[0][1], g[1].to_numpy(), columns, keys), groups))
+        return pa.concat_tables(parts).to_pandas()
+
+    def set_value(self, keys, column, value):
+        """
+        Set column to value in the rows whose indexed column is one of the keys.
+        Only the files that contain the keys are rewritten, with the same row groups and the same
+        compression, dictionary encoding and statistics, so the positions in the index stay valid (if the indexed column itself is modified
+        the rewritten files are indexed again). The _metadata file of the dataset is removed,
+        its statistics are no longer valid.
+        Returns the number of rows modified.
+        :param keys list of values of the indexed column
+        :param column column to modify
+        :param value new value
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        positions = self.locate(keys)
+        names = self._names()
+        keys = self._keys(keys)
+        modified = 0
+        for file_id in positions['file'].unique():
+            name = os.path.join(self.path, names[file_id])
+            parquet = pq.ParquetFile(name)
+            schema = parquet.schema_arrow
+            field = schema.get_field_index(column)
+            matching = set(positions.loc[positions['file'] == file_id, 'row_group'])
+            tables = []
+            for row_group in range(parquet.metadata.num_row_groups):
+                table = parquet.read_row_group(row_group)
+                if row_group in matching:
+                    match = pc.is_in(table[self.column], value_set=keys)
+                    modified += pc.sum(match).as_py() or 0
+                    values = pc.if_else(match, pa.scalar(value, type=schema.field(field).type), table[column])
+                    table = table.set_column(field, schema.field(field), values)
+                tables.append(table)
+            tmp = name + '.tmp'
+            with pq.ParquetWriter(tmp, schema, **writer_options(parquet)) as writer:
+                for table in tables:
+                    writer.write_table(table, row_group_size=max(table.num_rows, 1))
+            os.replace(tmp, name)
+            if column != self.column:
+                # same rows in the same positions: the entries of the file are still valid
+                self.files[names[file_id]]['version'] = _file_version(name)
+
+        if len(positions) > 0 and os.path.exists(os.path.join(self.path, '_metadata')):
+            os.remove(os.path.join(self.path, '_metadata'))
+        if column == self.column:
+            self.update()
+        else:
+            self.save()
+        return modified
@@ -0,0 +1,257 @@
+import functools
+import json
+import threading
+import time
+import psutil
+
+
+def cluster_memory(client=None):
+    """
+    Return the memory used by the driver process and by all the workers of the cluster (in bytes):
+     - rss: resident memory of the driver and of the worker processes
+     - managed: memory used by the data stored in the workers
+     - spilled: bytes spilled to disk by the workers
+     - device: GPU memory used by the workers (0 if not available)
+     - workers: number of workers
+    :param client dask distributed client, if None only the driver is measured
+    """
+    out = {'rss': psutil.Process().memory_info().rss, 'managed': 0, 'spilled': 0, 'device': 0, 'workers': 0}
+    if client is None:
+        return out
+
+    for worker in client.scheduler_info(n_workers=-1)['workers'].values():
+        metrics = worker['metrics']
+        out['rss'] += metrics.get('memory', 0)
+        out['managed'] += metrics.get('managed_bytes', 0)
+        out['spilled'] += metrics.get('spilled_bytes', {}).get('disk', 0)
+        out['device'] += metrics.get('gpu', {}).get('memory-used', 0) or 0
+        out['workers'] += 1
+
+    return out
+
+
+class MemorySampler(object):
+    """
+    Context manager that samples the cluster memory in a background thread
+    and keeps the peak of every measure
+    :param client dask distributed client
+    :param interval seconds between two samples (default 0.1)
+    """
+
+    def __init__(self, client=None, interval=0.1):
+        self.client = client
+        self.interval = interval
+        self.peak = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        for key, value in cluster_memory(self.client).items():
+            self.peak[key] = max(self.peak.get(key, 0), value)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return False
+
+
+def public_methods(obj, exclude=()):
+    """
+    Return the names of the public methods of an object
+    :param obj object to inspect
+    :param exclude names to skip
+    """
+    names = []
+    for name in dir(type(obj)):
+        if name.startswith('_') or name in exclude:
+            continue
+        if isinstance(getattr(type(obj), name), property):
+            continue
+        if callable(getattr(obj, name)):
+            names.append(name)
+    return names
+
+
+def wrap_methods(obj, wrapper, exclude=()):
+    """
+    Replace, on the instance, every public method of obj with wrapper(name, method)
+    :param obj object to instrument
+    :param wrapper function (name, bound method) -> callable
+    :param exclude names of the methods to leave untouched
+    """
+    for name in public_methods(obj, exclude):
+        # wrap the current attribute, so different wrappers can be stacked
+        method = getattr(obj, name)
+        setattr(obj, name, functools.wraps(method)(wrapper(name, method)))
+
+
+def memory_tracker(records, client=None, interval=0.1):
+    """
+    Return a wrapper (for wrap_methods) that records the peak cluster memory of every call
+    in the provided list; nested calls are accounted to the outermost one
+    :param records list where the measures are appended
+    :param client dask distributed client
+    :param interval seconds between two samples
+    """
+    depth = [0]
+
+    def wrapper(name, method):
+        def tracked(*args, **kwargs):
+            if depth[0] > 0:
+                return method(*args, **kwargs)
+            depth[0] += 1
+            start = time.time()
+            sampler = MemorySampler(client, interval)
+            try:
+                with sampler:
+                    return method(*args, **kwargs)
+            finally:
+                depth[0] -= 1
+                record = {'method': name, 'seconds': time.time() - start}
+                record.update({'peak_' + k: v for k, v in sampler.peak.items() if k != 'workers'})
+                records.append(record)
+        return tracked
+
+    return wrapper
+
+
+def frame_stats(df, count_rows=False):
+    """
+    Return rows, partitions and graph tasks of a dataframe, an empty dictionary if df is not a dataframe.
+    The rows of a Dask dataframe are counted (with a computation) only if count_rows is True.
+    :param df pandas, cudf or dask dataframe
+    :param count_rows if True the rows of a Dask dataframe are computed
+    """
+    if not hasattr(df, 'columns') or not hasattr(df, 'shape'):
+        return {}
+    if hasattr(df, 'dask'):
+        rows = int(df.shape[0].compute()) if count_rows else None
+        return {'rows': rows, 'partitions': df.npartitions, 'tasks': len(df.dask)}
+    return {'rows': len(df), 'partitions': 1, 'tasks': 0}
+
+
+def _prefix(key):
+    from dask.utils import key_split
+
+    return key_split(key)
+
+
+def task_bytes(tasks):
+    """
+    Summarize the tasks of a dask task stream:
+     - tasks: number of tasks run
+     - bytes_read: size of the partitions produced by the tasks that read the data
+     - bytes_shuffled: size of the partitions produced by the shuffles
+    :param tasks records of distributed.get_task_stream
+    """
+    out = {'tasks': len(tasks), 'bytes_read': 0, 'bytes_shuffled': 0}
+    for task in tasks:
+        prefix = _prefix(task['key'])
+        nbytes = task.get('nbytes', 0) or 0
+        if prefix.startswith(('read', 'from_map', 'frommap', 'from-map')):
+            out['bytes_read'] += nbytes
+        elif 'shuffle' in prefix and not prefix.endswith(('transfer', 'barrier')):
+            out['bytes_shuffled'] += nbytes
+    return out
+
+
+def method_tracer(events, client=None, get_input=None, count_rows=False):
+    """
+    Return a wrapper (for wrap_methods) that appends an event to the provided list for every call:
+    method, start, seconds, depth (0 for the outermost calls), rows/partitions/tasks of the dataframe
+    before (_in) and after (_out) the call, and, for the outermost calls executed on a cluster,
+    the tasks run with the bytes read and shuffled (see task_bytes).
+    The output is the returned dataframe if any, otherwise the one returned by get_input.
+    :param events list where the events are appended
+    :param client dask distributed client, if None the tasks are not recorded
+    :param get_input function that returns the current dataframe without computing it
+    :param count_rows if True the rows of the Dask dataframes are computed (an extra pass on the data)
+    """
+    depth = [0]
+
+    def stats(df, suffix):
+        return {key + suffix: value for key, value in frame_stats(df, count_rows).items()}
+
+    def wrapper(name, method):
+        def traced(*args, **kwargs):
+            from contextlib import nullcontext
+            from distributed import get_task_stream
+
+            event = {'method': name, 'depth': depth[0], 'error': None}
+            if get_input is not None:
+                event.update(stats(get_input(), '_in'))
+            stream = get_task_stream(client) if client is not None and depth[0] == 0 else nullcontext()
+            depth[0] += 1
+            event['start'] = time.time()
+            # also set when a BaseException (e.g. KeyboardInterrupt) skips the except block
+            result = None
+            try:
+                with stream:
+                    result = method(*args, **kwargs)
+                return result
+            except Exception as e:
+                event['error'] = '{}: {}'.format(type(e).__name__, e)
+                raise
+            finally:
+                event['seconds'] = time.time() - event['start']
+                depth[0] -= 1
+                if stream is not None and hasattr(stream, 'data'):
+                    event['task_stream'] = list(stream.data)
+                    event.update(task_bytes(event['task_stream']))
+                output = result if frame_stats(result) else (get_input() if get_input is not None else None)
+                event.update(stats(output, '_out'))
+                events.append(event)
+        return traced
+
+    return wrapper
+
+
+def chrome_trace(events):
+    """
+    Convert the events of method_tracer to the Chrome trace format (chrome://tracing, Perfetto):
+    the method calls are on the "driver" process, the tasks on a process for every worker
+    :param events list of events of method_tracer
+    """
+    if not events:
+        return {'traceEvents': []}
+    origin = min(e['start'] for e in events)
+    us = lambda t: (t - origin) * 1e6
+    trace = [{'name': 'process_name', 'ph': 'M', 'pid': 0, 'args': {'name': 'driver'}}]
+    workers = {}
+
+    for event in events:
+        args = {k: v for k, v in event.items() if k not in ('method', 'start', 'seconds', 'task_stream')}
+        trace.append({'name': event['method'], 'cat': 'method', 'ph': 'X', 'pid': 0, 'tid': 0,
+                      'ts': us(event['start']), 'dur': event['seconds'] * 1e6, 'args': args})
+        for task in event.get('task_stream', []):
+            if task['worker'] not in workers:
+                workers[task['worker']] = len(workers) + 1
+                trace.append({'name': 'process_name', 'ph': 'M', 'pid': workers[task['worker']], 'args': {'name': task['worker']}})
+            for step in task['startstops']:
+                trace.append({'name': _prefix(task['key']), 'cat': step['action'], 'ph': 'X',
+                              'pid': workers[task['worker']], 'tid': task.get('thread', 0),
+                              'ts': us(step['start']), 'dur': (step['stop'] - step['start']) * 1e6,
+                              'args': {'key': str(task['key']), 'nbytes': task.get('nbytes', 0)}})
+
+    return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+
+def write_chrome_trace(events, path):
+    """
+    Write the events of method_tracer as a Chrome trace json file
+    :param events list of events of method_tracer
+    :param path output file
+    """
+    with open(path, 'w') as f:
+        json.dump(chrome_trace(events), f, default=str)
@@ -1,9 +1,53 @@
 from df_benchmark.algorithms.base import BaseDfBench
+from df_benchmark.algorithms.sketches import QuantileSketch
+from df_benchmark.algorithms.xml_reader import iter_xml_batches
+from df_benchmark.algorithms.sql_reader import read_sql_parallel
+from df_benchmark.algorithms.arrow_ipc import ipc_files, read_ipc, write_ipc
+from df_benchmark.algorithms.jsonl_reader import is_json_lines, infer_schema, jsonl_blocks, read_jsonl_block, merge_jsonl_stats
+from df_benchmark.algorithms.monitoring import wrap_methods
+import numpy as np
 import pandas as pd
 
+# Methods that never modify the dataframe: the other ones invalidate the cached sketches
+READ_ONLY_METHODS = (
+    'get_df', 'get_columns', 'get_columns_types', 'get_stats', 'get_quantile_sketches', 'get_quantile_bins',
+    'get_duplicate_columns', 'get_json_report', 'get_memory_usage', 'is_unique', 'locate_null_values',
+    'locate_outliers', 'search_by_pattern', 'check_allowed_char', 'find_mismatched_dtypes', 'infer_dtypes',
+    'groupby', 'sample_rows', 'query', 'to_csv', 'to_arrow', 'done',
+)
+
 class pandasBench(BaseDfBench):
-    def __init__(self):
-        pass
+    def __init__(self, sketch_error=0.01):
+        """
+        :param sketch_error rank error of the quantile sketches used by
+               locate_outliers, get_stats and get_quantile_bins (default 0.01)
+        """
+        self.sketch_error = sketch_error
+        self._sketches = {}
+        self._json_stats = None
+        # bumped by every call that may modify the dataframe, it is the key of the cached sketches
+        self._version = 0
+        wrap_methods(self, self._versioned, exclude=READ_ONLY_METHODS)
+
+    @property
+    def df(self):
+        return self._df
+
+    @df.setter
+    def df(self, df):
+        self._df = df
+        self._version += 1
+
+    def _versioned(self, name, method):
+        """
+        Wrapper (for wrap_methods) that marks the dataframe as modified after every call
+        """
+        def call(*args, **kwargs):
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._version += 1
+        return call
 
     def load_dataset(self, path, format, conn=None, **kwargs):
         """
@@ -19,25 +63,49 @@ class pandasBench(BaseDfBench):
             self.df = self.read_excel(path, **kwargs)
         elif format == "parquet":
             self.df = self.read_parquet(path, **kwargs)
+        elif format in ("arrow", "feather"):
+            self.df = self.read_arrow(path, **kwargs)
         elif format == "sql":
             self.df = self.read_sql(path, conn, **kwargs)
             
         return self.df
         
-    def read_sql(self, query, conn, **kwargs):
+    def read_sql(self, query, conn, column=None, npartitions=8, bounds=None, pool_size=4, chunk_rows=50000, **kwargs):
         """
         Given a connection and a query
-        creates a dataframe from the query output
+        creates a dataframe from the query output.
+        With a key column the query is read in npartitions ranges of the key by pool_size
+        threads, each with its own connection, fetching chunk_rows rows at a time (see sql_reader.py)
         """
-        self.df = pd.read_sql(query, conn)
+        self.df = pd.concat(read_sql_parallel(query, conn, column, npartitions, bounds, pool_size, chunk_rows, **kwargs),
+                            ignore_index=True)
         return self.df
         
-    def read_json(self, path, **kwargs):
+    def read_json(self, path, dtypes=None, blocksize=64 * 2 ** 20, workers=None, **kwargs):
         """
-        Read a json file
+        Read a json file. A json lines file is split in blocks of about blocksize bytes
+        parsed in parallel with the same schema (the provided dtypes and the types inferred
+        from the first block), malformed lines are skipped and counted (see get_json_report)
         """
-        self.df = pd.read_json(path, **kwargs)
+        from concurrent.futures import ThreadPoolExecutor
+
+        if kwargs or not is_json_lines(path):
+            self.df = pd.read_json(path, **kwargs)
+            return self.df
+
+        schema = infer_schema(path, dtypes)
+        with ThreadPoolExecutor(workers) as pool:
+            parts = list(pool.map(lambda r: read_jsonl_block(r, path, schema), jsonl_blocks(path, blocksize)))
+        self.df = pd.concat([frame for frame, _ in parts], ignore_index=True)
+        self._json_stats = merge_jsonl_stats(*[stats for _, stats in parts])
         return self.df
+
+    def get_json_report(self):
+        """
+        Return the number of lines, of malformed lines and of values that didn't match
+        the schema (for every column) of the last json lines file read
+        """
+        return self._json_stats
     
     def read_csv(self, path, **kwargs):
         """
@@ -46,11 +114,11 @@ class pandasBench(BaseDfBench):
         self.df = pd.read_csv(path, **kwargs)
         return self.df
         
-    def read_xml(self, path, **kwargs):
+    def read_xml(self, path, record_tag=None, columns=None, dtypes=None, batch_rows=100000):
         """
-        Read a xml file
+        Read a xml file, one record at a time without building the tree (see xml_reader.py)
         """
-        self.df = pd.read_xml(path, **kwargs)
+        self.df = pd.concat(iter_xml_batches(path, record_tag, columns, dtypes, batch_rows), ignore_index=True)
         return self.df
         
     def read_excel(self, path, **kwargs):
@@ -67,6 +135,18 @@ class pandasBench(BaseDfBench):
         self.df = pd.read_parquet(path, **kwargs)
         return self.df
 
+    def read_arrow(self, path, columns=None, arrow_dtypes=True):
+        """
+        Read an Arrow IPC/Feather file (or a directory of part files written by the Dask backends)
+        mapping it in memory: nothing is decoded or copied, only the columns that are used are
+        read from disk (see arrow_ipc.py).
+        With arrow_dtypes the columns keep the arrow types (e.g. int64[pyarrow]) instead of the
+        numpy dtypes returned by read_parquet; without it they are converted, copying them.
+        """
+        frames = [read_ipc(f, columns, arrow_dtypes=arrow_dtypes) for f in ipc_files(path)]
+        self.df = frames[0] if len(frames) == 1 else pd.concat(frames)
+        return self.df
+
     def sort(self, columns, ascending=True):
         """
         Sort the dataframe by the provided columns
@@ -149,9 +229,32 @@ class pandasBench(BaseDfBench):
         in the provided column lower or higher than the values
         of the lower/upper quantile.
         """
-        q_low = self.df[column].quantile(lower_quantile)
-        q_hi  = self.df[column].quantile(upper_quantile)
+        q_low, q_hi = self.get_quantile_sketches([column])[column].quantile([lower_quantile, upper_quantile])
         return self.df[(self.df[column] < q_low) | (self.df[column] > q_hi)]
+
+    def _sketch_token(self, column):
+        # edits made directly on the frame (e.g. get_df()[column] = ...) are not seen:
+        # assign the frame to bench.df afterwards
+        return (self._version, self.sketch_error)
+
+    def get_quantile_sketches(self, columns):
+        """
+        Returns a dictionary with a quantile sketch for every provided numeric column.
+        The sketches are cached on the instance and rebuilt only after a method that may
+        modify the dataframe (or an assignment of bench.df) is called.
+        """
+        for column in columns:
+            token = self._sketch_token(column)
+            if column not in self._sketches or self._sketches[column][0] != token:
+                self._sketches[column] = (token, QuantileSketch(self.sketch_error).update(self.df[column]))
+        return {c: self._sketches[c][1] for c in columns}
+
+    def get_quantile_bins(self, column, bins):
+        """
+        Returns the edges of bins equal-frequency bins of the provided column,
+        computed on the cached quantile sketch
+        """
+        return self.get_quantile_sketches([column])[column].quantile(np.linspace(0, 1, bins + 1))
         
     def get_columns_types(self):
         """
@@ -170,32 +273,21 @@ class pandasBench(BaseDfBench):
         return self.df
         
         
-    def get_stats(self):
+    def get_stats(self, percentiles=(0.25, 0.5, 0.75)):
         """
         Returns dataframe statistics.
         Only for numeric columns.
         Min value, max value, average value, standard deviation, and standard quantiles.
-        """
-        return df.describe()
-        
+        The statistics are computed on the cached quantile sketches.
+        """
+        columns = list(self.df.select_dtypes(include=np.number).columns)
+        stats = {}
+        for column, sketch in self.get_quantile_sketches(columns).items():
+            stats[column] = [sketch.count(), sketch.mean if sketch.count() > 0 else np.nan, sketch.std(), sketch.min]
+            stats[column] += list(sketch.quantile(list(percentiles))) + [sketch.max]
+        index = ['count', 'mean', 'std', 'min'] + ['{:g}%'.format(p * 100) for p in percentiles] + ['max']
+        return pd.DataFrame(stats, index=index)
         
-    def find_mismatched_dtypes(self):
-        """
-        Returns, if exists, a list of columns with mismatched data types.
-        For example, a column with string dtypes that contains only integer values.
-        For every columns the list contain an object with three keys:
-         - Col: name of the column
-         - current_dtype: current data type
-         - suggested_dtype: suggested data type
-        """
-        current_dtypes = self.get_columns_types()
-        new_dtypes = self.df.apply(pd.to_numeric, errors='ignore').dtypes.apply(lambda x: x.name).to_dict()
-
-        out = []
-        for k in current_dtypes.keys():
-            if new_dtypes[k] != current_dtypes[k]:
-                out.append({'col': k, 'current_dtype': current_dtypes[k], 'suggested_dtype': new_dtypes[k]})
-        return out
         
     def check_allowed_char(self, column, pattern):
         """
@@ -466,6 +558,13 @@ class pandasBench(BaseDfBench):
         """
         self.df.to_csv(path, **kwargs)
         pass
+
+    def to_arrow(self, path, compression=None):
+        """
+        Export the dataframe in an Arrow IPC/Feather file, reloaded by load_dataset(format="arrow")
+        without decoding (use compression lz4 or zstd to trade the zero copy read for a smaller file)
+        """
+        write_ipc(self.df, path, compression)
         
     def query(self, query):
         """
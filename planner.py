@@ -0,0 +1,391 @@
+import ast
+
+
+# Operations that can be recorded by the lazy mode of BaseDfBench.
+# For each of them we know which columns are read/modified, so the plan
+# can be rewritten before touching the data.
+LAZY_OPERATIONS = [
+    'delete_columns',
+    'rename_columns',
+    'query',
+    'cast_columns_types',
+    'strip',
+    'replace',
+    'set_content_case',
+    'remove_diacritics',
+    'clean_strings',
+]
+
+_COMPARE_OPS = {
+    ast.Eq: '==',
+    ast.NotEq: '!=',
+    ast.Lt: '<',
+    ast.LtE: '<=',
+    ast.Gt: '>',
+    ast.GtE: '>=',
+    ast.In: 'in',
+    ast.NotIn: 'not in',
+}
+
+_SWAPPED_OPS = {'<': '>', '<=': '>=', '>': '<', '>=': '<=', '==': '==', '!=': '!='}
+
+
+def query_columns(query):
+    """
+    Return the set of column names referenced by a query string
+    :param query query string, e.g. "col1 > 1 and col2 < 10"
+    """
+    try:
+        tree = ast.parse(query, mode='eval')
+    except SyntaxError:
+        return None
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+
+
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+def _conjuncts(node):
+    """
+    Split an expression into the list of its AND-ed terms
+    """
+    if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+        return [c for v in node.values for c in _conjuncts(v)]
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitAnd):
+        return _conjuncts(node.left) + _conjuncts(node.right)
+    return [node]
+
+
+def _disjuncts(node):
+    """
+    Split an expression into the list of its OR-ed terms
+    """
+    if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.Or):
+        return [c for v in node.values for c in _disjuncts(v)]
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+        return _disjuncts(node.left) + _disjuncts(node.right)
+    return [node]
+
+
+def _comparison_to_filter(node):
+    """
+    Convert a simple comparison (column op literal) into a
+    (column, op, value) tuple, or None if it is not pushable
+    """
+    if not isinstance(node, ast.Compare) or len(node.ops) != 1:
+        return None
+    op = _COMPARE_OPS.get(type(node.ops[0]))
+    if op is None:
+        return None
+    left, right = node.left, node.comparators[0]
+    if isinstance(left, ast.Name) and not isinstance(right, ast.Name):
+        value = _literal(right)
+        column = left.id
+    elif isinstance(right, ast.Name) and not isinstance(left, ast.Name) and op in _SWAPPED_OPS:
+        value = _literal(left)
+        column = right.id
+        op = _SWAPPED_OPS[op]
+    else:
+        return None
+    if value is None:
+        return None
+    if op in ('in', 'not in'):
+        if not isinstance(value, (list, tuple, set)):
+            return None
+        value = list(value)
+    return (column, op, value)
+
+
+def query_to_filters(query):
+    """
+    Translate a query string into pyarrow/dask DNF filters
+    (a list of lists of (column, op, value) tuples).
+    Terms that can't be translated are skipped inside a conjunction,
+    so the result is always a superset of the rows selected by the query.
+    Returns None if nothing can be pushed down.
+    :param query query string, e.g. "col1 > 1 and col2 < 10"
+    """
+    try:
+        tree = ast.parse(query, mode='eval').body
+    except SyntaxError:
+        return None
+
+    disjuncts = _disjuncts(tree)
+    dnf = []
+    for disjunct in disjuncts:
+        terms = [_comparison_to_filter(c) for c in _conjuncts(disjunct)]
+        terms = [t for t in terms if t is not None]
+        if len(terms) == 0:
+            # one branch of the OR is not pushable, so the whole OR is not
+            return None
+        dnf.append(terms)
+
+    return dnf
+
+
+def _dnf(filters):
+    """
+    Return filters as a DNF list of lists, a flat list of tuples is a single conjunction
+    """
+    filters = list(filters or [])
+    if len(filters) > 0 and isinstance(filters[0], tuple):
+        return [filters]
+    return [list(conjunction) for conjunction in filters]
+
+
+def and_filters(left, right):
+    """
+    Return the AND of two filters (DNF or flat lists of (column, op, value) tuples) as DNF filters
+    """
+    left, right = _dnf(left), _dnf(right)
+    if len(left) == 0 or len(right) == 0:
+        return left or right
+    return [a + b for a in left for b in right]
+
+
+def coerce_filters(filters, dtypes):
+    """
+    Convert the filter values to the type of the column they are compared with
+    (e.g. string dates against datetime columns)
+    :param filters DNF filters
+    :param dtypes dictionary column -> dtype
+    """
+    import pandas as pd
+
+    out = []
+    for conjunction in filters:
+        terms = []
+        for column, op, value in conjunction:
+            if str(dtypes.get(column, '')).startswith('datetime64'):
+                if isinstance(value, list):
+                    value = [pd.Timestamp(v) for v in value]
+                else:
+                    value = pd.Timestamp(value)
+            terms.append((column, op, value))
+        out.append(terms)
+    return out
+
+
+def prune_pieces(path, filters):
+    """
+    Count the pieces (row groups) of a parquet dataset that can be skipped with the provided filters,
+    using only the hive partition values of the paths and the min/max statistics of the footers.
+    Returns a dictionary with the number of files and row groups, in total and pruned.
+    :param path path of the parquet dataset
+    :param filters DNF filters (see query_to_filters and coerce_filters)
+    """
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    dataset = ds.dataset(path, format='parquet', partitioning='hive', exclude_invalid_files=True)
+    expression = pq.filters_to_expression(filters)
+
+    files = list(dataset.get_fragments())
+    kept_files = list(dataset.get_fragments(filter=expression))
+    row_groups = sum(f.metadata.num_row_groups for f in files)
+    kept_row_groups = sum(len(f.split_by_row_group(filter=expression, schema=dataset.schema)) for f in kept_files)
+
+    return {
+        'files': len(files), 'pruned_files': len(files) - len(kept_files),
+        'row_groups': row_groups, 'pruned_row_groups': row_groups - kept_row_groups,
+    }
+
+
+class PlanNode(object):
+    def __init__(self, op, **kwargs):
+        self.op = op
+        self.kwargs = kwargs
+
+    def copy(self, **kwargs):
+        new_kwargs = dict(self.kwargs)
+        new_kwargs.update(kwargs)
+        return PlanNode(self.op, **new_kwargs)
+
+    def columns(self):
+        """
+        Return the set of columns read or modified by this node,
+        or None if the node may touch every column
+        """
+        kw = self.kwargs
+        if self.op == 'query':
+            return query_columns(kw['query'])
+        if self.op == 'cast_columns_types':
+            return set(kw['dtypes'])
+        if self.op == 'rename_columns':
+            return set(kw['columns'])
+        if self.op in ('delete_columns', 'strip', 'replace', 'remove_diacritics'):
+            return set(kw['columns'])
+        if self.op in ('set_content_case', 'clean_strings'):
+            return set(kw['columns']) if len(kw['columns']) > 0 else None
+        return None
+
+    def __repr__(self):
+        kw = self.kwargs
+        if self.op == 'scan':
+            text = "Scan {} '{}'".format(kw['format'], kw['path'])
+            if kw.get('columns') is not None:
+                text += ' columns={}'.format(kw['columns'])
+            if kw.get('filters'):
+                text += ' filters={}'.format(kw['filters'])
+            if kw.get('read_kwargs'):
+                text += ' options={}'.format(kw['read_kwargs'])
+            return text
+        if self.op == 'frame':
+            return 'InMemoryFrame'
+        args = ', '.join('{}={!r}'.format(k, v) for k, v in kw.items())
+        return '{}({})'.format(self.op, args)
+
+
+class LogicalPlan(object):
+    """
+    Ordered list of the operations recorded by a BaseDfBench instance in lazy mode.
+    The first node is always the source of the data: a parquet scan
+    (where projection and predicate pushdown are possible) or an in-memory frame.
+    """
+
+    def __init__(self, source):
+        self.nodes = [source]
+
+    def add(self, op, **kwargs):
+        self.nodes.append(PlanNode(op, **kwargs))
+        return self
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __repr__(self):
+        return self.explain(optimized=False)
+
+    def explain(self, optimized=True, dtypes=None):
+        """
+        Return a string representation of the plan
+        :param optimized if True shows the optimized plan (default True)
+        :param dtypes dictionary column -> dtype of the source, used by the optimizer
+        """
+        plan = self.optimize(dtypes) if optimized else self
+        title = '== Optimized logical plan ==' if optimized else '== Logical plan =='
+        lines = [title]
+        for depth, node in enumerate(reversed(plan.nodes)):
+            lines.append('  ' * depth + ('+- ' if depth > 0 else '') + repr(node))
+        return '\n'.join(lines)
+
+    def optimize(self, dtypes=None):
+        """
+        Return an optimized copy of the plan:
+         - consecutive casts of different columns are fused and casts on dropped columns are removed
+         - queries before the last operation are removed (they don't modify the dataframe)
+         - only the columns that are needed are read (projection pushdown)
+         - simple predicates of the final query become parquet row-group filters (predicate pushdown),
+           applied only to the read that computes the query result
+        :param dtypes dictionary column -> dtype of the source;
+               without it only the cast fusion is applied
+        """
+        plan = LogicalPlan(self.nodes[0].copy())
+        nodes = self._fuse_casts(self.nodes[1:])
+        # as in eager mode a query returns a subset without modifying the dataframe:
+        # only the last one, the result of the plan, has an effect
+        plan.nodes.extend(n for i, n in enumerate(nodes) if n.op != 'query' or i == len(nodes) - 1)
+
+        if plan.nodes[0].op != 'scan' or dtypes is None:
+            return plan
+
+        plan._push_predicates(dtypes)
+        plan._push_projection(list(dtypes))
+
+        return plan
+
+    @staticmethod
+    def _fuse_casts(nodes):
+        out = []
+        for node in nodes:
+            # a chain of casts of the same column (e.g. str -> float -> int) is not a single cast:
+            # only casts of different columns are merged
+            if node.op == 'cast_columns_types' and len(out) > 0 and out[-1].op == 'cast_columns_types' \
+                    and not set(node.kwargs['dtypes']) & set(out[-1].kwargs['dtypes']):
+                dtypes = dict(out[-1].kwargs['dtypes'])
+                dtypes.update(node.kwargs['dtypes'])
+                out[-1] = out[-1].copy(dtypes=dtypes)
+            else:
+                out.append(node.copy())
+
+        # a cast is useless if the column gets dropped before anything else reads it
+        for i, node in enumerate(out):
+            if node.op != 'cast_columns_types':
+                continue
+            dtypes = dict(node.kwargs['dtypes'])
+            for column in list(dtypes):
+                for later in out[i + 1:]:
+                    touched = later.columns()
+                    if later.op == 'delete_columns' and column in touched:
+                        del dtypes[column]
+                        break
+                    if touched is None or column in touched:
+                        break
+            out[i] = node.copy(dtypes=dtypes)
+
+        return [n for n in out if not (n.op == 'cast_columns_types' and len(n.kwargs['dtypes']) == 0)]
+
+    def _push_predicates(self, dtypes):
+        scan = self.nodes[0]
+        filters = list(scan.kwargs.get('filters') or [])
+        modified = set()
+        for node in self.nodes[1:]:
+            if node.op == 'query':
+                referenced = node.columns()
+                if referenced is not None and len(referenced & modified) == 0 and referenced <= set(dtypes):
+                    pushed = query_to_filters(node.kwargs['query'])
+                    if pushed is not None:
+                        filters = and_filters(filters, coerce_filters(pushed, dtypes))
+                continue
+            touched = node.columns()
+            if touched is None:
+                break
+            modified |= touched
+        if filters:
+            self.nodes[0] = scan.copy(filters=filters)
+
+    def _push_projection(self, schema):
+        # simulate the plan forward, following renames back to the source columns
+        alias = {c: c for c in schema}
+        needed = set()
+        for node in self.nodes[1:]:
+            touched = node.columns()
+            if touched is None:
+                return
+            if node.op == 'delete_columns':
+                for column in touched:
+                    alias.pop(column, None)
+                continue
+            needed |= {alias[c] for c in touched if c in alias}
+            if node.op == 'rename_columns':
+                for old, new in node.kwargs['columns'].items():
+                    if old in alias:
+                        alias[new] = alias.pop(old)
+        needed |= set(alias.values())
+
+        columns = [c for c in schema if c in needed]
+        if len(columns) == len(schema):
+            return
+        self.nodes[0] = self.nodes[0].copy(columns=columns)
+
+        # deletes of columns that are not read anymore can be skipped
+        nodes = [self.nodes[0]]
+        live = set(columns)
+        for node in self.nodes[1:]:
+            if node.op == 'delete_columns':
+                drop = [c for c in node.kwargs['columns'] if c in live]
+                live -= set(drop)
+                if len(drop) == 0:
+                    continue
+                node = node.copy(columns=drop)
+            elif node.op == 'rename_columns':
+                for old, new in node.kwargs['columns'].items():
+                    if old in live:
+                        live.discard(old)
+                        live.add(new)
+            nodes.append(node)
+        self.nodes = nodes
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+from df_benchmark.algorithms.sketches import to_host, DistinctSketch, TopKSketch, QuantileSketch
+
+
+def _kind(dtype):
+    """
+    Return the kind of statistics that can be computed on a dtype:
+    numeric, datetime or other
+    """
+    name = str(dtype)
+    if name.startswith('datetime64'):
+        return 'datetime'
+    if name in ('bool', 'boolean') or name == 'category':
+        return 'other'
+    try:
+        if np.issubdtype(np.dtype(name.lower()), np.number):
+            return 'numeric'
+    except TypeError:
+        pass
+    return 'other'
+
+
+class ColumnProfile(object):
+    """
+    Mergeable statistics of a single column
+    """
+
+    def __init__(self, kind, top_capacity=100, distinct_k=1024, epsilon=0.01, seed=0):
+        self.kind = kind
+        self.rows = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.distinct = DistinctSketch(distinct_k)
+        self.top = TopKSketch(top_capacity)
+        # numeric columns: quantiles, mean and std come from the sketch
+        self.sketch = QuantileSketch(epsilon, seed)
+
+    def update(self, series):
+        self.rows = len(series)
+        self.count = int(series.count())
+        self.distinct = self.distinct.update(series)
+        self.top = self.top.update(series)
+        if self.count == 0 or self.kind == 'other':
+            return self
+        self.min = to_host(series.min())
+        self.max = to_host(series.max())
+        if self.kind == 'numeric':
+            self.sketch = self.sketch.update(series)
+        return self
+
+    def merge(self, other):
+        out = ColumnProfile(self.kind, self.top.capacity, self.distinct.k, self.sketch.epsilon)
+        out.rows = self.rows + other.rows
+        out.count = self.count + other.count
+        mins = [v for v in (self.min, other.min) if v is not None and not pd.isna(v)]
+        maxs = [v for v in (self.max, other.max) if v is not None and not pd.isna(v)]
+        out.min = min(mins) if mins else None
+        out.max = max(maxs) if maxs else None
+        out.distinct = self.distinct.merge(other.distinct)
+        out.top = self.top.merge(other.top)
+        out.sketch = self.sketch.merge(other.sketch)
+        return out
+
+    def result(self, quantiles, top_k):
+        numeric = self.kind == 'numeric'
+        out = {
+            'count': self.count,
+            'null_count': self.rows - self.count,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.sketch.mean if numeric and self.count > 0 else np.nan,
+            'std': self.sketch.std() if numeric else np.nan,
+            'approx_distinct': self.distinct.estimate(),
+            'top_values': self.top.top(top_k),
+        }
+        for q in quantiles:
+            out['{:g}%'.format(q * 100)] = self.sketch.quantile(q) if numeric else np.nan
+        return out
+
+
+def profile_partition(df, top_capacity=100, distinct_k=1024, epsilon=0.01, seed=0):
+    """
+    Compute the mergeable statistics of every column of a partition
+    :param df pandas or cudf dataframe
+    :param top_capacity number of frequent values kept for every column
+    :param distinct_k size of the distinct count sketch
+    :param epsilon rank error of the quantile sketches
+    :param seed seed of the quantile sketches, different for every partition (e.g. its index)
+    """
+    return {column: ColumnProfile(_kind(df[column].dtype), top_capacity, distinct_k, epsilon, seed).update(df[column])
+            for column in df.columns}
+
+
+def merge_profiles(*profiles):
+    """
+    Merge the statistics of several partitions
+    """
+    out = profiles[0]
+    for profile in profiles[1:]:
+        out = {column: out[column].merge(profile[column]) for column in out}
+    return out
+
+
+def tree_reduce(parts, combine, split_every=8):
+    """
+    Reduce a list of delayed objects with a tree of combine tasks
+    :param parts list of delayed objects
+    :param combine delayed function that takes up to split_every objects
+    :param split_every fan-in of every combine task
+    """
+    while len(parts) > 1:
+        parts = [combine(*parts[i:i + split_every]) for i in range(0, len(parts), split_every)]
+    return parts[0]
+
+
+def finalize_profile(profile, quantiles, top_k):
+    """
+    Build the profile dataframe (one row for each column) from the merged statistics
+    """
+    return pd.DataFrame.from_dict({column: p.result(quantiles, top_k) for column, p in profile.items()}, orient='index')
@@ -0,0 +1,221 @@
+import numpy as np
+import pandas as pd
+
+
+def to_host(obj):
+    """
+    Move a (small) cudf object to host memory, pandas/numpy objects are returned as they are
+    :param obj cudf or pandas object
+    """
+    if hasattr(obj, 'to_pandas'):
+        return obj.to_pandas()
+    return obj
+
+
+def hash_values(series):
+    """
+    Return a numpy uint64 array with a 64 bit hash for every value of the series
+    (or row of the dataframe). Works on pandas and cudf objects.
+    :param series series or dataframe to hash
+    """
+    if hasattr(series, 'hash_values'):
+        # cudf: the default murmur3 hashes have only 32 bits, the sketches need 64
+        return np.asarray(series.hash_values(method='xxhash64').values_host, dtype=np.uint64)
+    return pd.util.hash_pandas_object(series, index=False).to_numpy(dtype=np.uint64)
+
+
+class DistinctSketch(object):
+    """
+    K Minimum Values sketch to estimate the number of distinct values of a column.
+    It keeps the k smallest 64 bit hashes seen so far; two sketches can be merged
+    keeping the k smallest hashes of their union.
+    The relative error is about 1/sqrt(k).
+    """
+
+    def __init__(self, k=1024, hashes=None):
+        self.k = k
+        self.hashes = np.empty(0, dtype=np.uint64) if hashes is None else hashes
+
+    def update(self, series):
+        """
+        Add the non null values of a series to the sketch
+        :param series pandas or cudf series
+        """
+        series = series.dropna()
+        if len(series) > 0:
+            self.hashes = self._smallest(np.concatenate([self.hashes, hash_values(series)]))
+        return self
+
+    def merge(self, other):
+        return DistinctSketch(self.k, self._smallest(np.concatenate([self.hashes, other.hashes])))
+
+    def _smallest(self, hashes):
+        hashes = np.unique(hashes)
+        return hashes[:self.k]
+
+    def estimate(self):
+        if len(self.hashes) < self.k:
+            return len(self.hashes)
+        kth = float(self.hashes[self.k - 1]) / 2.0 ** 64
+        return int(round((self.k - 1) / kth))
+
+
+class TopKSketch(object):
+    """
+    Mergeable summary of the most frequent values of a column.
+    Every partition keeps its `capacity` most frequent values; the counts
+    are summed during the merge and the summary is truncated again,
+    so the reported counts are lower bounds of the real ones.
+    """
+
+    def __init__(self, capacity=100, counts=None):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype='int64') if counts is None else counts
+
+    def update(self, series):
+        """
+        Add the values of a series to the summary
+        :param series pandas or cudf series
+        """
+        counts = to_host(series.value_counts())
+        counts = counts.sort_values(ascending=False).head(self.capacity)
+        return self.merge(TopKSketch(self.capacity, counts))
+
+    def merge(self, other):
+        counts = self.counts.add(other.counts, fill_value=0).astype('int64')
+        counts = counts.sort_values(ascending=False).head(self.capacity)
+        return TopKSketch(self.capacity, counts)
+
+    def top(self, k):
+        return list(self.counts.head(k).items())
+
+
+class QuantileSketch(object):
+    """
+    KLL quantile sketch (Karnin, Lang, Liberty) of a numeric column.
+    Values are kept in a hierarchy of compactors: when a level is full it is sorted
+    and every other value is promoted to the next level, where it weights twice.
+    Sketches built on different partitions can be merged level by level,
+    so they can be computed in parallel and combined with a tree reduction.
+    The sketch also keeps exact count, min, max, mean and variance of the values.
+    :param epsilon target normalized rank error (default 0.01, i.e. 1%)
+    :param seed seed of the coin flips of the compactions: sketches built on different
+           partitions must use different seeds (e.g. the partition index), or the flips
+           are correlated and the error bound does not hold
+    """
+
+    def __init__(self, epsilon=0.01, seed=0):
+        self.epsilon = epsilon
+        # with k = 200 the rank error of KLL is ~1.65%
+        self.k = max(8, int(np.ceil(3.3 / epsilon)))
+        self.levels = [np.empty(0)]
+        self.n = 0
+        self.min = np.nan
+        self.max = np.nan
+        self.mean = 0.0
+        self.m2 = 0.0
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            values = np.sort(self.levels[level])
+            # an odd value stays at this level
+            keep = values[-1:] if len(values) % 2 else values[:0]
+            values = values[:len(values) - len(keep)]
+            promoted = values[self._rng.integers(2)::2]
+            self.levels[level] = keep
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            # capacities depend on the number of levels: restart from the bottom
+            level = 0
+
+    def _update_moments(self, n, min, max, mean, m2):
+        if n == 0:
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.n * n / total
+        self.min = min if self.n == 0 else np.minimum(self.min, min)
+        self.max = max if self.n == 0 else np.maximum(self.max, max)
+        self.n = total
+
+    def update(self, series):
+        """
+        Add the non null values of a numeric series (pandas, cudf or numpy) to the sketch
+        :param series values to add
+        """
+        values = to_host(series)
+        if hasattr(values, 'to_numpy'):
+            values = values.to_numpy(dtype='float64', na_value=np.nan)
+        values = np.asarray(values, dtype='float64')
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self._update_moments(len(values), values.min(), values.max(), values.mean(), values.var() * len(values))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        out = QuantileSketch(self.epsilon, seed=self._rng.integers(2 ** 32))
+        out.n, out.min, out.max, out.mean, out.m2 = self.n, self.min, self.max, self.mean, self.m2
+        out._update_moments(other.n, other.min, other.max, other.mean, other.m2)
+        depth = max(len(self.levels), len(other.levels))
+        out.levels = [np.concatenate([a[h] for a in (self.levels, other.levels) if h < len(a)]) for h in range(depth)]
+        out._compress()
+        return out
+
+    def count(self):
+        return self.n
+
+    def std(self):
+        return np.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else np.nan
+
+    def quantile(self, q):
+        """
+        Return the approximated value of the provided quantile(s)
+        :param q quantile or list of quantiles in [0, 1]
+        """
+        q = np.asarray(q, dtype='float64')
+        if self.n == 0:
+            return np.full(q.shape, np.nan) if q.ndim else np.nan
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(v), 2.0 ** h) for h, v in enumerate(self.levels)])
+        order = np.argsort(values, kind='mergesort')
+        values, cumulative = values[order], np.cumsum(weights[order])
+        idx = np.searchsorted(cumulative, q * cumulative[-1], side='left')
+        out = values[np.clip(idx, 0, len(values) - 1)]
+        # the extremes are known exactly
+        out = np.where(q <= 0, self.min, np.where(q >= 1, self.max, out))
+        return out if q.ndim else float(out)
+
+
+def build_quantile_sketches(df, columns, epsilon=0.01, seed=0):
+    """
+    Build a quantile sketch for every provided column of a partition
+    :param df pandas or cudf dataframe
+    :param columns numeric columns
+    :param epsilon target rank error of the sketches
+    :param seed seed of the sketches, different for every partition (e.g. its index)
+    """
+    return {column: QuantileSketch(epsilon, seed).update(df[column]) for column in columns}
+
+
+def merge_quantile_sketches(*sketches):
+    """
+    Merge the dictionaries of sketches built on different partitions
+    """
+    out = sketches[0]
+    for other in sketches[1:]:
+        out = {column: out[column].merge(other[column]) for column in out}
+    return out
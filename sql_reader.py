@@ -0,0 +1,281 @@
+import datetime
+import queue
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+# pools of the process, shared by the tasks that read from the same database
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def is_connection_spec(conn):
+    """
+    Return True if conn can be used to open new connections (in other threads or processes):
+    a SQLAlchemy URL, the path of a SQLite database or a function without arguments
+    that returns a DB-API connection
+    """
+    # a sqlite3 connection is callable too
+    return isinstance(conn, str) or (callable(conn) and not hasattr(conn, 'cursor'))
+
+
+def open_connection(spec):
+    """
+    Open a connection from a connection spec (see is_connection_spec)
+    """
+    if not isinstance(spec, str):
+        return spec()
+    if '://' not in spec:
+        import sqlite3
+        return sqlite3.connect(spec, check_same_thread=False)
+    import sqlalchemy
+    from sqlalchemy.pool import NullPool
+    return sqlalchemy.create_engine(spec, poolclass=NullPool).connect()
+
+
+class ConnectionPool(object):
+    """
+    Bounded pool of connections: at most size connections are open, a thread that needs
+    a connection when all of them are in use waits for one to be released
+    :param spec connection spec (see is_connection_spec)
+    :param size maximum number of connections
+    """
+
+    def __init__(self, spec, size=4):
+        self.spec = spec
+        self.size = size
+        self.opened = 0
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        with self.lock:
+            if self.idle.empty() and self.opened < self.size:
+                self.opened += 1
+                self.idle.put(None)
+        conn = self.idle.get()
+        try:
+            if conn is None:
+                conn = open_connection(self.spec)
+            yield conn
+        finally:
+            self.idle.put(conn)
+
+    def close(self):
+        while not self.idle.empty():
+            conn = self.idle.get()
+            if conn is not None:
+                conn.close()
+        self.opened = 0
+
+
+def connection_pool(spec, size=4):
+    """
+    Return the pool of the process for a connection spec, creating it the first time
+    """
+    from dask.base import tokenize
+
+    key = (tokenize(spec), size)
+    with _POOLS_LOCK:
+        if key not in _POOLS:
+            _POOLS[key] = ConnectionPool(spec, size)
+        return _POOLS[key]
+
+
+def _literal(value):
+    """
+    Return a SQL literal of a bound of a range; only numbers and timestamps are accepted
+    (the bounds are never user text)
+    """
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        value = pd.Timestamp(value)
+        # dates stored as text compare correctly only with the same format
+        return "'{}'".format(value.date() if value == value.normalize() else value.isoformat(sep=' '))
+    if isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool):
+        return repr(value.item() if hasattr(value, 'item') else value)
+    raise TypeError('range bounds must be numbers or timestamps, not {}'.format(type(value).__name__))
+
+
+def key_bounds(conn, query, column):
+    """
+    Return the minimum and maximum of a column of the result of a query
+    (timestamps for dates stored as text)
+    """
+    sql = 'SELECT MIN({0}), MAX({0}) FROM ({1}) q'.format(column, query)
+    low, high = pd.read_sql(sql, conn).iloc[0]
+    if isinstance(low, str):
+        low, high = pd.Timestamp(low), pd.Timestamp(high)
+    return low, high
+
+
+def key_ranges(low, high, npartitions):
+    """
+    Split [low, high] in npartitions ranges of the same width.
+    Returns a list of (low, high) pairs: every range includes low and excludes high.
+    Integer keys are split on integer bounds, DATE keys (datetime.date, e.g. from Postgres)
+    on whole days.
+    """
+    if low is None or pd.isna(low):
+        return [(None, None)]
+    if isinstance(low, (datetime.date, np.datetime64)):
+        bounds = pd.date_range(pd.Timestamp(low), pd.Timestamp(high), periods=npartitions + 1)
+        if isinstance(low, datetime.date) and not isinstance(low, datetime.datetime):
+            bounds = bounds.normalize().unique()
+        bounds = list(bounds)
+    elif isinstance(low, (int, np.integer)):
+        bounds = list(np.unique(np.linspace(int(low), int(high), npartitions + 1).round().astype('int64')))
+    else:
+        bounds = list(np.unique(np.linspace(float(low), float(high), npartitions + 1)))
+    if len(bounds) == 1:
+        bounds = bounds * 2
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def range_query(query, column, key_range, first, last):
+    """
+    Return the query that reads a range of the key. The first range has no lower bound
+    and reads also the null keys, the last one has no upper bound, so every row is read
+    exactly once also if the bounds are not exact.
+    """
+    low, high = key_range
+    conditions = []
+    if not first:
+        conditions.append('{} >= {}'.format(column, _literal(low)))
+    if not last:
+        conditions.append('{} < {}'.format(column, _literal(high)))
+    if low is None or len(conditions) == 0:
+        return query
+    condition = ' AND '.join(conditions)
+    if first:
+        condition = '({} IS NULL OR {})'.format(column, condition)
+    return 'SELECT * FROM ({}) q WHERE {}'.format(query, condition)
+
+
+def sample_dtypes(conn, query, rows=1000, **kwargs):
+    """
+    Return the dtypes of the result of a query, from its first rows: integers and booleans
+    are nullable, so a range with nulls has the same dtypes as the others. The other dtypes
+    are kept as read (a float column whose first values are integral is not narrowed to an integer)
+    """
+    chunks = pd.read_sql(query, conn, chunksize=rows, **kwargs)
+    sample = next(iter(chunks), None)
+    if sample is None:
+        return {}
+    return {column: _nullable(dtype) for column, dtype in sample.dtypes.items()}
+
+
+def _nullable(dtype):
+    """
+    Return the nullable pandas dtype of an integer or boolean dtype, the name of the dtype otherwise
+    """
+    if dtype.kind == 'i':
+        return 'Int' + dtype.name[3:]
+    if dtype.kind == 'u':
+        return 'UInt' + dtype.name[4:]
+    if dtype.kind == 'b':
+        return 'boolean'
+    return str(dtype)
+
+
+def read_sql_range(key_range, query, conn, column=None, first=True, last=True, dtypes=None, chunk_rows=50000,
+                   pool_size=4, semaphore=None, library='pandas', **kwargs):
+    """
+    Read a range of the key of a query with a connection of the pool of the process,
+    fetching chunk_rows rows at a time; every chunk is converted to the pinned dtypes.
+    :param key_range (low, high) bounds of the key, (None, None) for the whole query
+    :param query SQL query
+    :param conn connection spec (see is_connection_spec) or an open connection
+    :param column key column
+    :param first True for the first range (no lower bound, reads also the null keys)
+    :param last True for the last range (no upper bound)
+    :param dtypes dictionary column -> dtype of the result
+    :param chunk_rows rows fetched at a time
+    :param pool_size maximum number of connections of the process
+    :param semaphore distributed.Semaphore that bounds the connections of the whole cluster
+    :param library pandas or cudf
+    :param kwargs extra arguments of pandas.read_sql (e.g. parse_dates)
+    """
+    sql = range_query(query, column, key_range, first, last)
+
+    def fetch(connection):
+        chunks = []
+        for chunk in pd.read_sql(sql, connection, chunksize=chunk_rows, **kwargs):
+            chunks.append(chunk.astype(dtypes) if dtypes else chunk)
+        if len(chunks) == 0:
+            return empty_frame(dtypes)
+        return pd.concat(chunks, ignore_index=True)
+
+    if not is_connection_spec(conn):
+        out = fetch(conn)
+    elif semaphore is not None:
+        with semaphore:
+            with connection_pool(conn, pool_size).connection() as connection:
+                out = fetch(connection)
+    else:
+        with connection_pool(conn, pool_size).connection() as connection:
+            out = fetch(connection)
+
+    if library == 'cudf':
+        import cudf
+        return cudf.from_pandas(out)
+    return out
+
+
+def empty_frame(dtypes, library='pandas'):
+    """
+    Return an empty pandas or cudf dataframe with the provided dtypes
+    """
+    out = pd.DataFrame({c: pd.Series(dtype=t) for c, t in (dtypes or {}).items()})
+    if library == 'cudf':
+        import cudf
+        return cudf.from_pandas(out)
+    return out
+
+
+def plan_sql(query, conn, column=None, npartitions=8, bounds=None, pool_size=4, **kwargs):
+    """
+    Return the key ranges and the dtypes of a partitioned read of a query
+    :param query SQL query
+    :param conn connection spec or open connection
+    :param column numeric or date key column (default no partitioning)
+    :param npartitions number of ranges
+    :param bounds (min, max) of the key (default computed with a query)
+    :param pool_size maximum number of connections
+    :param kwargs extra arguments of pandas.read_sql
+    """
+    pool = connection_pool(conn, pool_size) if is_connection_spec(conn) else None
+    with (pool.connection() if pool is not None else _opened(conn)) as connection:
+        dtypes = sample_dtypes(connection, query, **kwargs)
+        if column is None:
+            return [(None, None)], dtypes
+        low, high = bounds if bounds is not None else key_bounds(connection, query, column)
+    return key_ranges(low, high, npartitions), dtypes
+
+
+@contextmanager
+def _opened(conn):
+    yield conn
+
+
+def read_sql_parallel(query, conn, column=None, npartitions=8, bounds=None, pool_size=4, chunk_rows=50000, **kwargs):
+    """
+    Read a query in ranges of a key column with a pool of pool_size threads and connections;
+    with an open connection (that can't be shared) the ranges are read one after the other.
+    Returns a list of pandas dataframes, one for every range.
+    See plan_sql and read_sql_range for the arguments.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    ranges, dtypes = plan_sql(query, conn, column, npartitions, bounds, pool_size, **kwargs)
+    tasks = [dict(key_range=r, first=i == 0, last=i == len(ranges) - 1) for i, r in enumerate(ranges)]
+
+    def read(task):
+        return read_sql_range(query=query, conn=conn, column=column, dtypes=dtypes, chunk_rows=chunk_rows,
+                              pool_size=pool_size, **task, **kwargs)
+
+    if not is_connection_spec(conn):
+        return [read(task) for task in tasks]
+    with ThreadPoolExecutor(pool_size) as pool:
+        return list(pool.map(read, tasks))
@@ -0,0 +1,78 @@
+import numpy as np
+from df_benchmark.algorithms.sketches import hash_values
+
+# columns of the tables of the star schema (see the notebook): the index of every table is user_code
+UTILITY_COLUMNS = ['customer_code', 'city', 'address']
+CUSTOMER_COLUMNS = ['nominative', 'age', 'sex']
+UTILITY_KEY = ['customer_code']
+INVOICE_KEY = ['bill_id', 'emission_date']
+
+
+def _table(df, columns):
+    """
+    Return the distinct rows of the provided columns, keeping the index.
+    The index is a column for drop_duplicates, so equal rows of different keys are kept.
+    """
+    name = df.index.name
+    return df[columns].reset_index().drop_duplicates().set_index(name)
+
+
+def _duplicated_keys(df, key):
+    """
+    Return the number of rows whose key (index + key columns) appears more than once
+    """
+    keys = df[key].reset_index() if key else df.index.to_frame()
+    return int(keys.duplicated().sum())
+
+
+def split_partition(df, utility_columns, customer_columns, invoice_columns, utility_key, invoice_key):
+    """
+    Split a partition of the invoices, indexed by user_code, into the utility, customer
+    and invoice tables without duplicated rows.
+    All the rows of a user_code must be in the same partition, so the primary keys of the
+    utility (user_code + utility_key) and customer (user_code) tables are checked exactly;
+    for the invoices the 64 bit hashes of the keys are returned, to be checked across partitions
+    (with 32 bit hashes ~10M clean invoices would already have thousands of collisions).
+    Returns (utility, customer, invoice, stats).
+    :param df pandas or cudf dataframe indexed by user_code
+    :param utility_columns columns of the utility table
+    :param customer_columns columns of the customer table
+    :param invoice_columns columns of the invoice table
+    :param utility_key columns that, with user_code, identify a utility
+    :param invoice_key columns that identify an invoice
+    """
+    utility = _table(df, utility_columns)
+    customer = _table(df, customer_columns)
+    invoice = _table(df, invoice_columns)
+    hashes = np.sort(hash_values(invoice[invoice_key]))
+    stats = {
+        'rows': {'utility': len(utility), 'customer': len(customer), 'invoice': len(invoice)},
+        'duplicated_keys': {
+            'utility': _duplicated_keys(utility, utility_key),
+            'customer': _duplicated_keys(customer, []),
+            'invoice': _repeated(hashes),
+        },
+        'invoice_hashes': hashes,
+    }
+    return utility, customer, invoice, stats
+
+
+def _repeated(hashes):
+    """
+    Return the number of values of a sorted array equal to the previous one
+    """
+    return int((hashes[1:] == hashes[:-1]).sum())
+
+
+def merge_split_stats(*stats):
+    """
+    Merge the stats of split_partition; the invoice keys are checked on the union of the hashes
+    """
+    hashes = np.sort(np.concatenate([s['invoice_hashes'] for s in stats]))
+    out = {
+        'rows': {t: sum(s['rows'][t] for s in stats) for t in stats[0]['rows']},
+        'duplicated_keys': {t: sum(s['duplicated_keys'][t] for s in stats) for t in ('utility', 'customer')},
+        'invoice_hashes': hashes,
+    }
+    out['duplicated_keys']['invoice'] = _repeated(hashes)
+    return out
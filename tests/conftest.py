@@ -0,0 +1,41 @@
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the modules import each other as df_benchmark.algorithms.*: the directory of the
+# checkout must not be on sys.path, or pandas.py shadows pandas
+sys.path[:] = [p for p in sys.path if os.path.abspath(p or os.curdir) != ROOT]
+if getattr(sys.modules.get('pandas'), '__file__', None) == os.path.join(ROOT, 'pandas.py'):
+    del sys.modules['pandas']
+
+if os.path.basename(ROOT) == 'algorithms' and os.path.basename(os.path.dirname(ROOT)) == 'df_benchmark':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(ROOT)))
+else:
+    # a checkout with another name: register it as the df_benchmark.algorithms package
+    for name, path in (('df_benchmark', os.path.dirname(ROOT)), ('df_benchmark.algorithms', ROOT)):
+        if name not in sys.modules:
+            module = types.ModuleType(name)
+            module.__path__ = [path]
+            sys.modules[name] = module
+
+
+def _backends():
+    backends = ['pandas']
+    try:
+        import cudf  # noqa: F401
+        backends.append('cudf')
+    except ImportError:
+        pass
+    return backends
+
+
+@pytest.fixture(params=_backends())
+def lib(request):
+    """
+    The dataframe library of the backend under test: pandas, and cudf when it is installed
+    """
+    return pytest.importorskip(request.param)
@@ -0,0 +1,31 @@
+import numpy as np
+
+from df_benchmark.algorithms.compaction import compaction_partition, merge_compaction
+
+
+def test_categorical_choice_uses_the_distinct_count(lib):
+    rows = 400000
+    df = lib.DataFrame({
+        # 20000 distinct values: more than the sketch size, few compared to the rows
+        'city': lib.Series(np.arange(rows) % 20000).astype('str'),
+        'address': lib.Series(np.arange(rows)).astype('str'),
+    })
+    dtypes = {'city': 'object', 'address': 'object'}
+    parts = [compaction_partition(df.iloc[i:i + 100000], dtypes) for i in range(0, rows, 100000)]
+    stats = merge_compaction(*parts)
+    assert stats['city'].suggest(1e-6, 50000, 0.5) == 'category'
+    assert stats['address'].suggest(1e-6, 50000, 0.5) is None
+
+
+def test_numbers_are_downcast_only_within_range_and_tolerance(lib):
+    df = lib.DataFrame({
+        'age': lib.Series(np.arange(18, 100), dtype='int64'),
+        'tv': lib.Series(np.full(82, 18.0)),
+        'amount': lib.Series(np.linspace(0, 1, 82) + 1e6),
+    })
+    dtypes = {c: str(t) for c, t in dict(df.dtypes).items()}
+    stats = merge_compaction(compaction_partition(df.iloc[:40], dtypes), compaction_partition(df.iloc[40:], dtypes))
+    assert stats['age'].suggest(1e-6, 10000, 0.5) == 'int8'
+    assert stats['tv'].suggest(1e-6, 10000, 0.5) == 'float32'
+    # float32 has ~7 significant digits: 1e6 + x loses the decimals
+    assert stats['amount'].suggest(1e-9, 10000, 0.5) is None
@@ -0,0 +1,70 @@
+import os
+
+import pandas as pd
+
+from df_benchmark.algorithms.divisions import write_divisions, remove_divisions, read_divisions, read_part, empty_part
+
+
+def write_dataset(path):
+    import dask.dataframe as dd
+
+    df = pd.DataFrame({
+        'emission_date': pd.date_range('2024-01-01', periods=1000, freq='h'),
+        'amount': range(1000),
+    }).set_index('emission_date')
+    ddf = dd.from_pandas(df, npartitions=4)
+    ddf.to_parquet(path, write_index=True)
+    return ddf
+
+
+def reload(path, info, columns=None, filters=None):
+    """
+    Read the dataset like DaskCudfBench._read_sorted
+    """
+    import dask.dataframe as dd
+
+    files = [os.path.join(path, f) for f in info['files']]
+    meta = empty_part(files[0], info, columns)
+    kwargs = {'filters': filters} if filters else {}
+    return dd.from_map(read_part, files, columns=columns, meta=meta, divisions=info['divisions'],
+                       enforce_metadata=False, **kwargs)
+
+
+def test_divisions_are_restored(tmp_path):
+    path = str(tmp_path / 'dataset')
+    ddf = write_dataset(path)
+    assert write_divisions(path, ddf)
+
+    info = read_divisions(path)
+    assert info['index'] == 'emission_date'
+    assert info['divisions'] == ddf.divisions
+    df = reload(path, info)
+    assert df.known_divisions
+    pd.testing.assert_frame_equal(df.compute(), ddf.compute(), check_freq=False)
+
+
+def test_sidecar_read_with_columns_and_filters(tmp_path):
+    path = str(tmp_path / 'dataset')
+    ddf = write_dataset(path)
+    write_divisions(path, ddf)
+    info = read_divisions(path)
+
+    df = reload(path, info, columns=['amount'], filters=[('amount', '>=', 900)])
+    assert list(df.columns) == ['amount']
+    assert df.divisions == ddf.divisions
+    assert sorted(df.compute()['amount']) == list(range(900, 1000))
+
+
+def test_unnamed_index_and_removed_sidecar(tmp_path):
+    import dask.dataframe as dd
+
+    path = str(tmp_path / 'dataset')
+    ddf = dd.from_pandas(pd.DataFrame({'amount': range(100)}), npartitions=2)
+    ddf.to_parquet(path)
+    assert not write_divisions(path, ddf)
+    assert read_divisions(path) is None
+
+    path = str(tmp_path / 'indexed')
+    write_divisions(path, write_dataset(path))
+    remove_divisions(path)
+    assert read_divisions(path) is None
@@ -0,0 +1,24 @@
+import pandas as pd
+
+from df_benchmark.algorithms.dtype_inference import narrowest_int, infer_column, check_partition, resolve
+
+
+def test_narrowest_int_never_returns_a_type_too_small():
+    assert narrowest_int(-5, 100) == 'int8'
+    assert narrowest_int(0, 2 ** 40) == 'int64'
+    assert narrowest_int(0, 1.84e19) == 'uint64'
+    assert narrowest_int(-1, 1.84e19) is None
+    assert narrowest_int(0, 2 ** 65) is None
+
+
+def test_integer_width_is_checked_on_the_whole_column():
+    df = pd.DataFrame({'offer': [str(i) for i in range(2000)] + ['18400000000000000000']})
+    candidate = infer_column(df['offer'].head(1000))
+    assert candidate.kind == 'integer'
+    assert candidate.ambiguous
+    checks = check_partition(df, {'offer': candidate})
+    assert resolve({'offer': candidate}, checks) == {'offer': 'uint64'}
+
+    df = pd.DataFrame({'offer': [str(i) for i in range(2000)] + ['-1', str(2 ** 70)]})
+    checks = check_partition(df, {'offer': candidate})
+    assert resolve({'offer': candidate}, checks) == {'offer': 'float64'}
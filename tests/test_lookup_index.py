@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from df_benchmark.algorithms.lookup_index import LookupIndex
+
+
+def write_dataset(path):
+    os.makedirs(path)
+    for part in range(2):
+        df = pd.DataFrame({
+            'invoice': np.arange(part * 1000, (part + 1) * 1000, dtype='int64'),
+            'amount': np.full(1000, 1.5),
+        })
+        df.to_parquet(os.path.join(path, 'part.{}.parquet'.format(part)), index=False, row_group_size=100)
+
+
+def test_lookup_returns_the_rows_of_the_keys(tmp_path):
+    path = str(tmp_path / 'dataset')
+    write_dataset(path)
+    index = LookupIndex(path, 'invoice')
+    assert index.update() == 2
+
+    rows = index.lookup([5, 1500, 5000])
+    assert sorted(rows['invoice']) == [5, 1500]
+    assert LookupIndex(path, 'invoice').load()
+
+
+def test_dataset_is_readable_after_set_value(tmp_path):
+    import dask.dataframe as dd
+
+    path = str(tmp_path / 'dataset')
+    write_dataset(path)
+    index = LookupIndex(path, 'invoice')
+    index.update()
+    assert index.set_value([5, 1500], 'amount', 3.0) == 2
+
+    # the index is saved inside the dataset: the readers must not load it as a part
+    df = dd.read_parquet(path).compute()
+    assert list(df.columns) == ['invoice', 'amount']
+    assert len(df) == 2000
+    assert sorted(df.loc[df['amount'] == 3.0, 'invoice']) == [5, 1500]
+    assert len(pd.read_parquet(path)) == 2000
+    assert not index.is_stale()
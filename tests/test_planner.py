@@ -0,0 +1,72 @@
+import pandas as pd
+
+from df_benchmark.algorithms.planner import LogicalPlan, PlanNode, and_filters, query_to_filters
+
+DTYPES = {'bill_id': 'int64', 'amount': 'float64', 'city': 'object', 'note': 'object'}
+
+
+def scan(**read_kwargs):
+    return LogicalPlan(PlanNode('scan', path='sales.parquet', format='parquet', read_kwargs=read_kwargs))
+
+
+def test_cast_chains_are_kept_and_disjoint_casts_fused():
+    plan = scan()
+    plan.add('cast_columns_types', dtypes={'note': 'float64'})
+    plan.add('cast_columns_types', dtypes={'note': 'int64'})
+    plan.add('cast_columns_types', dtypes={'city': 'category'})
+    nodes = plan.optimize().nodes[1:]
+    assert [n.kwargs['dtypes'] for n in nodes] == [{'note': 'float64'}, {'note': 'int64', 'city': 'category'}]
+
+
+def test_casts_of_dropped_columns_are_removed():
+    plan = scan()
+    plan.add('cast_columns_types', dtypes={'note': 'category', 'city': 'category'})
+    plan.add('delete_columns', columns=['note'])
+    nodes = plan.optimize().nodes[1:]
+    assert nodes[0].kwargs['dtypes'] == {'city': 'category'}
+
+
+def test_projection_and_predicates_are_pushed_to_the_scan():
+    plan = scan(engine='pyarrow')
+    plan.add('delete_columns', columns=['note'])
+    plan.add('query', query='amount > 100')
+    plan.add('strip', columns=['city'])
+    plan.add('query', query='bill_id >= 10 and amount < 50.5')
+    optimized = plan.optimize(DTYPES)
+    source = optimized.nodes[0]
+    assert source.kwargs['columns'] == ['bill_id', 'amount', 'city']
+    assert source.kwargs['filters'] == [[('bill_id', '>=', 10), ('amount', '<', 50.5)]]
+    assert source.kwargs['read_kwargs'] == {'engine': 'pyarrow'}
+    # only the final query has an effect
+    assert [n.op for n in optimized.nodes[1:]] == ['strip', 'query']
+
+
+def test_predicates_on_modified_columns_are_not_pushed():
+    plan = scan()
+    plan.add('cast_columns_types', dtypes={'amount': 'int64'})
+    plan.add('query', query='amount > 100')
+    assert not plan.optimize(DTYPES).nodes[0].kwargs.get('filters')
+
+
+def test_and_filters():
+    assert and_filters([('a', '>', 1)], [[('b', '<', 2)], [('c', '==', 3)]]) == \
+        [[('a', '>', 1), ('b', '<', 2)], [('a', '>', 1), ('c', '==', 3)]]
+    assert and_filters(None, [('a', '>', 1)]) == [[('a', '>', 1)]]
+    assert query_to_filters('a > 1 or b.str.len() > 2') is None
+
+
+def test_optimized_scan_reads_the_query_result(tmp_path):
+    import dask.dataframe as dd
+
+    path = str(tmp_path / 'sales.parquet')
+    df = pd.DataFrame({'bill_id': range(1000), 'amount': [i * 0.5 for i in range(1000)],
+                       'city': ['a', 'b'] * 500, 'note': ['x'] * 1000})
+    df.to_parquet(path, row_group_size=100, index=False)
+
+    plan = LogicalPlan(PlanNode('scan', path=path, format='parquet', read_kwargs={}))
+    plan.add('delete_columns', columns=['note'])
+    plan.add('query', query='bill_id >= 900')
+    source = plan.optimize(DTYPES).nodes[0]
+    result = dd.read_parquet(path, columns=source.kwargs['columns'], filters=source.kwargs['filters']).compute()
+    expected = dd.read_parquet(path).compute().drop(columns=['note']).query('bill_id >= 900')
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True))
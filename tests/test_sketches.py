@@ -0,0 +1,49 @@
+import numpy as np
+
+from df_benchmark.algorithms.sketches import DistinctSketch, QuantileSketch, hash_values, build_quantile_sketches, merge_quantile_sketches
+
+
+def test_hash_values_use_64_bits(lib):
+    hashes = hash_values(lib.Series(np.arange(100000)))
+    assert hashes.dtype == np.uint64
+    assert hashes.max() >= 2 ** 32
+
+
+def test_distinct_estimate_matches_nunique(lib):
+    rng = np.random.default_rng(0)
+    series = lib.Series(rng.integers(0, 200000, 1000000)).astype('str')
+    # one sketch per "partition", merged like in profile()
+    parts = [DistinctSketch().update(series.iloc[i:i + 250000]) for i in range(0, len(series), 250000)]
+    sketch = parts[0]
+    for other in parts[1:]:
+        sketch = sketch.merge(other)
+    exact = series.nunique()
+    # the relative error of the sketch is about 1/sqrt(k) = 3%
+    assert abs(sketch.estimate() - exact) / exact < 0.1
+
+
+def test_distinct_estimate_is_exact_below_k(lib):
+    series = lib.Series(['a', 'b', None, 'c', 'a'] * 1000)
+    assert DistinctSketch().update(series).estimate() == series.nunique()
+
+
+def test_merged_quantile_sketches_are_within_the_error_bound(lib):
+    rng = np.random.default_rng(0)
+    values = rng.normal(100, 20, 400000)
+    df = lib.DataFrame({'x': values})
+    parts = [build_quantile_sketches(df.iloc[i * 50000:(i + 1) * 50000], ['x'], 0.01, seed=i) for i in range(8)]
+    sketch = merge_quantile_sketches(*parts)['x']
+
+    assert sketch.count() == len(values)
+    assert sketch.min == values.min() and sketch.max == values.max()
+    assert abs(sketch.mean - values.mean()) < 1e-6
+    q = np.array([0.01, 0.1, 0.5, 0.9, 0.99])
+    ranks = np.searchsorted(np.sort(values), sketch.quantile(q)) / len(values)
+    assert np.abs(ranks - q).max() < 0.02
+
+
+def test_quantile_sketch_seeds_change_the_compactions():
+    values = np.arange(100000, dtype='float64')
+    a = QuantileSketch(0.01, seed=0).update(values)
+    b = QuantileSketch(0.01, seed=1).update(values)
+    assert not all(np.array_equal(x, y) for x, y in zip(a.levels, b.levels))
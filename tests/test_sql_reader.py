@@ -0,0 +1,43 @@
+import datetime
+import sqlite3
+
+import pandas as pd
+
+from df_benchmark.algorithms.sql_reader import key_ranges, read_sql_parallel, sample_dtypes
+
+
+def write_database(path):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE sales (id INTEGER, amount REAL, city TEXT)')
+    conn.executemany('INSERT INTO sales VALUES (?, ?, ?)',
+                     [(i, 10.0 if i < 3000 else 12.5, 'city{}'.format(i % 7)) for i in range(10000)])
+    conn.commit()
+    conn.close()
+
+
+def test_integral_floats_are_not_narrowed(tmp_path):
+    path = str(tmp_path / 'sales.db')
+    write_database(path)
+    conn = sqlite3.connect(path)
+    dtypes = sample_dtypes(conn, 'SELECT * FROM sales')
+    conn.close()
+    assert dtypes['id'] == 'Int64'
+    assert dtypes['amount'] == 'float64'
+
+
+def test_ranges_read_every_row_once(tmp_path):
+    path = str(tmp_path / 'sales.db')
+    write_database(path)
+    parts = read_sql_parallel('SELECT * FROM sales', path, column='id', npartitions=4)
+    assert len(parts) == 4
+    df = pd.concat(parts, ignore_index=True)
+    assert sorted(df['id']) == list(range(10000))
+    assert (df.loc[df['id'] >= 3000, 'amount'] == 12.5).all()
+    assert all(str(part['amount'].dtype) == 'float64' for part in parts)
+
+
+def test_date_keys_are_split_on_days():
+    ranges = key_ranges(datetime.date(2024, 1, 1), datetime.date(2024, 1, 31), 4)
+    assert len(ranges) == 4
+    assert all(low == low.normalize() for low, _ in ranges)
+    assert ranges[-1][1] == pd.Timestamp('2024-01-31')
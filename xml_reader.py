@@ -0,0 +1,303 @@
+import itertools
+import os
+import re
+import xml.etree.ElementTree as ET
+import numpy as np
+import pandas as pd
+
+# bytes read at a time from the file
+_READ_BYTES = 1 << 20
+
+
+def _local(tag):
+    """
+    Return the name of a tag without the namespace
+    """
+    return tag.rsplit('}', 1)[-1]
+
+
+class ColumnBuffers(object):
+    """
+    Typed buffers of a batch of records: the values are converted while the records are read,
+    numeric and boolean columns are stored in numpy arrays with a mask of the missing values
+    (nullable pandas columns), the other columns in lists of strings.
+    :param columns column names
+    :param dtypes dictionary column -> dtype (default strings)
+    :param size rows of a batch
+    """
+
+    def __init__(self, columns, dtypes=None, size=100000):
+        self.columns = list(columns)
+        self.dtypes = {c: np.dtype(t) for c, t in (dtypes or {}).items() if str(t) not in ('str', 'string', 'object')}
+        self.size = size
+        self._allocate()
+
+    def _allocate(self):
+        self.values = {}
+        self.masks = {}
+        for column in self.columns:
+            dtype = self.dtypes.get(column)
+            if dtype is None or dtype.kind == 'M':
+                self.values[column] = [None] * self.size
+            else:
+                self.values[column] = np.zeros(self.size, dtype=dtype)
+                self.masks[column] = np.ones(self.size, dtype=bool)
+        self.rows = 0
+
+    def append(self, record):
+        """
+        Add a record (dictionary column -> text); returns True when the batch is full.
+        Values that can't be converted are missing.
+        """
+        row = self.rows
+        for column, text in record.items():
+            if text is None or column not in self.values:
+                continue
+            dtype = self.dtypes.get(column)
+            if dtype is None or dtype.kind == 'M':
+                self.values[column][row] = text
+                continue
+            try:
+                if dtype.kind == 'b':
+                    value = text.lower() in ('true', '1', 'yes')
+                elif dtype.kind in 'iu':
+                    value = int(text)
+                else:
+                    value = float(text)
+            except ValueError:
+                continue
+            self.values[column][row] = value
+            self.masks[column][row] = False
+        self.rows += 1
+        return self.rows == self.size
+
+    def flush(self):
+        """
+        Return the buffered records as a pandas dataframe and empty the buffers
+        """
+        data = {}
+        for column in self.columns:
+            dtype = self.dtypes.get(column)
+            values = self.values[column][:self.rows]
+            if dtype is None:
+                data[column] = pd.Series(values, dtype=object)
+            elif dtype.kind == 'M':
+                data[column] = pd.to_datetime(pd.Series(values, dtype=object), errors='coerce').astype(dtype)
+            elif dtype.kind == 'f':
+                data[column] = np.where(self.masks[column][:self.rows], np.nan, values).astype(dtype)
+            elif dtype.kind == 'b':
+                data[column] = pd.arrays.BooleanArray(values.copy(), self.masks[column][:self.rows].copy())
+            else:
+                data[column] = pd.arrays.IntegerArray(values.copy(), self.masks[column][:self.rows].copy())
+        out = pd.DataFrame(data, columns=self.columns)
+        self._allocate()
+        return out
+
+
+def record_values(element):
+    """
+    Return the fields of a record: its attributes and the text of its children (like pandas.read_xml)
+    """
+    record = {_local(k): v for k, v in element.attrib.items()}
+    for child in element:
+        record[_local(child.tag)] = child.text.strip() if child.text is not None and len(child) == 0 else None
+    return record
+
+
+def _file_chunks(path, start=0, end=None):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        position = start
+        while end is None or position < end:
+            chunk = f.read(_READ_BYTES if end is None else min(_READ_BYTES, end - position))
+            if not chunk:
+                break
+            position += len(chunk)
+            yield chunk
+
+
+def iter_records(chunks, record_tag):
+    """
+    Walk the records of an xml document fed as chunks of bytes, without building the tree:
+    every record is removed from its parent as soon as it has been read.
+    Yields (record, depth) pairs, where record is a dictionary field -> text.
+    :param chunks iterable of bytes
+    :param record_tag tag of the records
+    """
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    stack = []
+
+    def events():
+        for chunk in chunks:
+            parser.feed(chunk)
+            yield from parser.read_events()
+        parser.close()
+        yield from parser.read_events()
+
+    for event, element in events():
+        if event == 'start':
+            stack.append(element)
+            continue
+        stack.pop()
+        if len(stack) > 0 and _local(element.tag) == record_tag:
+            yield record_values(element), len(stack)
+            stack[-1].remove(element)
+
+
+def detect_record_tag(path):
+    """
+    Return the tag of the first child of the root, the default tag of the records
+    """
+    depth = 0
+    for event, element in ET.iterparse(path, events=('start', 'end')):
+        depth += 1 if event == 'start' else -1
+        if event == 'start' and depth == 2:
+            return _local(element.tag)
+    raise ValueError('{} has no records'.format(path))
+
+
+def sample_records(path, record_tag, rows=1000):
+    """
+    Return the first records of a file and the set of their depths
+    """
+    records, depths = [], set()
+    for record, depth in iter_records(_file_chunks(path), record_tag):
+        records.append(record)
+        depths.add(depth)
+        if len(records) >= rows:
+            break
+    return records, depths
+
+
+def record_columns(records):
+    """
+    Return the fields of the provided records, in order of appearance
+    """
+    columns = {}
+    for record in records:
+        columns.update(dict.fromkeys(record))
+    return list(columns)
+
+
+def iter_xml_batches(path, record_tag=None, columns=None, dtypes=None, batch_rows=100000):
+    """
+    Read an xml file as pandas dataframes of batch_rows records, keeping in memory only
+    the current batch: the records are parsed one at a time and their fields are converted
+    directly into the typed buffers of the batch.
+    :param path path of the file
+    :param record_tag tag of the records (default the tag of the first child of the root)
+    :param columns columns to read (default the fields of the first 1000 records)
+    :param dtypes dictionary column -> dtype (default strings)
+    :param batch_rows records of every batch (default 100000)
+    """
+    record_tag = record_tag or detect_record_tag(path)
+    if columns is None:
+        columns = record_columns(sample_records(path, record_tag)[0])
+    buffers = ColumnBuffers(columns, dtypes, batch_rows)
+    empty = True
+    for record, _ in iter_records(_file_chunks(path), record_tag):
+        if buffers.append(record):
+            empty = False
+            yield buffers.flush()
+    if buffers.rows > 0 or empty:
+        yield buffers.flush()
+
+
+def _find(path, pattern, start):
+    """
+    Return the position of the first match of a bytes regex in the file after start, None if missing.
+    The pattern must match at most 64 bytes.
+    """
+    tail = b''
+    position = start
+    for chunk in _file_chunks(path, start):
+        data = tail + chunk
+        found = pattern.search(data)
+        if found is not None:
+            return position - len(tail) + found.start()
+        tail = data[-64:]
+        position += len(chunk)
+    return None
+
+
+def xml_ranges(path, record_tag, blocksize=256 * 2 ** 20):
+    """
+    Split an xml file in byte ranges of about blocksize bytes that contain whole records:
+    every range starts at the opening tag of a record, the last one ends after the last record.
+    The boundaries are found scanning the bytes for the tag, so the records must not contain
+    elements, comments or CDATA with the same tag (see splittable).
+    :param path path of the file
+    :param record_tag tag of the records
+    :param blocksize size of the ranges in bytes (default 256MB)
+    """
+    opening = re.compile(b'<' + re.escape(record_tag.encode()) + rb'[\s>/]')
+    closing = re.compile(b'</' + re.escape(record_tag.encode()) + rb'\s*>|<' + re.escape(record_tag.encode()) + rb'\b[^>]*/>')
+    size = os.path.getsize(path)
+    first = _find(path, opening, 0)
+    if first is None:
+        return []
+
+    # the end of the last record: the last closing tag, searched in a growing window at the end of the file
+    window = min(size, _READ_BYTES)
+    while True:
+        with open(path, 'rb') as f:
+            f.seek(size - window)
+            matches = list(closing.finditer(f.read(window)))
+        if matches or window == size:
+            break
+        window = min(size, window * 2)
+    end = size - window + matches[-1].end() if matches else size
+
+    starts = [first]
+    while starts[-1] + blocksize < end:
+        start = _find(path, opening, starts[-1] + blocksize)
+        if start is None or start >= end:
+            break
+        starts.append(start)
+    return list(zip(starts, starts[1:] + [end]))
+
+
+def splittable(path, record_tag):
+    """
+    Return True if the file can be split in byte ranges: the sampled records are all
+    at the same depth (the tag is not used inside the records)
+    """
+    return len(sample_records(path, record_tag)[1]) == 1
+
+
+def read_xml_range(byte_range, path, record_tag, columns, dtypes=None, library='pandas', batch_rows=100000):
+    """
+    Read the records of a byte range of an xml file (see xml_ranges) as a pandas or cudf dataframe
+    :param byte_range (start, end) positions, None for the whole file
+    :param path path of the file
+    :param record_tag tag of the records
+    :param columns columns to read
+    :param dtypes dictionary column -> dtype (default strings)
+    :param library pandas or cudf
+    :param batch_rows records converted at a time
+    """
+    if byte_range is None:
+        out = pd.concat(iter_xml_batches(path, record_tag, columns, dtypes, batch_rows), ignore_index=True)
+        return cudf_or_pandas(out, library)
+
+    start, end = byte_range
+    # the range is a sequence of records: it becomes a document with the declaration
+    # of the file (for the encoding) and a wrapper root
+    with open(path, 'rb') as f:
+        declaration = re.match(rb'(\xef\xbb\xbf)?\s*<\?xml[^>]*\?>', f.read(256))
+    head = [declaration.group(0)] if declaration is not None else []
+    chunks = itertools.chain(head, [b'<_range>'], _file_chunks(path, start, end), [b'</_range>'])
+    buffers = ColumnBuffers(columns, dtypes, batch_rows)
+    batches = []
+    for record, _ in iter_records(chunks, record_tag):
+        if buffers.append(record):
+            batches.append(buffers.flush())
+    batches.append(buffers.flush())
+    return cudf_or_pandas(pd.concat(batches, ignore_index=True), library)
+
+
+def cudf_or_pandas(df, library):
+    if library == 'cudf':
+        import cudf
+        return cudf.from_pandas(df)
+    return df